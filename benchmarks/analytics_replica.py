@@ -0,0 +1,106 @@
+"""
+Write latency while heavy analytics run against the shard or its replica.
+
+Fills a database, then a writer thread adds single transactions as the bot
+does while reader threads keep exporting whole transaction histories. The
+readers either read the shard itself or, with replicas running, a copy at
+most --staleness seconds old. Reported are the writer's latency, the
+exports finished, the largest WAL size seen (long readers hold back
+checkpoints) and how long a replica refresh takes, both for a shard that
+changed since its last copy and for one that did not.
+
+Usage:
+    python -m benchmarks.analytics_replica --rows 300000 --seconds 10 --readers 2
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+
+def run(seconds, readers, users, staleness):
+    from db import DBHandler, get_pool
+    from db.exporter import format_values
+
+    with get_pool().writer() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    stop = threading.Event()
+    write_latencies = []
+    exports = [0]
+    wal_sizes = [0]
+    wal_file = get_pool().db_file + '-wal'
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            DBHandler.add_transaction(users + 1 + i % 100, 1, 100)
+            write_latencies.append((time.perf_counter() - started) * 1000)
+            if os.path.exists(wal_file):
+                wal_sizes[0] = max(wal_sizes[0], os.path.getsize(wal_file))
+            i += 1
+            time.sleep(0.002)
+
+    def export(index):
+        user_id = index % users + 1
+        while not stop.is_set():
+            rows = DBHandler.iter_transactions(user_id, datetime(1970, 1, 2), datetime.now(), max_staleness=staleness)
+            for _ in format_values(rows):
+                pass
+            exports[0] += 1
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=export, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return write_latencies, exports[0], wal_sizes[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300000, help="Transactions to generate")
+    parser.add_argument("--users", type=int, default=2, help="Users the transactions belong to")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each variant")
+    parser.add_argument("--readers", type=int, default=2, help="Export threads")
+    parser.add_argument("--staleness", type=float, default=60, help="Accepted replica lag in seconds")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import setup_database, close_pool, start_replicas, stop_replicas
+    setup_database()
+    fill_transactions(db_file, args.rows, users=args.users)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'readers on':<10} {'write p50 ms':>12} {'write p99 ms':>12} {'writes':>7} {'exports':>8} {'max WAL MB':>11}")
+    for name in ("shard", "replica"):
+        staleness = None
+        if name == "replica":
+            refresher = start_replicas()
+            started = time.perf_counter()
+            refresher.refresh_all()
+            unchanged_s = time.perf_counter() - started
+            staleness = args.staleness
+        latencies, exports, wal_size = run(args.seconds, args.readers, args.users, staleness)
+        print(f"{name:<10} {percentile(latencies, 50):12.2f} {percentile(latencies, 99):12.2f} "
+              f"{len(latencies):7d} {exports:8d} {wal_size / 1024 / 1024:11.1f}")
+
+    # The writer thread changed the shard, so this refresh copies it
+    started = time.perf_counter()
+    refresher.refresh_all()
+    changed_s = time.perf_counter() - started
+    stop_replicas()
+    close_pool()
+    print(f"replica refresh of a {os.path.getsize(db_file) / 1024 / 1024:.1f} MB database: "
+          f"{changed_s:.2f} s after writes, {unchanged_s * 1000:.1f} ms unchanged")
+
+
+if __name__ == "__main__":
+    main()
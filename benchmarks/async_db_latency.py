@@ -0,0 +1,83 @@
+"""
+Load test for the async database layer.
+
+Simulates short callback handlers (a category lookup each) while long
+report queries run on the same event loop, once with the handlers calling
+DBHandler directly and once awaiting AsyncDBHandler.
+
+Usage:
+    python -m benchmarks.async_db_latency --rows 500000
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+
+async def run_scenario(mode, reports, callbacks, interval):
+    """Run concurrent reports and callbacks, returning callback latencies in ms"""
+    from db import DBHandler, AsyncDBHandler
+
+    end = datetime.now()
+    start = end - timedelta(days=365)
+    # Every generated user in one scope keeps the report heavy
+    user_ids = range(1, 11)
+    latencies = []
+
+    async def report_worker():
+        for _ in range(reports):
+            if mode == "sync":
+                DBHandler.get_category_summary(user_ids, start, end)
+            else:
+                await AsyncDBHandler.get_category_summary(user_ids, start, end)
+
+    async def callback(scheduled_at):
+        if mode == "sync":
+            DBHandler.get_category_info(1)
+        else:
+            await AsyncDBHandler.get_category_info(1)
+        latencies.append((time.perf_counter() - scheduled_at) * 1000)
+
+    report_tasks = [asyncio.create_task(report_worker()) for _ in range(2)] if reports else []
+    callback_tasks = []
+    started = time.perf_counter()
+    for i in range(callbacks):
+        # Latency is measured from when the update should have been handled,
+        # so time spent with the loop blocked counts against the callback
+        scheduled_at = started + i * interval
+        await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+        callback_tasks.append(asyncio.create_task(callback(scheduled_at)))
+
+    await asyncio.gather(*callback_tasks, *report_tasks)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="Transactions to generate")
+    parser.add_argument("--reports", type=int, default=5, help="Long reports per report worker")
+    parser.add_argument("--callbacks", type=int, default=300, help="Callbacks to simulate")
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between callbacks")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import setup_database, shutdown_db_executor
+    setup_database()
+    fill_transactions(db_file, args.rows)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'mode':<6} {'load':<8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for mode in ("sync", "async"):
+        for reports in (0, args.reports):
+            latencies = asyncio.run(run_scenario(mode, reports, args.callbacks, args.interval))
+            load = "reports" if reports else "idle"
+            print(f"{mode:<6} {load:<8} {percentile(latencies, 50):9.2f} "
+                  f"{percentile(latencies, 99):9.2f} {max(latencies):9.2f}")
+            shutdown_db_executor()
+
+
+if __name__ == "__main__":
+    main()
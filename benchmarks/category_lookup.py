@@ -0,0 +1,65 @@
+"""
+Microbenchmark of category lookups through SQLite and through the registry.
+
+Counts the SQL statements issued on the pooled connections while the
+handlers' category paths run, to show the registry never touches SQLite
+once it is loaded.
+
+Usage:
+    python -m benchmarks.category_lookup --ops 20000
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.common import use_temp_database
+
+
+def timed(func, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return (time.perf_counter() - started) / ops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20000, help="Lookups per scenario")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from db import DBHandler, setup_database, get_pool, category_registry
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    types = ("income", "expense")
+    scenarios = [
+        ("get_categories", lambda i: DBHandler.get_categories(types[i % 2]),
+         lambda i: category_registry.by_type(types[i % 2])),
+        ("get_category_info", lambda i: DBHandler.get_category_info(1 + i % 18),
+         lambda i: category_registry.get(1 + i % 18)),
+    ]
+
+    # Warm both paths so every pooled connection exists before tracing
+    for _, sqlite_path, registry_path in scenarios:
+        sqlite_path(0)
+        registry_path(0)
+
+    statements = []
+    pool = get_pool()
+    print(f"{'lookup':<18} {'sqlite us/op':>13} {'registry us/op':>15} {'registry SQL':>13}")
+    for name, sqlite_path, registry_path in scenarios:
+        sqlite_us = timed(sqlite_path, args.ops)
+
+        for conn in pool._all_connections:
+            conn.set_trace_callback(statements.append)
+        statements.clear()
+        registry_us = timed(registry_path, args.ops)
+        for conn in pool._all_connections:
+            conn.set_trace_callback(None)
+
+        print(f"{name:<18} {sqlite_us:13.2f} {registry_us:15.3f} {len(statements):13d}")
+
+
+if __name__ == "__main__":
+    main()
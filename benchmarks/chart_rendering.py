@@ -0,0 +1,88 @@
+"""
+Event loop responsiveness while a burst of charts is rendered.
+
+A ticker coroutine measures how late it wakes up every 10 ms while N
+distinct charts are rendered either inline on the event loop or in the
+chart process pool, then the same requests are repeated against the
+chart cache. Requires matplotlib.
+
+Usage:
+    python -m benchmarks.chart_rendering --charts 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from benchmarks.common import percentile
+
+TICK_INTERVAL = 0.01
+
+
+async def measure(func, charts):
+    """Run func(i) for every chart concurrently, returning (seconds, ticker lags in ms)"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            scheduled = time.perf_counter() + TICK_INTERVAL
+            await asyncio.sleep(TICK_INTERVAL)
+            lags.append((time.perf_counter() - scheduled) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_INTERVAL * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(func(i) for i in range(charts)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    return elapsed, lags
+
+
+async def run(charts):
+    from bot.charts import render_chart, get_chart, get_chart_executor, chart_cache
+    from config import CHART_RENDER_WORKERS
+
+    rnd = random.Random(42)
+    names = ["Продукти", "Транспорт", "Комунальні", "Розваги", "Одяг", "Здоров'я", "Освіта", "Інше"]
+    datasets = [[(name, 'expense', rnd.randrange(100, 500000)) for name in names] + [("Зарплата", 'income', 5000000)]
+                for _ in range(charts)]
+
+    async def inline(i):
+        render_chart('pie', f"Chart {i}", datasets[i])
+
+    async def pooled(i):
+        await get_chart(('bench', i), 'pie', f"Chart {i}", datasets[i])
+
+    # Start the workers and import matplotlib in them before timing
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(get_chart_executor(), render_chart, 'bar', "warm-up", datasets[0])
+                           for _ in range(CHART_RENDER_WORKERS)))
+    render_chart('bar', "warm-up", datasets[0])
+
+    print(f"{'variant':<16} {'total s':>8} {'lag p50 ms':>11} {'lag max ms':>11}")
+    for name, func in (("inline", inline), ("process pool", pooled), ("cached", pooled)):
+        elapsed, lags = await measure(func, charts)
+        print(f"{name:<16} {elapsed:8.2f} {percentile(lags, 50):11.1f} {max(lags or [0]):11.1f}")
+    print(f"chart cache: {chart_cache.hits} hits, {chart_cache.misses} misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--charts", type=int, default=20, help="Distinct charts in the burst")
+    args = parser.parse_args()
+
+    from bot.charts import CHARTS_AVAILABLE, shutdown_chart_executor
+    if not CHARTS_AVAILABLE:
+        print("matplotlib is not installed")
+        return 1
+
+    asyncio.run(run(args.charts))
+    shutdown_chart_executor()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
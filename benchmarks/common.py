@@ -0,0 +1,65 @@
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime
+
+
+def use_temp_database():
+    """
+    Point the bot at a fresh SQLite file in a temporary directory.
+    Must be called before anything imports config.
+
+    Returns:
+        str: Path of the database file
+    """
+    db_dir = tempfile.mkdtemp(prefix="family_budget_bench_")
+    db_file = os.path.join(db_dir, "bench.db")
+    os.environ["SQLITE_DB_FILE"] = db_file
+    return db_file
+
+
+def fill_transactions(db_file, rows, users=10, days=365, seed=42):
+    """
+    Insert synthetic transactions straight into the database.
+
+    Args:
+        db_file (str): Path of an initialized database
+        rows (int): Number of transactions to insert
+        users (int): Number of distinct user ids
+        days (int): How many days back the transactions are spread
+        seed (int): Random seed so runs are reproducible
+    """
+    from db.dates import to_epoch
+
+    rnd = random.Random(seed)
+    now = to_epoch(datetime.now())
+    conn = sqlite3.connect(db_file)
+    category_ids = [row[0] for row in conn.execute("SELECT id FROM categories")]
+
+    def generate():
+        for _ in range(rows):
+            date = now - rnd.randrange(days * 86400)
+            yield (rnd.randrange(1, users + 1), rnd.choice(category_ids),
+                   rnd.randrange(100, 500000), None, date)
+
+    conn.executemany(
+        "INSERT INTO transactions (user_id, category_id, amount, description, date) VALUES (?, ?, ?, ?, ?)",
+        generate()
+    )
+    conn.commit()
+
+    # Rows were inserted behind DBHandler's back, bring the rollups in line
+    from db.rollups import rebuild_daily_totals, rebuild_monthly_totals
+    rebuild_daily_totals(conn)
+    rebuild_monthly_totals(conn)
+    conn.close()
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
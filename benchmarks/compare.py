@@ -0,0 +1,111 @@
+"""
+Compare two benchmark suite results and flag regressions.
+
+Prints every scenario's latency in both files and the relative change.
+A scenario whose metric got slower by more than --threshold percent is a
+regression, and the exit status is 1 if there is any, so the comparison
+can gate a CI job. Results of different datasets or options are still
+compared, with a warning, since their numbers are not comparable.
+
+With --normalize the new numbers are first scaled by the ratio of the
+two runs' calibration workloads, which factors out a machine that was
+slower or busier as a whole during one of the runs.
+
+Usage:
+    python -m benchmarks.compare bench-<old>.json bench-<new>.json --threshold 15
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_us', 'p95_us', 'p99_us', 'mean_us')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def strip_timings(section):
+    """Drop the entries of a section that are measurements rather than settings"""
+    return {key: value for key, value in section.items() if key not in ('generate_s', 'calibration_us')}
+
+
+def describe(result):
+    commit = (result.get('commit') or 'unknown')[:10]
+    return commit + (' (dirty)' if result.get('dirty') else '')
+
+
+def compare(base, new, metrics, threshold, scale=1.0):
+    """
+    Compare the scenarios of two results.
+
+    Args:
+        base (dict): Baseline results
+        new (dict): Results to check
+        metrics (list): Latency metrics to compare, e.g. p50_us
+        threshold (float): Slowdown in percent counted as a regression
+        scale (float): Factor applied to the new values first
+
+    Returns:
+        list: (scenario, metric, base value, new value, change in percent, verdict) rows
+    """
+    rows = []
+    for scenario in sorted(set(base['scenarios']) | set(new['scenarios'])):
+        before = base['scenarios'].get(scenario)
+        after = new['scenarios'].get(scenario)
+        if before is None or after is None:
+            rows.append((scenario, '', None, None, None, 'only in base' if after is None else 'only in new'))
+            continue
+        for metric in metrics:
+            value = after[metric] * scale
+            change = (value - before[metric]) / before[metric] * 100
+            if change > threshold:
+                verdict = 'REGRESSION'
+            elif change < -threshold:
+                verdict = 'faster'
+            else:
+                verdict = ''
+            rows.append((scenario, metric, before[metric], value, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="Baseline results JSON")
+    parser.add_argument("new", help="Results JSON to check")
+    parser.add_argument("--metrics", nargs='+', choices=METRICS, default=['p50_us', 'p95_us'],
+                        help="Latency metrics to compare")
+    parser.add_argument("--threshold", type=float, default=15, help="Slowdown in percent counted as a regression")
+    parser.add_argument("--normalize", action='store_true', help="Scale by the runs' calibration workloads")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    for section in ('dataset', 'options', 'environment'):
+        if strip_timings(base.get(section, {})) != strip_timings(new.get(section, {})):
+            print(f"warning: the results have different {section}, the numbers are not directly comparable")
+
+    scale = 1.0
+    if args.normalize:
+        scale = base['environment']['calibration_us'] / new['environment']['calibration_us']
+        print(f"new values scaled by {scale:.3f} from the calibration workloads")
+
+    print(f"base {describe(base)}  new {describe(new)}  threshold {args.threshold:g}%")
+    rows = compare(base, new, args.metrics, args.threshold, scale)
+    width = max([len('scenario')] + [len(row[0]) for row in rows])
+    print(f"{'scenario':<{width}} {'metric':<8} {'base':>10} {'new':>10} {'change':>8}")
+    regressions = 0
+    for scenario, metric, before, after, change, verdict in rows:
+        if change is None:
+            print(f"{scenario:<{width}} {verdict}")
+            continue
+        print(f"{scenario:<{width}} {metric:<8} {before:10.1f} {after:10.1f} {change:+7.1f}% {verdict}")
+        regressions += verdict == 'REGRESSION'
+
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of pooled SQLite connections against connect-per-call.
+
+The legacy path opens a fresh connection with default pragmas (rollback
+journal, synchronous=FULL) for every call, as DBHandler used to do. The
+pooled path goes through DBHandler and the shared ConnectionPool.
+
+Usage:
+    python -m benchmarks.connection_pool --ops 2000
+"""
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, fill_transactions
+
+
+def legacy_read(db_file, user_id, start, end):
+    from db.dates import to_epoch
+
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(
+            "SELECT t.id, t.amount, t.description, t.date, c.name, c.type "
+            "FROM transactions t JOIN categories c ON t.category_id = c.id "
+            "WHERE t.user_id = ? AND t.date BETWEEN ? AND ?",
+            (user_id, to_epoch(start), to_epoch(end))
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def legacy_category(db_file, category_id):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT id, name, type FROM categories WHERE id = ?", (category_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def legacy_write(db_file, user_id, category_id, amount):
+    from db.dates import to_epoch
+
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute(
+            "INSERT INTO transactions (user_id, category_id, amount, description, date) VALUES (?, ?, ?, ?, ?)",
+            (user_id, category_id, amount, None, to_epoch(datetime.now()))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ops_per_sec(func, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return ops / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="Transactions to generate")
+    parser.add_argument("--ops", type=int, default=2000, help="Operations per scenario")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import DBHandler, setup_database, close_pool
+    setup_database()
+    close_pool()
+
+    # The legacy copy is switched back to the default rollback journal
+    fill_transactions(db_file, args.rows)
+    legacy_file = os.path.join(os.path.dirname(db_file), "legacy.db")
+    shutil.copy(db_file, legacy_file)
+    conn = sqlite3.connect(legacy_file)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    end = datetime.now()
+    start = end - timedelta(days=7)
+    scenarios = [
+        ("get_category_info",
+         lambda i: legacy_category(legacy_file, 1 + i % 10),
+         lambda i: DBHandler.get_category_info(1 + i % 10)),
+        ("get_transactions",
+         lambda i: legacy_read(legacy_file, 1 + i % 10, start, end),
+         lambda i: DBHandler.get_transactions(1 + i % 10, start, end)),
+        ("add_transaction",
+         lambda i: legacy_write(legacy_file, 1 + i % 10, 1, 1000),
+         lambda i: DBHandler.add_transaction(1 + i % 10, 1, 1000)),
+    ]
+
+    print(f"{'scenario':<20} {'per-call ops/s':>15} {'pooled ops/s':>14} {'speedup':>8}")
+    for name, legacy, pooled in scenarios:
+        legacy_rate = ops_per_sec(legacy, args.ops)
+        pooled_rate = ops_per_sec(pooled, args.ops)
+        print(f"{name:<20} {legacy_rate:15.0f} {pooled_rate:14.0f} {pooled_rate / legacy_rate:7.1f}x")
+
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+End-to-end conversation simulator.
+
+Drives the real ConversationHandler from setup_conversation_handler() with
+many simulated users, each going through
+
+    /start -> add expense -> category -> amount -> add description
+           -> description -> confirm -> reports -> this month -> main menu
+
+and repeating everything after /start for --cycles rounds. Updates are
+dispatched exactly as the Application does for webhook and polling
+updates: through PerChatUpdateProcessor, the SQLite persistence and
+every handler, with the same instrumentation as main.py. Only the Bot API
+is replaced by FakeBotRequest, an in-process request backend that answers
+every call like Telegram would after an optional --api-delay-ms.
+
+Users run concurrently and each one sends its next update once the
+previous one was handled, plus an optional think time. Reported are
+updates/s, latency percentiles of every step by the conversation state it
+is handled in, the time spent in DB calls and Bot API calls against the
+run and against handler time, and the Bot API calls per update. Handler
+times of concurrent updates include waiting for each other, so the DB
+time share of handler time is exact at --concurrency 1. Every finished confirm must have stored
+a transaction, which is checked at the end. With --output the per-step
+latencies are also written in the format of benchmarks/suite.py, so two
+runs can be compared with benchmarks/compare.py.
+
+Usage:
+    python -m benchmarks.conversation_sim --users 1000 --cycles 2 --concurrency 64 --api-delay-ms 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+from benchmarks.common import use_temp_database, percentile
+from benchmarks.suite import calibrate, git_revision, summarize
+
+TOKEN = "123456:SIMULATOR"
+BOT_USER = {
+    "id": 123456, "is_bot": True, "first_name": "Simulator", "username": "simulator_bot",
+    "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False
+}
+
+# (conversation state the update is handled in, what the user does) of one cycle after /start
+CYCLE = (
+    ("MAIN_MENU", "add_expense"),
+    ("SELECT_CATEGORY", "category"),
+    ("ENTER_AMOUNT", "amount"),
+    ("CONFIRM_RECORD", "add_description"),
+    ("ADD_RECORD", "description"),
+    ("CONFIRM_RECORD", "confirm"),
+    ("MAIN_MENU", "reports"),
+    ("GENERATE_REPORT", "report_month"),
+    ("GENERATE_REPORT", "back_to_main"),
+)
+
+
+class FakeBotRequest(BaseRequest):
+    """
+    Request backend answering Bot API calls in-process instead of over the network.
+
+    Sent and edited messages are echoed back as Telegram would return them,
+    everything else succeeds with True. Calls and the time spent in them are
+    counted per API method.
+    """
+
+    def __init__(self, delay_s=0.0):
+        self.delay = delay_s
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self._message_ids = Counter()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        started = time.perf_counter()
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method in ('sendMessage', 'editMessageText'):
+            chat_id = params['chat_id']
+            if api_method == 'sendMessage':
+                self._message_ids[chat_id] += 1
+            result = {
+                "message_id": params.get('message_id', self._message_ids[chat_id]),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params['text'],
+            }
+        else:
+            result = True
+
+        self.calls[api_method] += 1
+        self.seconds[api_method] += time.perf_counter() - started
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class SimulatedUser:
+    """
+    Builds the updates of one user, numbering them like Telegram does.
+    """
+
+    update_ids = iter(range(1, sys.maxsize))
+
+    def __init__(self, user_id, rnd, category_ids):
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+        self.chat = {"id": user_id, "type": "private", "first_name": f"User {user_id}"}
+        self.rnd = rnd
+        self.category_ids = category_ids
+
+    def message(self, text, command=False):
+        message = {"message_id": next(self.update_ids), "date": int(time.time()),
+                   "chat": self.chat, "from": self.user, "text": text}
+        if command:
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return {"update_id": message["message_id"], "message": message}
+
+    def click(self, data):
+        update_id = next(self.update_ids)
+        message = {"message_id": 1, "date": int(time.time()), "chat": self.chat, "from": BOT_USER, "text": "menu"}
+        return {"update_id": update_id,
+                "callback_query": {"id": str(update_id), "from": self.user, "chat_instance": str(self.chat["id"]),
+                                   "message": message, "data": data}}
+
+    def update_for(self, action):
+        """Return the update data of a step of the conversation"""
+        if action == "start":
+            return self.message("/start", command=True)
+        if action == "category":
+            return self.click(f"cat_{self.rnd.choice(self.category_ids)}")
+        if action == "amount":
+            return self.message(f"{self.rnd.randrange(1, 5000)}.{self.rnd.randrange(100):02d}")
+        if action == "description":
+            return self.message(self.rnd.choice(("Обід", "Продукти на тиждень", "Таксі", "Кава")))
+        return self.click(action)
+
+
+async def simulate(application, users, cycles, think_s, seed):
+    """
+    Run every user's conversation and return the latencies in microseconds by step.
+
+    Latency runs from handing the update to the update processor until it
+    was handled, service time from when its handling actually started, after
+    waiting for a free slot.
+
+    Returns:
+        tuple: ({(state, action): [latency, ...]}, {(state, action): [service time, ...]},
+                wall clock seconds)
+    """
+    from db import category_registry
+
+    category_ids = [category_id for category_id, _ in category_registry.by_type("expense")]
+    latencies = defaultdict(list)
+    service_times = defaultdict(list)
+    steps = [("entry", "start")] + list(CYCLE) * cycles
+
+    async def handle(update, begun):
+        begun.append(time.perf_counter())
+        await application.process_update(update)
+
+    async def run_user(user_id):
+        rnd = random.Random(f"{seed}:{user_id}")
+        user = SimulatedUser(user_id, rnd, category_ids)
+        # Spread the first messages so users do not all start in the same instant
+        await asyncio.sleep(rnd.random() * think_s)
+        for state, action in steps:
+            update = Update.de_json(user.update_for(action), application.bot)
+            begun = []
+            started = time.perf_counter()
+            await application.update_processor.process_update(update, handle(update, begun))
+            finished = time.perf_counter()
+            latencies[(state, action)].append((finished - started) * 1e6)
+            service_times[(state, action)].append((finished - begun[0]) * 1e6)
+            if think_s:
+                await asyncio.sleep(rnd.random() * 2 * think_s)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(user_id) for user_id in range(1, users + 1)))
+    return latencies, service_times, time.perf_counter() - started
+
+
+def histogram_seconds(histogram):
+    """Total seconds recorded by every series of a histogram"""
+    return sum(child.sum for _, child in histogram.children())
+
+
+def write_results(args, latencies, service_times, elapsed):
+    """Write per-step service time and latency statistics in the format of the benchmark suite"""
+    commit, dirty = git_revision()
+    updates = sum(len(values) for values in latencies.values())
+    document = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'calibration_us': percentile([calibrate() for _ in range(5)], 50),
+        },
+        'options': {key: value for key, value in vars(args).items() if key != 'output'},
+        'updates_per_s': updates / elapsed,
+        'scenarios': {},
+    }
+    for (state, action), values in service_times.items():
+        document['scenarios'][f"{state} {action}"] = summarize(values, elapsed)
+        document['scenarios'][f"{state} {action} latency"] = summarize(latencies[(state, action)], elapsed)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2)
+        file.write('\n')
+
+
+async def run(args):
+    from telegram.ext import Application
+    from db import DBHandler, instrument_db_handler
+    from db.instrumentation import DB_CALL_SECONDS
+    from bot import setup_conversation_handler, STATE_NAMES, SQLitePersistence, instrument_handlers
+    from bot.instrumentation import HANDLER_SECONDS
+    from bot.update_processor import PerChatUpdateProcessor
+
+    fake_api = FakeBotRequest(args.api_delay_ms / 1000)
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .request(fake_api)
+        .get_updates_request(FakeBotRequest())
+        .concurrent_updates(PerChatUpdateProcessor(args.concurrency))
+        .persistence(SQLitePersistence())
+        .build()
+    )
+    application.add_handler(setup_conversation_handler())
+    instrument_handlers(application, STATE_NAMES)
+    instrument_db_handler()
+
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(context.error)
+
+    application.add_error_handler(on_error)
+
+    async with application:
+        await application.start()
+        try:
+            latencies, service_times, elapsed = await simulate(application, args.users, args.cycles, args.think_ms / 1000, args.seed)
+        finally:
+            await application.stop()
+
+    handler_s = histogram_seconds(HANDLER_SECONDS)
+    db_s = histogram_seconds(DB_CALL_SECONDS)
+    api_s = sum(fake_api.seconds.values())
+    updates = sum(len(values) for values in latencies.values())
+
+    print(f"{args.users} users, {updates} updates in {elapsed:.1f} s: {updates / elapsed:.0f} updates/s "
+          f"at concurrency {args.concurrency}, Bot API delay {args.api_delay_ms:g} ms")
+    print(f"\n{'':<33} {'service ms':^17} {'latency ms':^26}")
+    print(f"{'state':<16} {'action':<16} {'p50':>8} {'p95':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'updates':>8}")
+    for step, values in latencies.items():
+        service = service_times[step]
+        print(f"{step[0]:<16} {step[1]:<16} {percentile(service, 50) / 1000:8.2f} {percentile(service, 95) / 1000:8.2f} "
+              f"{percentile(values, 50) / 1000:8.2f} {percentile(values, 95) / 1000:8.2f} "
+              f"{percentile(values, 99) / 1000:8.2f} {len(values):8d}")
+
+    # Concurrent handlers overlap, their summed time only splits cleanly at concurrency 1
+    print(f"\nDB calls {db_s:.2f} s, {db_s / elapsed * 100:.0f}% of the run; "
+          f"Bot API calls {api_s:.2f} s; handlers {handler_s:.2f} s summed over concurrent updates")
+    print(f"DB time share of handler time: {db_s / handler_s * 100:.1f}%"
+          + ("" if args.concurrency == 1 else " (includes waiting for other updates, see --concurrency 1)"))
+    print("Bot API calls per update: " + ", ".join(
+        f"{method} {count / updates:.2f}" for method, count in fake_api.calls.most_common()))
+
+    if args.output:
+        write_results(args, latencies, service_times, elapsed)
+
+    expected = args.users * args.cycles
+    stored = sum(len(DBHandler.get_transactions(user_id, datetime(1970, 1, 2), datetime.now()))
+                 for user_id in range(1, args.users + 1))
+    if errors or stored != expected:
+        print(f"FAILED: {len(errors)} handler errors, {stored} of {expected} transactions stored"
+              + (f", first error: {errors[0]!r}" if errors else ""))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Simulated users")
+    parser.add_argument("--cycles", type=int, default=2, help="Add-expense-and-report rounds per user")
+    parser.add_argument("--concurrency", type=int, help="Updates handled at once, CONCURRENT_UPDATES by default")
+    parser.add_argument("--api-delay-ms", type=float, default=0, help="Delay of every fake Bot API call")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause of a user between updates")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--output", help="Also write per-step results as JSON for benchmarks/compare.py")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from config import CONCURRENT_UPDATES
+    from db import setup_database, close_pool, shutdown_db_executor, shutdown_shard_executor
+    if args.concurrency is None:
+        args.concurrency = CONCURRENT_UPDATES
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        status = asyncio.run(run(args))
+    finally:
+        shutdown_db_executor()
+        shutdown_shard_executor()
+        close_pool()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Dashboard report in one query against four separate period summaries.
+
+Times today, this week, this month and the previous month fetched as four
+get_category_summary calls against one get_dashboard_summary call, with
+the report cache cleared before every report. Also reports how many
+daily_totals rows each variant reads, and the SQLite virtual machine
+instructions it executes: the dashboard reads every row once but
+evaluates four CASE expressions per row.
+
+Usage:
+    python -m benchmarks.dashboard_report --rows 500000 --reports 500
+"""
+import argparse
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+
+def count_instructions(db_file, statements):
+    """Run (sql, params) statements and return the VM instructions they executed"""
+    conn = sqlite3.connect(db_file)
+    steps = 0
+
+    def progress():
+        nonlocal steps
+        steps += 1
+
+    conn.set_progress_handler(progress, 1)
+    try:
+        for sql, params in statements:
+            conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000, help="Transactions to generate")
+    parser.add_argument("--users", type=int, default=10, help="Distinct user ids")
+    parser.add_argument("--reports", type=int, default=500, help="Reports per variant")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import DBHandler, setup_database, close_pool, report_cache
+    from db.dates import to_day
+    from db.sqlite_handler import (
+        DASHBOARD_PERIODS, GET_DAILY_SUMMARY_QUERY, GET_DASHBOARD_SUMMARY_QUERY, scoped
+    )
+    from bot.handlers.report_handler import period_range
+    setup_database()
+    fill_transactions(db_file, args.rows, users=args.users)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    periods = {period: period_range(period, today)[:2] for period in DASHBOARD_PERIODS}
+    user_ids = (1,)
+
+    def separate():
+        for start_date, end_date in periods.values():
+            DBHandler.get_category_summary(user_ids, start_date, end_date)
+
+    def dashboard():
+        DBHandler.get_dashboard_summary(user_ids, periods)
+
+    print(f"{'variant':<22} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} {'rows read':>10} {'VM steps':>10}")
+    day_ranges = [(to_day(start), to_day(end)) for start, end in periods.values()]
+    outer_range = (min(start for start, _ in day_ranges), max(end for _, end in day_ranges))
+    conn = sqlite3.connect(db_file)
+    count_query = "SELECT COUNT(*) FROM daily_totals WHERE user_id = ? AND day BETWEEN ? AND ?"
+    rows_read = {
+        "four summaries": sum(conn.execute(count_query, user_ids + day_range).fetchone()[0]
+                              for day_range in day_ranges),
+        "one dashboard query": conn.execute(count_query, user_ids + outer_range).fetchone()[0],
+    }
+    conn.close()
+    instructions = {
+        "four summaries": count_instructions(db_file, [
+            (scoped(GET_DAILY_SUMMARY_QUERY, user_ids), user_ids + day_range) for day_range in day_ranges
+        ]),
+        "one dashboard query": count_instructions(db_file, [
+            (scoped(GET_DASHBOARD_SUMMARY_QUERY, user_ids),
+             tuple(day for day_range in day_ranges for day in day_range) + user_ids + outer_range)
+        ]),
+    }
+    for name, queries, func in (("four summaries", 4, separate), ("one dashboard query", 1, dashboard)):
+        latencies = []
+        for _ in range(args.reports):
+            report_cache.clear()
+            started = time.perf_counter()
+            func()
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<22} {queries:7d} {percentile(latencies, 50):8.3f} {percentile(latencies, 95):8.3f} "
+              f"{rows_read[name]:10d} {instructions[name]:10d}")
+
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
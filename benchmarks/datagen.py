@@ -0,0 +1,179 @@
+"""
+Synthetic data for benchmarks: users, categories and years of transactions.
+
+The dataset is a pure function of its parameters. Transactions are spread
+over whole calendar months ending with the month of a fixed end date, not
+today, so two runs with the same parameters produce the same rows and
+benchmark results of different commits stay comparable.
+
+Every user gets a couple of incomes and a number of expenses per month,
+with amounts spread log-uniformly from a few hryvnias to a salary.
+Rows are written through DBHandler.add_transactions, so they land on the
+right shard and the daily and monthly rollups are maintained exactly as
+in production.
+
+Usage:
+    python -m benchmarks.datagen --db /tmp/budget.db --users 100 --categories 30 --years 3
+"""
+import argparse
+import logging
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+# Last day of the generated data, fixed so datasets are reproducible
+DEFAULT_END = "2025-12-31"
+
+# Incomes per user per month, the rest of rows_per_month are expenses
+INCOMES_PER_MONTH = 2
+
+# Transactions written per DBHandler.add_transactions call
+CHUNK_SIZE = 20000
+
+
+def month_starts(end, years):
+    """Return the first day of every month covered, oldest first, ending with end's month"""
+    starts = []
+    month = end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(years * 12):
+        starts.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+def amount_between(rnd, low, high):
+    """Random amount in minor units, log-uniform between low and high"""
+    return int(math.exp(rnd.uniform(math.log(low), math.log(high))))
+
+
+def ensure_categories(count):
+    """
+    Make sure at least count categories exist, adding numbered ones as needed.
+
+    Args:
+        count (int): Categories the dataset should use
+
+    Returns:
+        tuple: (income category ids, expense category ids), count ids in total
+    """
+    from db import DBHandler
+
+    existing = {kind: [row[0] for row in DBHandler.get_categories(kind)] for kind in ("income", "expense")}
+    number = 1
+    while len(existing["income"]) + len(existing["expense"]) < count:
+        # Keep roughly one income category per four expense categories
+        kind = "income" if len(existing["income"]) * 4 < len(existing["expense"]) else "expense"
+        existing[kind].append(DBHandler.add_category(f"Категорія {number}", kind))
+        number += 1
+
+    income = existing["income"][:max(1, count // 5)]
+    expense = existing["expense"][:max(1, count - len(income))]
+    return income, expense
+
+
+def generate_transactions(users, income_ids, expense_ids, months, rows_per_month, seed):
+    """
+    Yield (user_id, category_id, amount, description, date) tuples month by month.
+
+    Args:
+        users (int): Users 1..users get transactions
+        income_ids (list): Category ids used for incomes
+        expense_ids (list): Category ids used for expenses
+        months (list): First day of every month to fill
+        rows_per_month (int): Transactions per user per month
+        seed (int): Random seed
+
+    Yields:
+        tuple: One transaction
+    """
+    rnd = random.Random(seed)
+    for month in months:
+        days = ((month + timedelta(days=32)).replace(day=1) - month).days
+        for user_id in range(1, users + 1):
+            for i in range(rows_per_month):
+                date = month + timedelta(seconds=rnd.randrange(days * 86400))
+                if i < INCOMES_PER_MONTH:
+                    yield user_id, rnd.choice(income_ids), amount_between(rnd, 100000, 10000000), None, date
+                else:
+                    yield user_id, rnd.choice(expense_ids), amount_between(rnd, 500, 500000), None, date
+
+
+def generate(users=100, categories=18, years=1, rows_per_month=40, end=DEFAULT_END, seed=42):
+    """
+    Fill the configured database with a synthetic dataset. setup_database() must have run.
+
+    Args:
+        users (int): Number of users
+        categories (int): Number of categories transactions are spread over
+        years (int): Years of history, in whole months ending with end's month
+        rows_per_month (int): Transactions per user per month
+        end (str): Last day of the data, YYYY-MM-DD
+        seed (int): Random seed
+
+    Returns:
+        dict: The parameters and the number of transactions written
+    """
+    from db import DBHandler
+
+    income_ids, expense_ids = ensure_categories(categories)
+    months = month_starts(datetime.strptime(end, "%Y-%m-%d"), years)
+
+    written = 0
+    chunk = []
+    for transaction in generate_transactions(users, income_ids, expense_ids, months, rows_per_month, seed):
+        chunk.append(transaction)
+        if len(chunk) == CHUNK_SIZE:
+            written += DBHandler.add_transactions(chunk)
+            chunk = []
+    if chunk:
+        written += DBHandler.add_transactions(chunk)
+
+    return {
+        'users': users,
+        'categories': categories,
+        'years': years,
+        'rows_per_month': rows_per_month,
+        'end': end,
+        'seed': seed,
+        'transactions': written,
+    }
+
+
+def add_arguments(parser):
+    """Add the dataset options to an argument parser"""
+    parser.add_argument("--users", type=int, default=100, help="Users with transactions")
+    parser.add_argument("--categories", type=int, default=18, help="Categories in use, extra ones are added")
+    parser.add_argument("--years", type=int, default=1, help="Years of history")
+    parser.add_argument("--rows-per-month", type=int, default=40, help="Transactions per user per month")
+    parser.add_argument("--end", default=DEFAULT_END, help="Last day of the data, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+
+
+def dataset_options(args):
+    """Return the generate() keyword arguments of parsed options"""
+    return dict(users=args.users, categories=args.categories, years=args.years,
+                rows_per_month=args.rows_per_month, end=args.end, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="Database file to create, must not exist")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    os.environ["SQLITE_DB_FILE"] = args.db
+    from db import setup_database, close_pool, shutdown_shard_executor
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    dataset = generate(**dataset_options(args))
+    shutdown_shard_executor()
+    close_pool()
+    print(f"Wrote {dataset['transactions']} transactions for {args.users} users to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Range query speed and index size of ISO 8601 TEXT dates against integer
+epoch seconds.
+
+Generates the same transactions in both representations, each table with
+the covering (user_id, date, category_id, amount) index the bot uses, then
+times per-user category summaries over random week and month windows and
+reports the on-disk size of the tables and indexes.
+
+Usage:
+    python -m benchmarks.date_storage --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCHEMAS = {
+    'text': 'TEXT',
+    'epoch': 'INTEGER',
+}
+
+SUMMARY_QUERY = '''
+SELECT category_id, SUM(amount) FROM transactions_{name}
+WHERE user_id = ? AND date BETWEEN ? AND ?
+GROUP BY category_id
+'''
+
+
+def object_sizes(conn, name):
+    """Return (table bytes, index bytes) measured with the dbstat virtual table"""
+    sizes = dict(conn.execute(
+        "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN (?, ?) GROUP BY name",
+        (f"transactions_{name}", f"idx_transactions_{name}")
+    ).fetchall())
+    return sizes.get(f"transactions_{name}", 0), sizes.get(f"idx_transactions_{name}", 0)
+
+
+def main():
+    from db.dates import to_epoch
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="Transactions to generate")
+    parser.add_argument("--users", type=int, default=100, help="Distinct user ids")
+    parser.add_argument("--queries", type=int, default=2000, help="Range queries per window")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+    rows = []
+    for _ in range(args.rows):
+        date = now - timedelta(seconds=rnd.randrange(3 * 365 * 86400))
+        rows.append((rnd.randrange(1, args.users + 1), rnd.randrange(1, 17), rnd.randrange(100, 500000), date))
+
+    db_file = os.path.join(tempfile.mkdtemp(prefix="family_budget_bench_"), "dates.db")
+    conn = sqlite3.connect(db_file)
+    for name, date_type in SCHEMAS.items():
+        conn.execute(f"CREATE TABLE transactions_{name} (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                     f"category_id INTEGER NOT NULL, amount INTEGER NOT NULL, date {date_type} NOT NULL)")
+        conn.execute(f"CREATE INDEX idx_transactions_{name} "
+                     f"ON transactions_{name} (user_id, date, category_id, amount)")
+
+    convert = {'text': datetime.isoformat, 'epoch': to_epoch}
+    for name in SCHEMAS:
+        conn.executemany(
+            f"INSERT INTO transactions_{name} (user_id, category_id, amount, date) VALUES (?, ?, ?, ?)",
+            ((user_id, category_id, amount, convert[name](date)) for user_id, category_id, amount, date in rows)
+        )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+    print(f"{'storage':<8} {'table MB':>9} {'index MB':>9} {'week q/s':>9} {'month q/s':>10}")
+    for name in SCHEMAS:
+        table_bytes, index_bytes = object_sizes(conn, name)
+        query = SUMMARY_QUERY.format(name=name)
+
+        rates = []
+        for days in (7, 31):
+            window_rnd = random.Random(7)
+            started = time.perf_counter()
+            for _ in range(args.queries):
+                end = now - timedelta(days=window_rnd.randrange(3 * 365 - days))
+                start = end - timedelta(days=days)
+                # Parameters are converted inside the loop, as DBHandler does per call
+                conn.execute(query, (window_rnd.randrange(1, args.users + 1),
+                                     convert[name](start), convert[name](end))).fetchall()
+            rates.append(args.queries / (time.perf_counter() - started))
+
+        print(f"{name:<8} {table_bytes / 2 ** 20:9.1f} {index_bytes / 2 ** 20:9.1f} "
+              f"{rates[0]:9.0f} {rates[1]:10.0f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
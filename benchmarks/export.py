@@ -0,0 +1,51 @@
+"""
+Benchmark of the streaming transaction export.
+
+Fills the database with synthetic transactions for a single user and
+exports them to gzip-compressed CSV and JSON Lines, reporting rows per
+second, output size and the peak memory allocated by Python during the
+export. Process RSS is not used because it also counts database pages
+mapped by SQLite's mmap.
+
+Usage:
+    python -m benchmarks.export --rows 5000000
+"""
+import argparse
+import logging
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import use_temp_database, fill_transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000000, help="Transactions to export")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import setup_database, close_pool
+    from db.exporter import export_transactions, EXPORT_FORMATS
+    setup_database()
+    close_pool()
+    fill_transactions(db_file, args.rows, users=1, days=5 * 365)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'format':<7} {'rows':>9} {'seconds':>8} {'rows/s':>9} {'MB out':>7} {'peak MB':>8}")
+    for export_format in EXPORT_FORMATS:
+        path = os.path.join(os.path.dirname(db_file), f"export.{export_format}.gz")
+        tracemalloc.start()
+        started = time.perf_counter()
+        count = export_transactions(1, path, export_format)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{export_format:<7} {count:9d} {elapsed:8.2f} {count / elapsed:9.0f} {size_mb:7.1f} {peak / 1024 / 1024:8.1f}")
+
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
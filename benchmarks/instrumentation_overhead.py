@@ -0,0 +1,116 @@
+"""
+Cost of the metrics instrumentation per call.
+
+Times the cheapest DBHandler calls the handlers make with and without the
+timing wrappers, and the handler wrapper around a callback that does
+nothing, which is its pure overhead. Every scenario first runs an untimed
+warm-up of both variants, then rounds alternate which variant goes first,
+so neither one always runs on colder caches. A small fill makes the
+category summary a realistic cached report; cache hits are not timed, so
+its overhead should be nil.
+
+Usage:
+    python -m benchmarks.instrumentation_overhead --ops 20000 --rounds 5
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+
+def timed(func, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+async def timed_async(callback, ops):
+    started = time.perf_counter()
+    for _ in range(ops):
+        await callback(None, None)
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def interleaved(rounds, plain, instrumented):
+    """
+    Time both variants in every round, the plain one first in even rounds.
+
+    Args:
+        rounds (int): Timed rounds after one untimed warm-up of each variant
+        plain: Callable returning ns per call without instrumentation
+        instrumented: Callable returning ns per call with instrumentation
+
+    Returns:
+        tuple: Median ns per call of the plain and the instrumented variant
+    """
+    plain()
+    instrumented()
+    results = {plain: [], instrumented: []}
+    for round_number in range(rounds):
+        order = (plain, instrumented) if round_number % 2 == 0 else (instrumented, plain)
+        for variant in order:
+            results[variant].append(variant())
+    return percentile(results[plain], 50), percentile(results[instrumented], 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=20000, help="Calls per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per variant, the median is reported")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import DBHandler, setup_database, close_pool, instrument_db_handler
+    from bot.instrumentation import timed_callback
+    setup_database()
+    fill_transactions(db_file, 10000, users=10)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    end = datetime.now()
+    start = end - timedelta(days=30)
+    scenarios = [
+        ("DB get_report_scope", lambda i: DBHandler.get_report_scope(1 + i % 10)),
+        ("DB get_category_summary", lambda i: DBHandler.get_category_summary((1 + i % 10,), start, end)),
+    ]
+
+    plain_methods = dict(vars(DBHandler))
+    instrument_db_handler()
+    timed_methods = dict(vars(DBHandler))
+
+    def use(methods):
+        for name, member in methods.items():
+            if isinstance(member, staticmethod):
+                setattr(DBHandler, name, member)
+
+    print(f"{'call':<26} {'plain ns':>10} {'timed ns':>10} {'overhead ns':>12} {'overhead %':>11}")
+    for name, call in scenarios:
+        def plain():
+            use(plain_methods)
+            return timed(call, args.ops)
+
+        def instrumented():
+            use(timed_methods)
+            return timed(call, args.ops)
+
+        plain_ns, timed_ns = interleaved(args.rounds, plain, instrumented)
+        print(f"{name:<26} {plain_ns:10.0f} {timed_ns:10.0f} {timed_ns - plain_ns:12.0f} "
+              f"{(timed_ns - plain_ns) / plain_ns * 100:11.1f}")
+    use(timed_methods)
+
+    async def noop(update, context):
+        return None
+
+    wrapped = timed_callback(noop, "main_conversation", "MAIN_MENU")
+    plain_ns, timed_ns = interleaved(args.rounds, lambda: asyncio.run(timed_async(noop, args.ops)),
+                                     lambda: asyncio.run(timed_async(wrapped, args.ops)))
+    print(f"{'handler no-op callback':<26} {plain_ns:10.0f} {timed_ns:10.0f} {timed_ns - plain_ns:12.0f} {'':>11}")
+
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Allocation count per update for building inline keyboards.
+
+Compares the memoized Keyboards methods with building the markup from
+scratch (the uncached functions behind the caches), using tracemalloc to
+count allocated blocks that are still alive after each call as well as the
+total number of allocations made.
+
+Usage:
+    python -m benchmarks.keyboard_allocations --updates 1000
+"""
+import argparse
+import logging
+import tracemalloc
+
+from benchmarks.common import use_temp_database
+
+
+def count_allocations(func, updates):
+    """Return (allocated blocks per call, allocated bytes per call)"""
+    results = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(updates):
+        results.append(func())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    return blocks / updates, size / updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=1000, help="Simulated updates per keyboard")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from db import setup_database, category_registry
+    from bot.keyboards import Keyboards
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    expense = category_registry.by_type("expense")
+    scenarios = [
+        ("main_menu", Keyboards.main_menu_keyboard.__wrapped__, Keyboards.main_menu_keyboard),
+        ("report_options", Keyboards.report_options_keyboard.__wrapped__, Keyboards.report_options_keyboard),
+        ("confirmation", lambda: Keyboards.confirmation_keyboard.__wrapped__(True),
+         lambda: Keyboards.confirmation_keyboard(True)),
+        ("categories", lambda: Keyboards.build_categories_keyboard(expense),
+         lambda: Keyboards.categories_keyboard(category_registry.by_type("expense"))),
+    ]
+
+    print(f"{'keyboard':<16} {'rebuilt blocks':>15} {'rebuilt bytes':>14} {'cached blocks':>14} {'cached bytes':>13}")
+    for name, rebuild, cached in scenarios:
+        cached()  # first call builds the cached markup
+        rebuilt_blocks, rebuilt_bytes = count_allocations(rebuild, args.updates)
+        cached_blocks, cached_bytes = count_allocations(cached, args.updates)
+        print(f"{name:<16} {rebuilt_blocks:15.1f} {rebuilt_bytes:14.0f} {cached_blocks:14.1f} {cached_bytes:13.0f}")
+
+
+if __name__ == "__main__":
+    main()
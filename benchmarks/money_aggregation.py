@@ -0,0 +1,63 @@
+"""
+Aggregation speed and exactness of REAL amounts against integer minor units.
+
+Generates the same random amounts in both representations, then times
+SUM() in SQLite and sum() in Python and reports how far the float totals
+drift from the exact result.
+
+Usage:
+    python -m benchmarks.money_aggregation --rows 2000000
+"""
+import argparse
+import random
+import sqlite3
+import time
+from decimal import Decimal
+
+
+def timed(func, repeat=5):
+    """Return (best seconds, result) over several runs"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000000, help="Amounts to aggregate")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    minor = [rnd.randrange(1, 500000) for _ in range(args.rows)]
+    real = [value / 100 for value in minor]
+    exact = sum(minor)
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE real_amounts (amount REAL NOT NULL)")
+    conn.execute("CREATE TABLE minor_amounts (amount INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO real_amounts VALUES (?)", ((value,) for value in real))
+    conn.executemany("INSERT INTO minor_amounts VALUES (?)", ((value,) for value in minor))
+
+    sql_real, sql_real_total = timed(lambda: conn.execute("SELECT SUM(amount) FROM real_amounts").fetchone()[0])
+    sql_minor, sql_minor_total = timed(lambda: conn.execute("SELECT SUM(amount) FROM minor_amounts").fetchone()[0])
+    py_real, py_real_total = timed(lambda: sum(real))
+    py_minor, py_minor_total = timed(lambda: sum(minor))
+
+    exact_decimal = Decimal(exact) / 100
+    print(f"{'aggregation':<22} {'ms':>8} {'total':>20} {'drift':>12}")
+    for name, seconds, total in (
+        ("SQLite SUM(REAL)", sql_real, Decimal(repr(sql_real_total))),
+        ("SQLite SUM(INTEGER)", sql_minor, Decimal(sql_minor_total) / 100),
+        ("Python sum(float)", py_real, Decimal(repr(py_real_total))),
+        ("Python sum(int)", py_minor, Decimal(py_minor_total) / 100),
+    ):
+        print(f"{name:<22} {seconds * 1000:8.2f} {total:>20} {total - exact_decimal:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Cost of persisting conversation state per update.
+
+Replays what python-telegram-bot does on every persistence run: each update
+of the run changes one user's user_data and conversation state, then the
+touched users are handed to the persistence and it is flushed. SQLite
+persistence is compared with PTB's PicklePersistence, which rewrites the
+whole pickle file whenever any user's data changes (on_flush=False) or
+only at shutdown (on_flush=True, state since the last start is lost on a
+crash). A number of idle users with stored data make the full rewrites
+realistic.
+
+Usage:
+    python -m benchmarks.persistence_overhead --users 10000 --updates 200 --runs 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from copy import deepcopy
+from datetime import datetime
+
+from benchmarks.common import use_temp_database, percentile
+
+CONVERSATION = "main_conversation"
+
+
+def user_data_for(rnd):
+    """A half-entered transaction as the handlers leave it in user_data"""
+    return {
+        'transaction_type': 'expense',
+        'category_id': rnd.randrange(1, 20),
+        'category_name': "Продукти",
+        'amount': rnd.randrange(100, 500000),
+        'custom_start_date': datetime(2024, rnd.randrange(1, 13), 1),
+    }
+
+
+async def run_variant(make_persistence, seed_persistence, users, updates, runs):
+    """Return per-update persistence cost in microseconds, one value per run"""
+    rnd = random.Random(42)
+    user_data = {user_id: user_data_for(rnd) for user_id in range(1, users + 1)}
+
+    # Existing state from earlier runs of the bot, loaded as the Application does on start
+    seed = seed_persistence()
+    await seed.get_user_data()
+    await seed.get_conversations(CONVERSATION)
+    await asyncio.gather(*(seed.update_user_data(user_id, deepcopy(data)) for user_id, data in user_data.items()))
+    await seed.flush()
+    persistence = make_persistence()
+    await persistence.get_user_data()
+    await persistence.get_conversations(CONVERSATION)
+
+    costs = []
+    for _ in range(runs):
+        touched = rnd.sample(range(1, users + 1), updates)
+        for user_id in touched:
+            user_data[user_id]['amount'] = rnd.randrange(100, 500000)
+
+        started = time.perf_counter()
+        coroutines = [persistence.update_user_data(user_id, deepcopy(user_data[user_id])) for user_id in touched]
+        coroutines += [persistence.update_conversation(CONVERSATION, (user_id, user_id), rnd.randrange(9))
+                       for user_id in touched]
+        await asyncio.gather(*coroutines)
+        await persistence.flush()
+        costs.append((time.perf_counter() - started) * 1e6 / updates)
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="Users with stored data")
+    parser.add_argument("--updates", type=int, default=200, help="Updates per persistence run")
+    parser.add_argument("--runs", type=int, default=20, help="Persistence runs per variant")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from telegram.ext import PicklePersistence
+    from db import setup_database, close_pool, shutdown_db_executor
+    from bot.persistence import SQLitePersistence
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    pickle_file = os.path.join(os.path.dirname(db_file), "state.pickle")
+
+    def pickle_seed():
+        return PicklePersistence(pickle_file, on_flush=True)
+
+    variants = (
+        ("sqlite", SQLitePersistence, SQLitePersistence),
+        ("pickle on_flush=False", lambda: PicklePersistence(pickle_file, on_flush=False), pickle_seed),
+        ("pickle on_flush=True", pickle_seed, pickle_seed),
+    )
+
+    print(f"{'variant':<24} {'p50 us/update':>14} {'p95 us/update':>14}")
+    for name, make_persistence, seed_persistence in variants:
+        if os.path.exists(pickle_file):
+            os.remove(pickle_file)
+        costs = asyncio.run(run_variant(make_persistence, seed_persistence, args.users, args.updates, args.runs))
+        print(f"{name:<24} {percentile(costs, 50):14.1f} {percentile(costs, 95):14.1f}")
+
+    shutdown_db_executor()
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
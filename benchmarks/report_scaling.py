@@ -0,0 +1,90 @@
+"""
+Report latency as the number of users grows, with a fixed number of
+transactions per user.
+
+For every user count a fresh database is filled, then one user's month
+summary is timed through DBHandler (scoped to that user, report cache
+cleared before each call) and through the unscoped all-users query the
+bot used before family scoping. Scoped latency should stay flat while the
+all-users query grows with the table.
+
+Usage:
+    python -m benchmarks.report_scaling --users 100 1000 10000 --rows-per-user 100
+"""
+import argparse
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+# Summary over every user, as get_category_summary ran before scoping
+UNSCOPED_SUMMARY_QUERY = '''
+SELECT c.name as category, c.type, SUM(t.amount) as total
+FROM transactions t
+JOIN categories c ON t.category_id = c.id
+WHERE t.date BETWEEN ? AND ?
+GROUP BY c.id
+ORDER BY c.type, total DESC
+'''
+
+
+def time_calls(func, calls):
+    """Return per-call latencies in milliseconds"""
+    latencies = []
+    for i in range(calls):
+        started = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10000], help="User counts to test")
+    parser.add_argument("--rows-per-user", type=int, default=100, help="Transactions per user")
+    parser.add_argument("--calls", type=int, default=200, help="Reports per scenario")
+    args = parser.parse_args()
+
+    base_file = use_temp_database()
+    from db import DBHandler, setup_database, configure_pool, close_pool, get_pool, report_cache
+    from db.dates import to_epoch
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # A month ending now, not on a day boundary, so the raw transactions are summed
+    end = datetime.now()
+    start = end - timedelta(days=30)
+
+    print(f"{'users':>7} {'rows':>9} {'scoped p50 ms':>14} {'scoped p95 ms':>14} {'all-users p50 ms':>17}")
+    for users in args.users:
+        db_file = os.path.join(os.path.dirname(base_file), f"scaling_{users}.db")
+        configure_pool(db_file)
+        setup_database()
+        fill_transactions(db_file, users * args.rows_per_user, users=users)
+        with get_pool().writer() as conn:
+            # The index the all-users query relied on before migration 7
+            conn.execute("CREATE INDEX idx_transactions_date ON transactions (date, category_id, amount)")
+            conn.execute("ANALYZE")
+            conn.commit()
+
+        rnd = random.Random(users)
+
+        def scoped(_):
+            report_cache.clear()
+            DBHandler.get_category_summary((rnd.randrange(1, users + 1),), start, end)
+
+        def unscoped(_):
+            with get_pool().reader() as conn:
+                conn.execute(UNSCOPED_SUMMARY_QUERY, (to_epoch(start), to_epoch(end))).fetchall()
+
+        scoped_ms = time_calls(scoped, args.calls)
+        unscoped_ms = time_calls(unscoped, max(args.calls // 10, 5))
+        print(f"{users:7d} {users * args.rows_per_user:9d} {percentile(scoped_ms, 50):14.3f} "
+              f"{percentile(scoped_ms, 95):14.3f} {percentile(unscoped_ms, 50):17.3f}")
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
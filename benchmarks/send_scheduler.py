@@ -0,0 +1,250 @@
+"""
+Outgoing message pacing against a Bot API that enforces flood limits.
+
+Starts a fake Bot API server that, like Telegram, allows a limited number
+of messages per second overall and per chat and answers anything faster
+with HTTP 429 and a retry_after. A bot then sends a burst to many busy
+chats at once: a message per chat that is edited in quick succession,
+like a progress message, followed by a few more messages. One quiet chat
+gets a message now and then during the burst; its latency shows whether
+the busy chats hold it up.
+
+The burst runs once without a rate limiter, where flood control errors
+reach the caller, and once through SendScheduler. The fake server's
+per-chat burst is smaller than the scheduler's by default, so the
+scheduler also gets flood control errors and has to wait them out for
+the affected chat only. The exit status is 1 if a request failed through
+the scheduler or a progress message did not end with its last edit.
+
+Usage:
+    python -m benchmarks.send_scheduler --chats 20 --edits 10 --messages 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+from benchmarks.common import use_temp_database, percentile
+from benchmarks.webhook_load import Server, TOKEN, BOT_USER
+
+# Chat ids: busy chats count up from 1, the quiet one is apart
+QUIET_CHAT_ID = 1000000
+
+
+class ServerBucket:
+    """Flood limit of the fake server, a token bucket telling how long until the next message is allowed"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token, returning 0 or the seconds until one is available if there is none"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FloodControlledAPI:
+    """Bot API stand-in that enforces global and per-chat flood limits and keeps every message's text"""
+
+    def __init__(self, global_rate, chat_rate, chat_burst):
+        self.global_bucket = ServerBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._lock = threading.Lock()
+        self.reset()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rsplit('/', 1)[-1]
+                params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                status, payload = api.handle(method, params)
+                payload = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.chat_buckets = {}
+            self.requests = Counter()
+            self.flood_errors = 0
+            self.texts = {}  # latest text by (chat_id, message_id)
+            self._message_id = 0
+
+    def handle(self, method, params):
+        if method == 'getMe':
+            return 200, {"ok": True, "result": BOT_USER}
+        if method not in ('sendMessage', 'editMessageText'):
+            return 200, {"ok": True, "result": True}
+
+        chat_id = int(params['chat_id'])
+        with self._lock:
+            self.requests[method] += 1
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = ServerBucket(self.chat_rate, self.chat_burst)
+            wait = max(bucket.take(), self.global_bucket.take())
+            if wait:
+                self.flood_errors += 1
+                retry_after = math.ceil(wait)
+                return 429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after}
+                }
+            if method == 'sendMessage':
+                self._message_id += 1
+                message_id = self._message_id
+            else:
+                message_id = int(params['message_id'])
+            self.texts[chat_id, message_id] = params['text']
+
+        return 200, {"ok": True, "result": {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER,
+            "text": params['text']
+        }}
+
+    def close(self):
+        self.server.shutdown()
+
+
+async def attempt(outcomes, call):
+    """Await a Bot API call, counting it as ok or by the exception it raised"""
+    try:
+        result = await call
+    except Exception as err:
+        outcomes[type(err).__name__] += 1
+        return None
+    outcomes['ok'] += 1
+    return result
+
+
+async def busy_chat(bot, chat_id, edits, messages, outcomes, progress):
+    """A progress message edited edits times without waiting, then messages more messages"""
+    message = await attempt(outcomes, bot.send_message(chat_id, "step 0"))
+    if message is not None:
+        await asyncio.gather(*(
+            attempt(outcomes, bot.edit_message_text(f"step {step}", chat_id=chat_id, message_id=message.message_id))
+            for step in range(1, edits + 1)
+        ))
+        progress[chat_id] = message.message_id
+    await asyncio.gather(*(attempt(outcomes, bot.send_message(chat_id, f"message {i}")) for i in range(messages)))
+
+
+async def quiet_chat(bot, count, interval, outcomes, latencies):
+    """A message every interval seconds, timing each"""
+    for i in range(count):
+        started = time.perf_counter()
+        if await attempt(outcomes, bot.send_message(QUIET_CHAT_ID, f"quiet {i}")) is not None:
+            latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def run_variant(api, rate_limiter, args):
+    from telegram.ext import ExtBot
+    from telegram.request import HTTPXRequest
+
+    bot = ExtBot(TOKEN, base_url=f"http://127.0.0.1:{api.port}/bot", rate_limiter=rate_limiter,
+                 request=HTTPXRequest(connection_pool_size=256))
+    outcomes = Counter()
+    progress = {}
+    latencies = []
+    async with bot:
+        api.reset()
+        started = time.perf_counter()
+        await asyncio.gather(
+            quiet_chat(bot, args.quiet_messages, args.quiet_interval, outcomes, latencies),
+            *(busy_chat(bot, chat_id, args.edits, args.messages, outcomes, progress)
+              for chat_id in range(1, args.chats + 1))
+        )
+        elapsed = time.perf_counter() - started
+
+    final_edits = sum(api.texts.get((chat_id, message_id)) == f"step {args.edits}"
+                      for chat_id, message_id in progress.items())
+    return {
+        'elapsed_s': elapsed,
+        'calls': sum(outcomes.values()),
+        'failed': sum(count for name, count in outcomes.items() if name != 'ok'),
+        'errors': {name: count for name, count in outcomes.items() if name != 'ok'},
+        'edit_requests': api.requests['editMessageText'],
+        'flood_errors': api.flood_errors,
+        'final_edits': final_edits,
+        'quiet_sent': len(latencies),
+        'quiet_p50_ms': percentile(latencies, 50) if latencies else None,
+        'quiet_max_ms': max(latencies) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20, help="Busy chats")
+    parser.add_argument("--edits", type=int, default=10, help="Edits of each busy chat's progress message")
+    parser.add_argument("--messages", type=int, default=3, help="Messages per busy chat after the edits")
+    parser.add_argument("--quiet-messages", type=int, default=5, help="Messages to the quiet chat")
+    parser.add_argument("--quiet-interval", type=float, default=1.5, help="Seconds between quiet chat messages")
+    parser.add_argument("--server-global-rate", type=float, default=30, help="Messages per second the server allows")
+    parser.add_argument("--server-chat-rate", type=float, default=1, help="Messages per second per chat")
+    parser.add_argument("--server-chat-burst", type=int, default=3, help="Messages a chat may get at once")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from bot.send_scheduler import SendScheduler
+    # The scheduler logs every flood control error it waits out, the table counts them
+    logging.getLogger().setLevel(logging.ERROR)
+
+    api = FloodControlledAPI(args.server_global_rate, args.server_chat_rate, args.server_chat_burst)
+    requested_edits = args.chats * args.edits
+    print(f"{args.chats} busy chats x (1 message, {args.edits} edits, {args.messages} messages), "
+          f"quiet chat every {args.quiet_interval:g} s")
+    print(f"{'variant':<10} {'calls':>6} {'failed':>7} {'429s':>5} {'edits sent':>11} {'final ok':>9} "
+          f"{'quiet p50':>10} {'quiet max':>10} {'time':>7}")
+    results = {}
+    try:
+        for name, rate_limiter in (('none', None), ('scheduler', SendScheduler())):
+            stats = results[name] = asyncio.run(run_variant(api, rate_limiter, args))
+            quiet_p50 = f"{stats['quiet_p50_ms']:.0f} ms" if stats['quiet_sent'] else '-'
+            quiet_max = f"{stats['quiet_max_ms']:.0f} ms" if stats['quiet_sent'] else '-'
+            print(f"{name:<10} {stats['calls']:6d} {stats['failed']:7d} {stats['flood_errors']:5d} "
+                  f"{stats['edit_requests']:5d}/{requested_edits:<5d} {stats['final_edits']:4d}/{args.chats:<4d} "
+                  f"{quiet_p50:>10} {quiet_max:>10} {stats['elapsed_s']:6.1f}s")
+            if stats['errors']:
+                print(f"{'':<10} errors: {stats['errors']}")
+    finally:
+        api.close()
+
+    scheduled = results['scheduler']
+    if scheduled['failed'] or scheduled['final_edits'] != args.chats:
+        print("FAIL: requests failed through the scheduler or progress messages missed their last edit")
+        raise SystemExit(1)
+    print("OK: every request went through and every progress message shows its last edit")
+
+
+if __name__ == "__main__":
+    main()
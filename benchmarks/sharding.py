@@ -0,0 +1,87 @@
+"""
+Write throughput and all-user aggregates with 1 shard against N shards.
+
+For each shard count a fresh set of database files is created. Writer
+threads then add single transactions for their own users, one commit
+each, as the bot does in normal mode. Afterwards the admin summary over
+every user, which runs on all shards in parallel, is timed, and the size
+of the largest shard file (without its WAL) is reported.
+
+Usage:
+    python -m benchmarks.sharding --shards 1 4 --threads 8 --rows 20000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, percentile
+
+
+def run(shard_count, threads, rows, users, summaries):
+    from db import DBHandler, setup_database, configure_pool, close_pool, shard_directory, shutdown_shard_executor
+    from db.shards import shard_stats
+
+    configure_pool(os.path.join(tempfile.mkdtemp(prefix="family_budget_shards_"), "bench.db"))
+    shard_directory.shard_count = shard_count
+    setup_database()
+
+    per_thread = rows // threads
+    users_per_thread = max(1, users // threads)
+    errors = []
+
+    def write(index):
+        try:
+            first_user = index * users_per_thread + 1
+            for i in range(per_thread):
+                DBHandler.add_transaction(first_user + i % users_per_thread, 1 + i % 10, 100 + i)
+        except Exception as err:
+            errors.append(err)
+
+    workers = [threading.Thread(target=write, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    write_rate = per_thread * threads / (time.perf_counter() - started)
+    if errors:
+        raise errors[0]
+
+    end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+    start = (end - timedelta(days=29)).replace(hour=0, minute=0, second=0, microsecond=0)
+    latencies = []
+    for _ in range(summaries):
+        started = time.perf_counter()
+        DBHandler.get_admin_summary(start, end)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    largest = max(os.path.getsize(stats['file']) for stats in shard_stats())
+    shutdown_shard_executor()
+    close_pool()
+    return write_rate, percentile(latencies, 50), largest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs='+', default=[1, 4], help="Shard counts to compare")
+    parser.add_argument("--threads", type=int, default=8, help="Writer threads")
+    parser.add_argument("--rows", type=int, default=20000, help="Transactions written per shard count")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users")
+    parser.add_argument("--summaries", type=int, default=50, help="Admin summaries timed")
+    args = parser.parse_args()
+
+    use_temp_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'shards':>6} {'writes/s':>9} {'admin summary p50 ms':>21} {'largest file MB':>16}")
+    for shard_count in args.shards:
+        write_rate, summary_ms, largest = run(shard_count, args.threads, args.rows, args.users, args.summaries)
+        print(f"{shard_count:6d} {write_rate:9.0f} {summary_ms:21.2f} {largest / 1024 / 1024:16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of the streaming CSV statement import.
+
+Writes a synthetic statement with a mix of known and unknown categories,
+then imports it with StatementImport and reports rows per second and the
+growth of the process's peak resident memory during the import. Before
+that it checks that a row dated with a UTC offset is imported in local
+time and lands in both the daily and the monthly rollup.
+
+Usage:
+    python -m benchmarks.statement_import --rows 500000
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import random
+import resource
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database
+
+
+def write_statement(path, rows, seed=42):
+    """Write a synthetic bank statement CSV"""
+    from db.models import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+
+    rnd = random.Random(seed)
+    now = datetime.now()
+    names = INCOME_CATEGORIES + EXPENSE_CATEGORIES + ['Unknown shop', '']
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(['date', 'amount', 'category', 'description'])
+        for _ in range(rows):
+            date = now - timedelta(seconds=rnd.randrange(3 * 365 * 86400))
+            amount = f"{rnd.uniform(-5000, 5000):.2f}".replace('.', ',')
+            writer.writerow([date.strftime('%d.%m.%Y %H:%M'), amount, rnd.choice(names), 'card payment'])
+
+
+def check_offset_dates(user_id=2):
+    """
+    Import a statement row with a UTC offset and check that the daily and the
+    monthly rollup both count it, with a cached report of its day to invalidate.
+
+    Raises:
+        AssertionError: If a rollup misses the row
+    """
+    from db import DBHandler
+    from db.importer import StatementImport, parse_date
+
+    value = "2024-03-31T23:30:00-05:00"
+    date = parse_date(value)
+    assert date.tzinfo is None, "offset dates must be converted to naive local time"
+    day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1, microseconds=-1)
+    assert DBHandler.get_category_summary((user_id,), day_start, day_end) == []
+
+    statement = StatementImport(user_id, io.StringIO(f"date;amount;category\n{value};-12,50;\n"))
+    assert statement.run() == 1, "the offset row was skipped"
+
+    daily = DBHandler.get_category_summary((user_id,), day_start, day_end)
+    monthly = DBHandler.get_monthly_totals((user_id,), date, date)
+    assert [row['total'] for row in daily] == [1250], f"daily rollup: {daily}"
+    month = date.replace(day=1, hour=0, minute=0, second=0)
+    assert [(row['month'], row['total']) for row in monthly] == [(month, 1250)], \
+        f"monthly rollup: {monthly}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000, help="Rows in the synthetic statement")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Override IMPORT_CHUNK_SIZE")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import setup_database, close_pool
+    from db.importer import StatementImport
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+    check_offset_dates()
+    print("offset dates: imported in local time into both rollups")
+
+    path = os.path.join(os.path.dirname(db_file), "statement.csv")
+    write_statement(path, args.rows)
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        kwargs = {'chunk_size': args.chunk_size} if args.chunk_size else {}
+        statement = StatementImport(1, file, **kwargs)
+        statement.run()
+    elapsed = time.perf_counter() - started
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    print(f"statement: {args.rows} rows, {size_mb:.1f} MB")
+    print(f"imported {statement.imported}, skipped {statement.skipped} in {elapsed:.2f} s "
+          f"({statement.imported / elapsed:.0f} rows/s), peak RSS growth {rss_growth / 1024:.1f} MB")
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Reproducible benchmark suite with JSON results.
+
+Generates a synthetic dataset (see benchmarks/datagen.py) in a temporary
+database, then times the bot's main paths:
+
+    add_transaction        DBHandler.add_transaction, one commit per call
+    get_transactions       one user's transactions of a month
+    get_category_summary   one user's month summary, report cache cleared
+    show_formatted_report  the report handler end to end through
+                           AsyncDBHandler, with Telegram replaced by a stub
+                           message that only keeps the text
+
+Users and months are drawn from a seeded random generator, so every run
+issues the same calls against the same data. Scenarios run in several
+interleaved rounds and every statistic is the median over the rounds,
+which keeps a burst of background load from skewing a single scenario.
+Results go to a JSON file together with the commit, the dataset and the
+environment; compare two files with benchmarks/compare.py. Each round
+also times a fixed pure-Python workload, so comparisons can factor out a
+machine that is slower or busier as a whole.
+
+Usage:
+    python -m benchmarks.suite --users 200 --categories 30 --years 3 --ops 500
+    python -m benchmarks.compare bench-<old>.json bench-<new>.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from benchmarks.common import use_temp_database, percentile
+from benchmarks.datagen import add_arguments, dataset_options, generate, month_starts
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("add_transaction", "get_transactions", "get_category_summary", "show_formatted_report")
+
+
+class StubMessage:
+    """Stands in for telegram.Message, keeping the last text instead of sending it"""
+
+    def __init__(self):
+        self.text = None
+
+    async def reply_text(self, text, reply_markup=None):
+        self.text = text
+
+
+def stub_update(user_id):
+    """A message update from user_id as far as the report handler looks at it"""
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=StubMessage(), callback_query=None)
+
+
+def month_range(month):
+    """Return the first and the last instant of a month"""
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    return month, next_month - timedelta(microseconds=1)
+
+
+def git_revision():
+    """Return (commit, dirty) of the working tree, (None, None) outside a git checkout"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def summarize(latencies, elapsed):
+    """Latency statistics in microseconds of one round of a scenario"""
+    return {
+        'ops': len(latencies),
+        'mean_us': sum(latencies) / len(latencies),
+        'p50_us': percentile(latencies, 50),
+        'p95_us': percentile(latencies, 95),
+        'p99_us': percentile(latencies, 99),
+        'max_us': max(latencies),
+        'ops_per_s': len(latencies) / elapsed,
+    }
+
+
+def combine(rounds):
+    """Median of every statistic over the rounds of a scenario, plus the p50 of each round"""
+    combined = {key: percentile([stats[key] for stats in rounds], 50) for key in rounds[0]}
+    combined['ops'] = sum(stats['ops'] for stats in rounds)
+    combined['rounds_p50_us'] = [stats['p50_us'] for stats in rounds]
+    return combined
+
+
+def calibrate():
+    """Time a fixed CPU-bound workload in microseconds, a yardstick of the machine's speed"""
+    rnd = random.Random(0)
+    values = [rnd.random() for _ in range(20000)]
+    started = time.perf_counter()
+    for _ in range(5):
+        sorted(values)
+        json.dumps(values[:2000])
+        sum(value * value for value in values)
+    return (time.perf_counter() - started) * 1e6
+
+
+def run_scenario(name, ops, warmup, users, months, rnd):
+    """
+    Time ops calls of a scenario after warmup untimed ones.
+
+    Args:
+        name (str): One of SCENARIOS
+        ops (int): Timed calls
+        warmup (int): Untimed calls first
+        users (int): Users of the dataset
+        months (list): First day of every month of the dataset
+        rnd (random.Random): Source of the users and months to query
+
+    Returns:
+        dict: Latency statistics, see summarize()
+    """
+    from db import DBHandler, report_cache
+    from bot.handlers.report_handler import show_formatted_report
+
+    income_ids = [row[0] for row in DBHandler.get_categories("income")]
+
+    def pick():
+        return rnd.randint(1, users), month_range(rnd.choice(months))
+
+    def add_transaction():
+        DBHandler.add_transaction(rnd.randint(1, users), rnd.choice(income_ids), rnd.randrange(100, 500000))
+
+    def get_transactions():
+        user_id, (start, end) = pick()
+        DBHandler.get_transactions(user_id, start, end)
+
+    def get_category_summary():
+        user_id, (start, end) = pick()
+        report_cache.clear()
+        DBHandler.get_category_summary((user_id,), start, end)
+
+    async def render_reports(count, latencies):
+        for _ in range(count):
+            user_id, (start, end) = pick()
+            update = stub_update(user_id)
+            report_cache.clear()
+            started = time.perf_counter()
+            await show_formatted_report(update, None, start, end, start.strftime("%m.%Y"))
+            latencies.append((time.perf_counter() - started) * 1e6)
+            assert update.message.text
+
+    if name == "show_formatted_report":
+        asyncio.run(render_reports(warmup, []))
+        latencies = []
+        started = time.perf_counter()
+        asyncio.run(render_reports(ops, latencies))
+        return summarize(latencies, time.perf_counter() - started)
+
+    call = {
+        'add_transaction': add_transaction,
+        'get_transactions': get_transactions,
+        'get_category_summary': get_category_summary,
+    }[name]
+    for _ in range(warmup):
+        call()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(ops):
+        call_started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - call_started) * 1e6)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--ops", type=int, default=200, help="Timed calls per scenario and round")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds, statistics are the median over them")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed calls per scenario and round")
+    parser.add_argument("--scenarios", nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="Scenarios to run")
+    parser.add_argument("--output", help="JSON results file, bench-<commit>.json by default")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from db import setup_database, close_pool, shutdown_db_executor, shutdown_shard_executor
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    dataset = generate(**dataset_options(args))
+    dataset['generate_s'] = round(time.perf_counter() - started, 2)
+    print(f"Generated {dataset['transactions']} transactions in {dataset['generate_s']} s")
+
+    months = month_starts(datetime.strptime(args.end, "%Y-%m-%d"), args.years)
+    # Writes go last in every round, they add rows outside the dataset's months anyway
+    scenarios = sorted(args.scenarios, key=lambda scenario: (scenario == "add_transaction", SCENARIOS.index(scenario)))
+    rounds = {name: [] for name in scenarios}
+    calibration = []
+    for round_number in range(args.rounds):
+        calibration.append(calibrate())
+        for name in scenarios:
+            rnd = random.Random(f"{args.seed}:{name}:{round_number}")
+            rounds[name].append(run_scenario(name, args.ops, args.warmup, args.users, months, rnd))
+
+    results = {}
+    print(f"{'scenario':<24} {'ops':>6} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'ops/s':>9} {'p50 spread':>11}")
+    for name in scenarios:
+        stats = results[name] = combine(rounds[name])
+        spread = (max(stats['rounds_p50_us']) - min(stats['rounds_p50_us'])) / stats['p50_us'] * 100
+        print(f"{name:<24} {stats['ops']:6d} {stats['p50_us']:10.1f} {stats['p95_us']:10.1f} "
+              f"{stats['p99_us']:10.1f} {stats['ops_per_s']:9.0f} {spread:10.0f}%")
+    print(f"calibration workload: {percentile(calibration, 50):.0f} us")
+
+    shutdown_db_executor()
+    shutdown_shard_executor()
+    close_pool()
+
+    commit, dirty = git_revision()
+    document = {
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'calibration_us': percentile(calibration, 50),
+        },
+        'dataset': dataset,
+        'options': {'ops': args.ops, 'rounds': args.rounds, 'warmup': args.warmup},
+        'scenarios': results,
+    }
+    output = args.output or f"bench-{(commit or 'local')[:10]}.json"
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2)
+        file.write('\n')
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
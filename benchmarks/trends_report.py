@@ -0,0 +1,81 @@
+"""
+Trend report latency from the monthly_totals rollup against per-month
+range aggregations.
+
+Fills a database with several years of history, then times fetching 24
+months of per-category totals for one user three ways: 24 summaries over
+raw transactions, 24 summaries over the daily_totals rollup, and the one
+monthly_totals query the trends report uses. The report cache is cleared
+before every report.
+
+Usage:
+    python -m benchmarks.trends_report --rows 1000000 --years 5
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import use_temp_database, fill_transactions, percentile
+
+
+def month_ranges(months):
+    """Return (start, end) of the last months, oldest first, ends one microsecond before the next month"""
+    current = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    starts = [current]
+    for _ in range(months - 1):
+        starts.insert(0, (starts[0] - timedelta(days=1)).replace(day=1))
+    ends = [start - timedelta(microseconds=1) for start in starts[1:]]
+    ends.append((current + timedelta(days=32)).replace(day=1) - timedelta(microseconds=1))
+    return list(zip(starts, ends))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="Transactions to generate")
+    parser.add_argument("--users", type=int, default=10, help="Distinct user ids")
+    parser.add_argument("--years", type=int, default=5, help="Years of history")
+    parser.add_argument("--months", type=int, default=24, help="Months in the report")
+    parser.add_argument("--reports", type=int, default=100, help="Reports per variant")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import DBHandler, setup_database, close_pool, report_cache
+    setup_database()
+    fill_transactions(db_file, args.rows, users=args.users, days=args.years * 365)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    ranges = month_ranges(args.months)
+    user_ids = (1,)
+
+    def raw_summaries():
+        # Ending a second early keeps the ranges off the daily rollup
+        for start, end in ranges:
+            DBHandler.get_category_summary(user_ids, start, end - timedelta(seconds=1))
+
+    def daily_summaries():
+        for start, end in ranges:
+            DBHandler.get_category_summary(user_ids, start, end)
+
+    def monthly_totals():
+        DBHandler.get_monthly_totals(user_ids, ranges[0][0], ranges[-1][0])
+
+    print(f"{'variant':<28} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, queries, func in (
+        ("raw transaction summaries", len(ranges), raw_summaries),
+        ("daily_totals summaries", len(ranges), daily_summaries),
+        ("monthly_totals query", 1, monthly_totals),
+    ):
+        latencies = []
+        for _ in range(args.reports):
+            report_cache.clear()
+            started = time.perf_counter()
+            func()
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<28} {queries:7d} {percentile(latencies, 50):8.3f} {percentile(latencies, 95):8.3f}")
+
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
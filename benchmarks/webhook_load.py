@@ -0,0 +1,232 @@
+"""
+Webhook throughput and tail latency under concurrent chats.
+
+Starts a fake Bot API server, runs the bot in webhook mode against it
+with a temporary database, then posts /start updates from many chats at
+once. Latency is measured from posting an update to the bot's last API
+call for it (the main menu message). The fake API can add a delay to
+every call to stand in for the round trip to Telegram, which is where
+concurrent update processing pays off. Each variant runs the bot in a
+fresh process with a different CONCURRENT_UPDATES value; 1 is the old
+sequential behaviour.
+
+Usage:
+    python -m benchmarks.webhook_load --chats 200 --messages 5 --api-delay-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import httpx
+
+from benchmarks.common import percentile
+
+# The bot is started from the repository root whatever the current directory
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+TOKEN = "123456:BENCHMARK"
+SECRET_TOKEN = "benchmark-secret"
+BOT_USER = {
+    "id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot",
+    "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False
+}
+
+# /start answers with a greeting and then the main menu
+REPLIES_PER_UPDATE = 2
+
+
+class Server(ThreadingHTTPServer):
+    # The default backlog of 5 resets connections when the bot opens many at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeBotAPI:
+    """Bot API stand-in that records when each chat was sent a message"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.replies = defaultdict(list)
+        self.webhook_set = threading.Event()
+        self._lock = threading.Lock()
+        self._message_id = 0
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rsplit('/', 1)[-1]
+                params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                result = api.handle(method, params)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'setWebhook':
+            self.webhook_set.set()
+            return True
+        if method not in ('sendMessage', 'editMessageText'):
+            return True
+
+        time.sleep(self.delay)
+        chat_id = int(params['chat_id'])
+        with self._lock:
+            self._message_id += 1
+            self.replies[chat_id].append(time.perf_counter())
+            message_id = self._message_id
+        return {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER,
+            "text": params.get('text', '')
+        }
+
+    def reset(self):
+        with self._lock:
+            self.replies.clear()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+            "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+        }
+    }
+
+
+def start_bot(api, webhook_port, db_file, concurrent_updates):
+    """Run main.py in webhook mode against the fake API and wait until it registered its webhook"""
+    env = dict(
+        os.environ,
+        BOT_TOKEN=TOKEN,
+        TELEGRAM_BASE_URL=f"http://127.0.0.1:{api.port}/bot",
+        BOT_MODE='webhook',
+        WEBHOOK_LISTEN='127.0.0.1',
+        WEBHOOK_PORT=str(webhook_port),
+        WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}/telegram",
+        WEBHOOK_URL_PATH='telegram',
+        WEBHOOK_SECRET_TOKEN=SECRET_TOKEN,
+        CONCURRENT_UPDATES=str(concurrent_updates),
+        SQLITE_DB_FILE=db_file,
+    )
+    api.webhook_set.clear()
+    process = subprocess.Popen([sys.executable, str(REPO_ROOT / 'main.py')], env=env, cwd=REPO_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not api.webhook_set.wait(30):
+        process.kill()
+        raise RuntimeError("the bot did not register its webhook")
+    return process
+
+
+def stop_bot(process):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def post_updates(webhook_port, chats, messages):
+    """Post `messages` updates per chat, chats in parallel, returning the post times per chat"""
+    url = f"http://127.0.0.1:{webhook_port}/telegram"
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+    sent = defaultdict(list)
+    limits = httpx.Limits(max_connections=100)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def chat(chat_id):
+            for i in range(messages):
+                sent[chat_id].append(time.perf_counter())
+                response = await client.post(url, json=start_update(chat_id * messages + i, chat_id), headers=headers)
+                response.raise_for_status()
+
+        await asyncio.gather(*(chat(chat_id) for chat_id in range(1, chats + 1)))
+    return sent
+
+
+def run_variant(api, chats, messages, concurrent_updates):
+    webhook_port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        process = start_bot(api, webhook_port, os.path.join(directory, 'bench.db'), concurrent_updates)
+        try:
+            api.reset()
+            started = time.perf_counter()
+            sent = asyncio.run(post_updates(webhook_port, chats, messages))
+
+            expected = chats * messages * REPLIES_PER_UPDATE
+            deadline = time.monotonic() + 300
+            while sum(len(replies) for replies in api.replies.values()) < expected and time.monotonic() < deadline:
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - started
+        finally:
+            stop_bot(process)
+
+    latencies = []
+    for chat_id, posted in sent.items():
+        # Updates of a chat are handled in order, so every second reply closes the next update
+        done = api.replies[chat_id][REPLIES_PER_UPDATE - 1::REPLIES_PER_UPDATE]
+        latencies.extend((finished - post) * 1000 for post, finished in zip(posted, done))
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200, help="Chats posting at the same time")
+    parser.add_argument("--messages", type=int, default=5, help="Updates per chat, posted one after another")
+    parser.add_argument("--api-delay-ms", type=float, default=50, help="Delay of every fake Bot API reply")
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 64],
+                        help="CONCURRENT_UPDATES values to compare")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.api_delay_ms / 1000)
+    updates = args.chats * args.messages
+    print(f"{'concurrent':>10} {'updates/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'answered':>9}")
+    try:
+        for concurrent_updates in args.concurrency:
+            elapsed, latencies = run_variant(api, args.chats, args.messages, concurrent_updates)
+            print(f"{concurrent_updates:10d} {len(latencies) / elapsed:10.1f} {percentile(latencies, 50):8.1f} "
+                  f"{percentile(latencies, 95):8.1f} {percentile(latencies, 99):8.1f} {len(latencies):>4}/{updates}")
+    finally:
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
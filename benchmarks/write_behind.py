@@ -0,0 +1,72 @@
+"""
+Throughput of per-row commits against the write-behind queue.
+
+Also simulates a crash: rows are submitted to a queue that never flushes,
+the queue is abandoned, and the journal is replayed as on the next start.
+
+Usage:
+    python -m benchmarks.write_behind --rows 20000
+"""
+import argparse
+import logging
+import os
+import time
+
+from benchmarks.common import use_temp_database
+
+
+def count_transactions():
+    from db import get_pool
+    with get_pool().reader() as conn:
+        return conn.execute("SELECT COUNT(*) AS count FROM transactions").fetchone()['count']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Transactions per scenario")
+    args = parser.parse_args()
+
+    db_file = use_temp_database()
+    from db import DBHandler, WriteBehindQueue, setup_database, close_pool
+    from db.write_behind import replay_journal
+    setup_database()
+    logging.getLogger().setLevel(logging.WARNING)
+    journal_file = f"{db_file}.bench-journal"
+
+    started = time.perf_counter()
+    for i in range(args.rows):
+        DBHandler.add_transaction(1 + i % 10, 1 + i % 18, 1000)
+    per_row = args.rows / (time.perf_counter() - started)
+
+    queue = WriteBehindQueue(journal_file)
+    queue.start()
+    started = time.perf_counter()
+    for i in range(args.rows):
+        queue.submit(1 + i % 10, 1 + i % 18, 1000)
+    submitted = time.perf_counter() - started
+    queue.stop()
+    committed = time.perf_counter() - started
+
+    print(f"{'path':<28} {'rows/s':>10}")
+    print(f"{'per-row commit':<28} {per_row:10.0f}")
+    print(f"{'write-behind (submit)':<28} {args.rows / submitted:10.0f}")
+    print(f"{'write-behind (committed)':<28} {args.rows / committed:10.0f}")
+
+    # Crash simulation: nothing is flushed before the queue goes away
+    before = count_transactions()
+    crashed = WriteBehindQueue(journal_file, flush_interval_ms=3600 * 1000, max_rows=10 ** 9)
+    crashed.start()
+    for i in range(1000):
+        crashed.submit(1, 1, 100)
+    crashed._stopping = True
+    crashed._journal.close()
+
+    replayed = replay_journal(journal_file)
+    after = count_transactions()
+    print(f"crash replay: {replayed} rows replayed, {after - before} rows added, "
+          f"journal size after replay {os.path.getsize(journal_file)} bytes")
+    close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
-from .conversations import setup_conversation_handler
+from .conversations import setup_conversation_handler, STATE_NAMES
+from .persistence import SQLitePersistence
+from .instrumentation import InstrumentedRequest, instrument_handlers
+from .send_scheduler import SendScheduler
 
-__all__ = ['setup_conversation_handler']
+__all__ = ['setup_conversation_handler', 'STATE_NAMES', 'SQLitePersistence',
+           'InstrumentedRequest', 'instrument_handlers', 'SendScheduler']
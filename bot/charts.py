@@ -0,0 +1,198 @@
+"""
+Chart images for reports.
+
+Charts are rendered with matplotlib, an optional dependency, in a pool of
+worker processes so a burst of requests never blocks the event loop.
+Rendered images are kept in ChartCache under a key that includes a digest
+of the summary they show. Once an image has been uploaded, the cache keeps
+the Telegram file_id instead of the bytes, so later requests for the same
+data cost neither rendering nor upload.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from config import logger, CHART_RENDER_WORKERS, CHART_CACHE_MAX_ENTRIES
+
+CHART_KINDS = ('pie', 'bar')
+
+CHARTS_AVAILABLE = importlib.util.find_spec('matplotlib') is not None
+
+# Slices smaller than this share of the pie are merged into "Інше"
+PIE_MIN_SHARE = 0.03
+
+INCOME_COLOR = '#4caf50'
+EXPENSE_COLOR = '#e57373'
+
+
+def render_chart(kind, title, items):
+    """
+    Render a chart of category totals as PNG. Runs in a worker process.
+
+    Args:
+        kind (str): 'pie' for the expense split, 'bar' for every category
+        title (str): Chart title
+        items (list): (category, type, total) tuples, totals in minor units
+
+    Returns:
+        bytes: The PNG image
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 6), dpi=100)
+    axes = figure.subplots()
+    axes.set_title(title)
+
+    if kind == 'pie':
+        expenses = [(name, total / 100) for name, item_type, total in items if item_type == 'expense' and total > 0]
+        expenses.sort(key=lambda item: item[1], reverse=True)
+        grand_total = sum(value for _, value in expenses)
+        shown = [item for item in expenses if item[1] >= grand_total * PIE_MIN_SHARE]
+        rest = grand_total - sum(value for _, value in shown)
+        if rest > 0:
+            shown.append(("Інше", rest))
+        if shown:
+            axes.pie([value for _, value in shown], labels=[name for name, _ in shown],
+                     autopct='%1.1f%%', startangle=90, counterclock=False)
+            axes.axis('equal')
+        else:
+            axes.text(0.5, 0.5, "Нема витрат", ha='center', va='center')
+            axes.axis('off')
+    else:
+        ordered = sorted(items, key=lambda item: (item[1] != 'income', -item[2]))
+        labels = [name for name, _, _ in ordered]
+        values = [total / 100 for _, _, total in ordered]
+        colors = [INCOME_COLOR if item_type == 'income' else EXPENSE_COLOR for _, item_type, _ in ordered]
+        axes.barh(labels, values, color=colors)
+        axes.invert_yaxis()
+        axes.grid(axis='x', alpha=0.3)
+        figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def summary_digest(summary):
+    """Return a short digest identifying the data of a category summary"""
+    digest = hashlib.blake2b(digest_size=12)
+    for item in summary:
+        digest.update(f"{item['category']}\x1f{item['type']}\x1f{item['total']}\x1e".encode())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """
+    LRU cache of chart images keyed by (scope, start, end, kind, data digest).
+
+    A value is either the PNG bytes of a rendered chart or, once it was sent,
+    the Telegram file_id of the uploaded photo. Because the key contains a
+    digest of the summary, new transactions never make an entry stale; they
+    produce a different key and the old entry ages out.
+    """
+
+    def __init__(self, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached PNG bytes or file_id (str), or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store PNG bytes or replace them with the file_id of the uploaded photo"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached chart"""
+        with self._lock:
+            self._entries.clear()
+
+
+chart_cache = ChartCache()
+
+# Worker processes for rendering, created on first use
+_executor = None
+
+
+def get_chart_executor():
+    """Return the process pool that renders charts"""
+    global _executor
+    if _executor is None:
+        # Fresh interpreters, the bot process has threads and open database connections
+        _executor = ProcessPoolExecutor(
+            max_workers=CHART_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+async def render_chart_async(kind, title, items):
+    """Render a chart in the process pool and await the PNG bytes"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_chart_executor(), render_chart, kind, title, items)
+
+
+# Renders in flight by cache key, so identical concurrent requests share one render
+_pending_renders = {}
+
+
+async def get_chart(key, kind, title, items):
+    """
+    Get a chart from the cache or render it in the process pool.
+
+    Args:
+        key (tuple): ChartCache key of the chart
+        kind (str): 'pie' or 'bar'
+        title (str): Chart title
+        items (list): (category, type, total) tuples
+
+    Returns:
+        bytes | str: PNG bytes to upload, or the file_id of an earlier upload
+    """
+    cached = chart_cache.get(key)
+    if cached is not None:
+        return cached
+
+    render = _pending_renders.get(key)
+    if render is None:
+        render = asyncio.ensure_future(render_chart_async(kind, title, items))
+        _pending_renders[key] = render
+        try:
+            png = await asyncio.shield(render)
+        finally:
+            del _pending_renders[key]
+        chart_cache.put(key, png)
+        return png
+
+    return await asyncio.shield(render)
+
+
+def shutdown_chart_executor():
+    """Stop the chart worker processes"""
+    global _executor
+    if _executor is not None:
+        logger.info("Shutting down chart renderer...")
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
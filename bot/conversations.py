@@ -15,6 +15,7 @@ from .handlers.report_handler import (
     handle_custom_date_end,
     cancel_date_selection
 )
+from .handlers.import_handler import start_import, handle_statement_file
 from config import (
     MAIN_MENU,
     SELECT_CATEGORY,
@@ -23,9 +24,23 @@ from config import (
     CONFIRM_RECORD,
     GENERATE_REPORT,
     CUSTOM_DATE_START,
-    CUSTOM_DATE_END
+    CUSTOM_DATE_END,
+    IMPORT_STATEMENT
 )
 
+# State names for logs and metric labels
+STATE_NAMES = {
+    MAIN_MENU: 'MAIN_MENU',
+    SELECT_CATEGORY: 'SELECT_CATEGORY',
+    ENTER_AMOUNT: 'ENTER_AMOUNT',
+    ADD_RECORD: 'ADD_RECORD',
+    CONFIRM_RECORD: 'CONFIRM_RECORD',
+    GENERATE_REPORT: 'GENERATE_REPORT',
+    CUSTOM_DATE_START: 'CUSTOM_DATE_START',
+    CUSTOM_DATE_END: 'CUSTOM_DATE_END',
+    IMPORT_STATEMENT: 'IMPORT_STATEMENT',
+}
+
 
 def setup_conversation_handler():
     """
@@ -35,7 +50,10 @@ def setup_conversation_handler():
         ConversationHandler: The configured conversation handler
     """
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[
+            CommandHandler("start", start),
+            CommandHandler("import", start_import)
+        ],
         states={
             MAIN_MENU: [
                 CallbackQueryHandler(handle_main_menu)
@@ -63,11 +81,18 @@ def setup_conversation_handler():
                 CallbackQueryHandler(cancel_date_selection, pattern="^cancel_date$"),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_custom_date_end)
             ],
+            IMPORT_STATEMENT: [
+                MessageHandler(filters.Document.ALL, handle_statement_file)
+            ],
         },
         fallbacks=[
             CommandHandler("cancel", cancel),
-            CommandHandler("start", start)
+            CommandHandler("start", start),
+            CommandHandler("import", start_import)
         ],
+        # States are kept by SQLitePersistence across restarts
+        name="main_conversation",
+        persistent=True,
     )
 
     return conv_handler
@@ -8,11 +8,17 @@ from .transaction_handler import (
     handle_confirmation,
     handle_description
 )
-from .report_handler import show_report_options, generate_report
+from .report_handler import show_report_options, generate_report, trends_command
+from .import_handler import start_import, handle_statement_file
+from .export_handler import export_command
+from .family_handler import family_command
+from .chart_handler import chart_command
 
 __all__ = [
     'start', 'show_main_menu', 'cancel', 'help_command',
     'handle_main_menu', 'show_categories', 'handle_category_selection',
     'handle_amount', 'handle_confirmation', 'handle_description',
-    'show_report_options', 'generate_report'
+    'show_report_options', 'generate_report', 'trends_command',
+    'start_import', 'handle_statement_file', 'export_command',
+    'family_command', 'chart_command'
 ]
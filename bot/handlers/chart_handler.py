@@ -0,0 +1,55 @@
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from db import AsyncDBHandler
+from db.sqlite_handler import DASHBOARD_PERIODS
+from ..charts import CHART_KINDS, CHARTS_AVAILABLE, chart_cache, get_chart, summary_digest
+from .report_handler import period_range, show_formatted_report
+
+CHART_USAGE = (
+    f"Використання: /chart [{'|'.join(CHART_KINDS)}] [{'|'.join(DASHBOARD_PERIODS)}]\n"
+    "Наприклад: /chart pie month"
+)
+
+
+async def chart_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Send the report for a period together with a chart of its category split.
+    Usage: /chart [pie|bar] [today|week|month|previous_month]
+
+    Args:
+        update: The update object
+        context: The context object
+    """
+    if not CHARTS_AVAILABLE:
+        await update.message.reply_text("Графіки недоступні: на сервері не встановлено matplotlib.")
+        return
+
+    kind, period = 'pie', 'month'
+    for arg in (arg.lower() for arg in context.args or ()):
+        if arg in CHART_KINDS:
+            kind = arg
+        elif arg in DASHBOARD_PERIODS:
+            period = arg
+        else:
+            await update.message.reply_text(CHART_USAGE)
+            return
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date, end_date, period_name = period_range(period, today)
+    await show_formatted_report(update, context, start_date, end_date, period_name)
+
+    # Served from the report cache, show_formatted_report just read it
+    user_ids = await AsyncDBHandler.get_report_scope(update.effective_user.id)
+    summary = await AsyncDBHandler.get_category_summary(user_ids, start_date, end_date)
+    if not summary:
+        return
+
+    key = (frozenset(user_ids), start_date, end_date, kind, summary_digest(summary))
+    items = [(item['category'], item['type'], item['total']) for item in summary]
+    photo = await get_chart(key, kind, f"{period_name} ({start_date:%d.%m.%Y} - {end_date:%d.%m.%Y})", items)
+
+    message = await update.message.reply_photo(photo=photo)
+    if isinstance(photo, bytes):
+        # Later requests for the same data resend the uploaded photo by id
+        chart_cache.put(key, message.photo[-1].file_id)
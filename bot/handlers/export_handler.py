@@ -0,0 +1,52 @@
+import os
+import tempfile
+from telegram import Update
+from telegram.ext import ContextTypes
+from db.exporter import export_own_transactions_async, EXPORT_FORMATS
+
+# Largest document the Bot API lets a bot send
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Export the user's transactions and send them as a compressed document.
+    Usage: /export [csv|jsonl]
+
+    Args:
+        update: The update object
+        context: The context object
+    """
+    export_format = context.args[0].lower() if context.args else 'csv'
+    if export_format not in EXPORT_FORMATS:
+        await update.message.reply_text(f"Формат експорту: {', '.join(EXPORT_FORMATS)}. Наприклад: /export csv")
+        return
+
+    progress_message = await update.message.reply_text("Готую експорт...")
+
+    fd, path = tempfile.mkstemp(suffix=f'.{export_format}.gz')
+    os.close(fd)
+    try:
+        count = await export_own_transactions_async(update.effective_user.id, path, export_format)
+        if count == 0:
+            await progress_message.edit_text("Немає транзакцій для експорту.")
+            return
+
+        size = os.path.getsize(path)
+        if size > MAX_DOCUMENT_SIZE:
+            await progress_message.edit_text(
+                f"Експорт завеликий для Telegram: {size / 1024 / 1024:.1f} МБ при максимумі 50 МБ "
+                f"({count} транзакцій). Зверніться до адміністратора бота за повним експортом."
+            )
+            return
+
+        with open(path, 'rb') as document:
+            await update.message.reply_document(
+                document=document,
+                filename=f"transactions.{export_format}.gz",
+                caption=f"Транзакцій: {count}"
+            )
+        await progress_message.edit_text("Експорт готовий!")
+
+    finally:
+        os.remove(path)
@@ -0,0 +1,64 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from db import AsyncDBHandler
+
+FAMILY_USAGE = (
+    "Сімейні звіти об'єднують транзакції всіх учасників сім'ї.\n\n"
+    "/family create [назва] - Створити сім'ю\n"
+    "/family join <код> - Приєднатися за кодом запрошення\n"
+    "/family leave - Вийти з сім'ї"
+)
+
+
+async def family_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Show or change the user's family group.
+    Usage: /family [create [name] | join <code> | leave]
+
+    Args:
+        update: The update object
+        context: The context object
+    """
+    user_id = update.effective_user.id
+    action = context.args[0].lower() if context.args else None
+
+    if action == "create":
+        name = " ".join(context.args[1:]) or f"Сім'я {update.effective_user.first_name}"
+        family = await AsyncDBHandler.create_family(user_id, name)
+        await update.message.reply_text(
+            f"Сім'ю «{family['name']}» створено.\n"
+            f"Код запрошення: {family['invite_code']}\n"
+            f"Інші учасники можуть приєднатися командою /family join {family['invite_code']}"
+        )
+        return
+
+    if action == "join" and len(context.args) == 2:
+        family = await AsyncDBHandler.join_family(user_id, context.args[1])
+        if family is None:
+            await update.message.reply_text("Сім'ю з таким кодом не знайдено.")
+            return
+        await update.message.reply_text(f"Ви приєдналися до сім'ї «{family['name']}».")
+        return
+
+    if action == "leave":
+        if await AsyncDBHandler.leave_family(user_id):
+            await update.message.reply_text("Ви вийшли з сім'ї. Звіти знову показують лише ваші транзакції.")
+        else:
+            await update.message.reply_text("Ви не є учасником жодної сім'ї.")
+        return
+
+    if action is not None:
+        await update.message.reply_text(FAMILY_USAGE)
+        return
+
+    family = await AsyncDBHandler.get_family(user_id)
+    if family is None:
+        await update.message.reply_text(f"Ви не є учасником жодної сім'ї.\n\n{FAMILY_USAGE}")
+        return
+
+    members = await AsyncDBHandler.get_report_scope(user_id)
+    await update.message.reply_text(
+        f"Сім'я «{family['name']}», учасників: {len(members)}\n"
+        f"Код запрошення: {family['invite_code']}\n\n"
+        f"{FAMILY_USAGE}"
+    )
@@ -0,0 +1,103 @@
+import csv
+import os
+import tempfile
+import time
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from db import run_in_db_executor
+from db.importer import StatementImport
+from .start_handler import show_main_menu
+from config import logger, IMPORT_STATEMENT
+
+# Minimum seconds between progress message edits, keeps clear of flood limits
+PROGRESS_EDIT_INTERVAL = 2.0
+
+# Largest file the Bot API lets a bot download with getFile
+MAX_STATEMENT_SIZE = 20 * 1024 * 1024
+
+
+async def start_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Ask the user to upload a bank statement.
+
+    Args:
+        update: The update object
+        context: The context object
+
+    Returns:
+        int: The IMPORT_STATEMENT state
+    """
+    await update.message.reply_text(
+        "Надішліть CSV-файл з банківською випискою.\n"
+        "Колонки: date, amount, category, description.\n"
+        "Від'ємні суми вважаються витратами."
+    )
+    return IMPORT_STATEMENT
+
+
+async def handle_statement_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Download an uploaded statement and import it chunk by chunk,
+    editing a progress message while the import runs.
+
+    Args:
+        update: The update object
+        context: The context object
+
+    Returns:
+        int: The next conversation state
+    """
+    document = update.message.document
+    if not (document.file_name or '').lower().endswith('.csv'):
+        await update.message.reply_text("Підтримуються лише CSV-файли. Надішліть файл з розширенням .csv:")
+        return IMPORT_STATEMENT
+
+    if document.file_size and document.file_size > MAX_STATEMENT_SIZE:
+        await update.message.reply_text(
+            "Файл завеликий: Telegram дозволяє ботам завантажувати файли до 20 МБ. "
+            "Розділіть виписку на кілька файлів і надішліть їх по черзі:"
+        )
+        return IMPORT_STATEMENT
+
+    progress_message = await update.message.reply_text("Завантаження файлу...")
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        try:
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_drive(path)
+        except TelegramError as err:
+            await progress_message.edit_text(f"Не вдалося завантажити файл: {err}\nСпробуйте надіслати його ще раз:")
+            return IMPORT_STATEMENT
+
+        statement = None
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            try:
+                statement = await run_in_db_executor(StatementImport, update.effective_user.id, file)
+
+                last_edit = time.monotonic()
+                while await run_in_db_executor(statement.import_chunk):
+                    if time.monotonic() - last_edit >= PROGRESS_EDIT_INTERVAL:
+                        try:
+                            await progress_message.edit_text(f"Імпортовано рядків: {statement.imported}...")
+                        except TelegramError as err:
+                            # A missed progress update must not stop the import
+                            logger.warning(f"Could not update import progress: {err}")
+                        last_edit = time.monotonic()
+
+            except (ValueError, csv.Error) as err:
+                imported = statement.imported if statement else 0
+                await progress_message.edit_text(
+                    f"Не вдалося прочитати файл: {err}\nІмпортовано рядків до помилки: {imported}"
+                )
+                return IMPORT_STATEMENT
+
+    finally:
+        os.remove(path)
+
+    await progress_message.edit_text(
+        f"Імпорт завершено! Додано: {statement.imported}, пропущено: {statement.skipped}."
+    )
+    return await show_main_menu(update, context)
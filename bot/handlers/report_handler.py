@@ -2,10 +2,58 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime, timedelta
 from ..keyboards import Keyboards
-from db import DBHandler
+from db import AsyncDBHandler
+from db.sqlite_handler import DASHBOARD_PERIODS
+from db.money import format_minor
 from .start_handler import show_main_menu
 from config import GENERATE_REPORT, CUSTOM_DATE_START, CUSTOM_DATE_END
 
+# Number of months shown by the trends report, /trends accepts up to the maximum
+TRENDS_DEFAULT_MONTHS = 12
+TRENDS_MAX_MONTHS = 24
+
+SPARKLINE_BLOCKS = "▁▂▃▄▅▆▇█"
+
+
+def period_range(period, today):
+    """
+    Get the date range of a named report period.
+
+    Args:
+        period: One of "today", "week", "month" or "previous_month"
+        today: Midnight of the current day
+
+    Returns:
+        tuple: (start_date, end_date, period_name), end_date is the last instant of the period
+    """
+    if period == "today":
+        start_date = today
+        end_date = today + timedelta(days=1)
+        period_name = "Сьогодні"
+    elif period == "week":
+        start_date = today - timedelta(days=today.weekday())
+        end_date = start_date + timedelta(days=7)
+        period_name = "Цей тиждень"
+    elif period == "month":
+        start_date = today.replace(day=1)
+        end_date = next_month_start(start_date)
+        period_name = "Цей місяць"
+    elif period == "previous_month":
+        end_date = today.replace(day=1)
+        start_date = (end_date - timedelta(days=1)).replace(day=1)
+        period_name = "Минулий місяць"
+    else:
+        raise ValueError(f"Unknown report period: {period}")
+
+    return start_date, end_date - timedelta(microseconds=1), period_name
+
+
+def next_month_start(month_start):
+    """Get the first day of the month following month_start"""
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
 
 async def show_report_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
@@ -45,6 +93,9 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if query.data == "back_to_main":
         return await show_main_menu(update, context)
 
+    if query.data == "reports":
+        return await show_report_options(update, context)
+
     if query.data == "report_custom":
         # Handle custom date range selection
         await query.edit_message_text(
@@ -53,25 +104,18 @@ async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return CUSTOM_DATE_START
 
-    user_id = update.effective_user.id
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
+    if query.data == "report_dashboard":
+        await show_dashboard_report(update, context, today)
+        return GENERATE_REPORT
+
+    if query.data == "report_trends":
+        await show_trends_report(update, context, TRENDS_DEFAULT_MONTHS)
+        return GENERATE_REPORT
+
     # Set date range based on selection
-    if query.data == "report_today":
-        start_date = today
-        end_date = today + timedelta(days=1) - timedelta(microseconds=1)
-        period_name = "Сьогодні"
-    elif query.data == "report_week":
-        start_date = today - timedelta(days=today.weekday())
-        end_date = start_date + timedelta(days=7) - timedelta(microseconds=1)
-        period_name = "Цей тиждень"
-    elif query.data == "report_month":
-        start_date = today.replace(day=1)
-        if today.month == 12:
-            end_date = today.replace(year=today.year + 1, month=1, day=1) - timedelta(microseconds=1)
-        else:
-            end_date = today.replace(month=today.month + 1, day=1) - timedelta(microseconds=1)
-        period_name = "Цей місяць"
+    start_date, end_date, period_name = period_range(query.data.removeprefix("report_"), today)
 
     # Generate and show the report
     await show_formatted_report(update, context, start_date, end_date, period_name)
@@ -192,12 +236,17 @@ async def show_formatted_report(update: Update, context: ContextTypes.DEFAULT_TY
         end_date: The end date of the report period
         period_name: The name of the period for display
     """
-    # Get transaction summary
-    summary = DBHandler.get_category_summary(start_date, end_date)
+    # Get transaction summary for the user, or the whole family if they have one
+    user_ids = await AsyncDBHandler.get_report_scope(update.effective_user.id)
+    summary = await AsyncDBHandler.get_category_summary(user_ids, start_date, end_date)
 
     # Format the report
-    report = f"📊 Звіт за період: {period_name} 📊\n\n"
+    report = f"📊 Звіт за період: {period_name} 📊\n"
+    if len(user_ids) > 1:
+        report += f"👨‍👩‍👧 Сімейний звіт ({len(user_ids)} учасн.)\n"
+    report += "\n"
 
+    # Totals are integer minor units, summed exactly
     total_income = 0
     total_expense = 0
 
@@ -207,14 +256,14 @@ async def show_formatted_report(update: Update, context: ContextTypes.DEFAULT_TY
     for item in summary:
         if item['type'] == 'income':
             has_income = True
-            amount = float(item['total'])
+            amount = item['total']
             total_income += amount
-            report += f"• {item['category']}: {amount:.2f}\n"
+            report += f"• {item['category']}: {format_minor(amount)}\n"
 
     if not has_income:
         report += "• Нема доходів за вибраний період\n"
 
-    report += f"\nЗагальні доходи: {total_income:.2f}\n\n"
+    report += f"\nЗагальні доходи: {format_minor(total_income)}\n\n"
 
     # Process expenses
     report += "💸 Витрати:\n"
@@ -222,19 +271,19 @@ async def show_formatted_report(update: Update, context: ContextTypes.DEFAULT_TY
     for item in summary:
         if item['type'] == 'expense':
             has_expenses = True
-            amount = float(item['total'])
+            amount = item['total']
             total_expense += amount
-            report += f"• {item['category']}: {amount:.2f}\n"
+            report += f"• {item['category']}: {format_minor(amount)}\n"
 
     if not has_expenses:
         report += "• Нема витрат за вибраний період\n"
 
-    report += f"\nЗагальні витрати: {total_expense:.2f}\n\n"
+    report += f"\nЗагальні витрати: {format_minor(total_expense)}\n\n"
 
     # Balance
     balance = total_income - total_expense
     status = "✅ Баланс" if balance >= 0 else "⚠️ DEFICIT"
-    report += f"{status}: {abs(balance):.2f}\n"
+    report += f"{status}: {format_minor(abs(balance))}\n"
 
     if total_income > 0:
         savings_rate = (balance / total_income) * 100 if balance > 0 else 0
@@ -254,3 +303,161 @@ async def show_formatted_report(update: Update, context: ContextTypes.DEFAULT_TY
             text=report,
             reply_markup=reply_markup
         )
+
+
+async def show_dashboard_report(update: Update, context: ContextTypes.DEFAULT_TYPE, today):
+    """
+    Display today, this week, this month and the previous month side by side.
+    All four periods come from a single summary query.
+
+    Args:
+        update: The update object
+        context: The context object
+        today: Midnight of the current day
+    """
+    periods = {period: period_range(period, today)[:2] for period in DASHBOARD_PERIODS}
+    user_ids = await AsyncDBHandler.get_report_scope(update.effective_user.id)
+    summary = await AsyncDBHandler.get_dashboard_summary(user_ids, periods)
+
+    report = "📊 Огляд: сьогодні / тиждень / місяць (минулий місяць) 📊\n"
+    if len(user_ids) > 1:
+        report += f"👨‍👩‍👧 Сімейний звіт ({len(user_ids)} учасн.)\n"
+
+    totals = {}
+    for transaction_type, title, total_title in (
+        ("income", "💰 Дохід:", "Загальні доходи"),
+        ("expense", "💸 Витрати:", "Загальні витрати"),
+    ):
+        report += f"\n{title}\n"
+        type_totals = dict.fromkeys(DASHBOARD_PERIODS, 0)
+        for item in summary:
+            if item['type'] != transaction_type:
+                continue
+            for period in DASHBOARD_PERIODS:
+                type_totals[period] += item[period]
+            report += f"• {item['category']}: {format_period_totals(item)}\n"
+
+        if not any(item['type'] == transaction_type for item in summary):
+            report += "• Нема записів за ці періоди\n"
+        report += f"{total_title}: {format_period_totals(type_totals)}\n"
+        totals[transaction_type] = type_totals
+
+    balance = {period: totals['income'][period] - totals['expense'][period] for period in DASHBOARD_PERIODS}
+    report += f"\n⚖️ Баланс: {format_period_totals(balance)}\n"
+
+    previous_expense = totals['expense']['previous_month']
+    if previous_expense > 0:
+        change = (totals['expense']['month'] - previous_expense) / previous_expense * 100
+        report += f"Витрати цього місяця: {change:+.1f}% до минулого\n"
+
+    await update.callback_query.edit_message_text(
+        text=report,
+        reply_markup=Keyboards.report_navigation_keyboard()
+    )
+
+
+def format_period_totals(totals):
+    """Format per-period totals as 'today / week / month (previous month)'"""
+    return (f"{format_minor(totals['today'])} / {format_minor(totals['week'])} / "
+            f"{format_minor(totals['month'])} ({format_minor(totals['previous_month'])})")
+
+
+async def trends_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Show the monthly trends report.
+    Usage: /trends [months]
+
+    Args:
+        update: The update object
+        context: The context object
+    """
+    try:
+        months = int(context.args[0]) if context.args else TRENDS_DEFAULT_MONTHS
+    except ValueError:
+        months = 0
+    if not 2 <= months <= TRENDS_MAX_MONTHS:
+        await update.message.reply_text(f"Кількість місяців: від 2 до {TRENDS_MAX_MONTHS}. Наприклад: /trends 12")
+        return
+
+    await show_trends_report(update, context, months)
+
+
+async def show_trends_report(update: Update, context: ContextTypes.DEFAULT_TYPE, months):
+    """
+    Display monthly totals with month-over-month changes for the last months.
+    Totals come from the monthly_totals rollup in a single query.
+
+    Args:
+        update: The update object
+        context: The context object
+        months: Number of months to show, the current one included
+    """
+    current = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_starts = [current]
+    for _ in range(months - 1):
+        month_starts.insert(0, (month_starts[0] - timedelta(days=1)).replace(day=1))
+
+    user_ids = await AsyncDBHandler.get_report_scope(update.effective_user.id)
+    totals = await AsyncDBHandler.get_monthly_totals(user_ids, month_starts[0], current)
+
+    # category -> type and month -> total
+    categories = {}
+    by_type = {'income': dict.fromkeys(month_starts, 0), 'expense': dict.fromkeys(month_starts, 0)}
+    for row in totals:
+        _, series = categories.setdefault(row['category'], (row['type'], dict.fromkeys(month_starts, 0)))
+        series[row['month']] = row['total']
+        by_type[row['type']][row['month']] += row['total']
+
+    report = f"📈 Тренди за {months} міс. 📈\n"
+    if len(user_ids) > 1:
+        report += f"👨‍👩‍👧 Сімейний звіт ({len(user_ids)} учасн.)\n"
+
+    report += "\nМісяць: доходи / витрати (зміна витрат)\n"
+    for index, month in enumerate(month_starts):
+        expense = by_type['expense'][month]
+        previous = by_type['expense'][month_starts[index - 1]] if index else None
+        report += (f"{month.strftime('%m.%Y')}: {format_minor(by_type['income'][month])} / "
+                   f"{format_minor(expense)} ({format_change(expense, previous)})\n")
+
+    year_ago = month_starts[-13] if months > 12 else None
+    if year_ago is not None:
+        report += (f"\nВитрати рік до року ({current.strftime('%m.%Y')} / {year_ago.strftime('%m.%Y')}): "
+                   f"{format_change(by_type['expense'][current], by_type['expense'][year_ago])}\n")
+
+    for transaction_type, title in (("expense", "💸 Витрати"), ("income", "💰 Дохід")):
+        rows = [(name, series) for name, (category_type, series) in categories.items()
+                if category_type == transaction_type]
+        if not rows:
+            continue
+
+        report += f"\n{title} за категоріями (цей місяць, зміна, динаміка):\n"
+        rows.sort(key=lambda item: sum(item[1].values()), reverse=True)
+        for name, series in rows:
+            values = [series[month] for month in month_starts]
+            report += (f"• {name}: {format_minor(values[-1])} ({format_change(values[-1], values[-2])}) "
+                       f"{sparkline(values)}\n")
+
+    if not categories:
+        report += "\nНема транзакцій за ці місяці\n"
+
+    reply_markup = Keyboards.report_navigation_keyboard()
+    if update.callback_query:
+        await update.callback_query.edit_message_text(text=report, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text=report, reply_markup=reply_markup)
+
+
+def format_change(value, previous):
+    """Format the relative change from previous to value, '—' when there is nothing to compare"""
+    if not previous:
+        return "—"
+    return f"{(value - previous) / previous * 100:+.1f}%"
+
+
+def sparkline(values):
+    """Draw non-negative values as a row of block characters scaled to the largest one"""
+    peak = max(values)
+    if peak <= 0:
+        return SPARKLINE_BLOCKS[0] * len(values)
+    top = len(SPARKLINE_BLOCKS) - 1
+    return "".join(SPARKLINE_BLOCKS[round(value / peak * top)] for value in values)
@@ -80,6 +80,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "*Main Commands:*\n"
         "/start - Start the bot and show main menu\n"
         "/help - Show this help message\n"
+        "/import - Import a bank statement (CSV)\n"
+        "/export [csv|jsonl] - Download all your transactions\n"
+        "/family - Share reports with your family\n"
+        "/trends [months] - Monthly totals and changes\n"
+        "/chart [pie|bar] [period] - Report with a category chart\n"
         "/cancel - Cancel current operation\n\n"
 
         "*How to use:*\n"
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from ..keyboards import Keyboards
-from db import DBHandler
+from db import AsyncDBHandler, category_registry
+from db.money import parse_money, to_minor, format_minor
 from .start_handler import show_main_menu
 from .report_handler import show_report_options
 from config import SELECT_CATEGORY, ENTER_AMOUNT, CONFIRM_RECORD, ADD_RECORD, MAIN_MENU
@@ -45,7 +46,7 @@ async def show_categories(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         int: The SELECT_CATEGORY state
     """
     transaction_type = context.user_data.get("transaction_type")
-    categories = DBHandler.get_categories(transaction_type)
+    categories = category_registry.by_type(transaction_type)
 
     reply_markup = Keyboards.categories_keyboard(categories)
 
@@ -79,7 +80,7 @@ async def handle_category_selection(update: Update, context: ContextTypes.DEFAUL
     context.user_data["category_id"] = category_id
 
     # Get category name for confirmation
-    category_info = DBHandler.get_category_info(category_id)
+    category_info = category_registry.get(category_id)
     context.user_data["category_name"] = category_info['name']
 
     await query.edit_message_text(
@@ -103,7 +104,8 @@ async def handle_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     amount_text = update.message.text.strip()
 
     try:
-        amount = float(amount_text)
+        # Amounts are kept as integer kopecks from here on
+        amount = to_minor(parse_money(amount_text))
         if amount <= 0:
             await update.message.reply_text("Будь ласка введіть коректну суму.")
             return ENTER_AMOUNT
@@ -117,7 +119,7 @@ async def handle_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         reply_markup = Keyboards.confirmation_keyboard(with_description=True)
 
         await update.message.reply_text(
-            f"Ви додали {transaction_type} на {amount:.2f} у категорії '{category_name}'.\n"
+            f"Ви додали {transaction_type} на {format_minor(amount)} у категорії '{category_name}'.\n"
             f"Хочете додати опис чи підтвердити цю дію?",
             reply_markup=reply_markup
         )
@@ -158,7 +160,7 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
         amount = context.user_data.get("amount")
         description = context.user_data.get("description", None)
 
-        DBHandler.add_transaction(user_id, category_id, amount, description)
+        await AsyncDBHandler.add_transaction(user_id, category_id, amount, description)
 
         await query.edit_message_text("Успішно додано!")
 
@@ -193,7 +195,7 @@ async def handle_description(update: Update, context: ContextTypes.DEFAULT_TYPE)
     reply_markup = Keyboards.confirmation_keyboard(with_description=False)
 
     await update.message.reply_text(
-        f"Ви додали {transaction_type} на {amount:.2f} у категорії '{category_name}'.\n"
+        f"Ви додали {transaction_type} на {format_minor(amount)} у категорії '{category_name}'.\n"
         f"Опис: {description}\n\n"
         f"Підтвердити?",
         reply_markup=reply_markup
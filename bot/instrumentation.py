@@ -0,0 +1,151 @@
+"""
+Timing of update handlers and Bot API requests, and conversation transitions.
+
+instrument_handlers() wraps the callback of every handler registered on the
+application, including the entry points, states and fallbacks of
+conversation handlers. Each call records its duration and any exception,
+and callbacks of a conversation also count the transition from the state
+they are registered for to the state they return.
+
+Bot API calls such as reply_text (sendMessage) and edit_message_text
+(editMessageText) all end up in the bot's request object, so
+InstrumentedRequest times them per API method in one place.
+"""
+import time
+from functools import wraps
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+from metrics import registry
+
+HANDLER_SECONDS = registry.histogram(
+    'family_budget_handler_seconds', 'Duration of update handler callbacks', ('handler',))
+HANDLER_ERRORS = registry.counter(
+    'family_budget_handler_errors_total', 'Update handler callbacks that raised', ('handler', 'error'))
+CONVERSATION_TRANSITIONS = registry.counter(
+    'family_budget_conversation_transitions_total', 'Conversation state changes made by handlers',
+    ('conversation', 'from_state', 'to_state'))
+TELEGRAM_API_SECONDS = registry.histogram(
+    'family_budget_telegram_api_seconds', 'Duration of Bot API requests', ('method',))
+TELEGRAM_API_ERRORS = registry.counter(
+    'family_budget_telegram_api_errors_total', 'Bot API requests that failed', ('method', 'error'))
+
+# Pseudo states for callbacks that are not registered under a conversation state
+ENTRY_STATE = 'entry'
+FALLBACK_STATE = 'fallback'
+
+
+def state_label(state, state_names):
+    """Return the name of a conversation state for metric labels"""
+    if state == ConversationHandler.END:
+        return 'END'
+    return state_names.get(state, str(state))
+
+
+def timed_callback(callback, conversation=None, from_state=None, state_names=None):
+    """
+    Wrap a handler callback so its calls are timed.
+
+    Args:
+        callback: The async handler callback
+        conversation (str): Name of the conversation the callback belongs to, if any
+        from_state (str): Label of the state the callback is registered for
+        state_names (dict): Names of the conversation's states by value
+
+    Returns:
+        The wrapping coroutine function
+    """
+    name = callback.__name__
+    seconds = HANDLER_SECONDS.labels(name)
+    state_names = state_names or {}
+    transitions = {}  # counter child by returned state
+
+    def count_transition(new_state):
+        child = transitions.get(new_state)
+        if child is None:
+            # Returning None keeps the conversation where it is
+            to_state = from_state if new_state is None else state_label(new_state, state_names)
+            child = transitions[new_state] = CONVERSATION_TRANSITIONS.labels(conversation, from_state, to_state)
+        child.inc()
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            new_state = await callback(update, context)
+        except Exception as err:
+            HANDLER_ERRORS.labels(name, type(err).__name__).inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+        if conversation is not None:
+            count_transition(new_state)
+        return new_state
+    return wrapper
+
+
+def instrument_handler(handler, state_names=None):
+    """
+    Time a handler's callback in place, or those of every handler of a conversation.
+
+    Args:
+        handler: A handler registered on the application
+        state_names (dict): Names of conversation states by value, for transition labels
+    """
+    if isinstance(handler, ConversationHandler):
+        state_names = state_names or {}
+        conversation = handler.name or 'conversation'
+        groups = [(ENTRY_STATE, handler.entry_points), (FALLBACK_STATE, handler.fallbacks)]
+        groups += [(state_label(state, state_names), handlers) for state, handlers in handler.states.items()]
+        for from_state, handlers in groups:
+            for inner in handlers:
+                if not hasattr(inner.callback, '__wrapped__'):
+                    inner.callback = timed_callback(inner.callback, conversation, from_state, state_names)
+    elif not hasattr(handler.callback, '__wrapped__'):
+        handler.callback = timed_callback(handler.callback)
+
+
+def instrument_handlers(application, state_names=None):
+    """
+    Time every handler registered on the application. Handlers added later are not timed.
+
+    Args:
+        application: The telegram Application
+        state_names (dict): Names of conversation states by value, for transition labels
+    """
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler, state_names)
+
+
+def api_method(url):
+    """Return the Bot API method of a request URL, e.g. sendMessage"""
+    return url.rsplit('/', 1)[-1]
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """
+    HTTPXRequest that times every Bot API request by method.
+
+    Failed requests are counted by exception, e.g. RetryAfter for flood
+    control, BadRequest or TimedOut.
+    """
+
+    __slots__ = ()
+
+    async def post(self, url, *args, **kwargs):
+        return await self._timed(api_method(url), super().post(url, *args, **kwargs))
+
+    async def retrieve(self, url, *args, **kwargs):
+        # File downloads, labelled as one method instead of by file path
+        return await self._timed('download', super().retrieve(url, *args, **kwargs))
+
+    @staticmethod
+    async def _timed(method, request):
+        started = time.perf_counter()
+        try:
+            return await request
+        except Exception as err:
+            TELEGRAM_API_ERRORS.labels(method, type(err).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_API_SECONDS.labels(method).observe(time.perf_counter() - started)
@@ -1,12 +1,30 @@
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from db import category_registry
+
+# Category keyboards keyed by their (id, name) tuples, dropped when categories change
+_categories_keyboards = {}
+
+
+def _reset_categories_keyboards(registry):
+    _categories_keyboards.clear()
+
+
+category_registry.add_listener(_reset_categories_keyboards)
 
 
 class Keyboards:
     """
-    Class for creating keyboard layouts used in the bot
+    Class for creating keyboard layouts used in the bot.
+
+    Telegram objects are immutable, so every keyboard is built once and the
+    same markup is returned on later calls. Static keyboards are memoized
+    for the lifetime of the process, category keyboards until the category
+    registry reports a change.
     """
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def main_menu_keyboard():
         """Create the main menu keyboard"""
         keyboard = [
@@ -21,6 +39,24 @@ class Keyboards:
         """
         Create a keyboard with categories
 
+        Args:
+            categories (list): List of (id, name) tuples
+
+        Returns:
+            InlineKeyboardMarkup: Keyboard with category buttons
+        """
+        key = tuple(categories)
+        reply_markup = _categories_keyboards.get(key)
+        if reply_markup is None:
+            reply_markup = Keyboards.build_categories_keyboard(key)
+            _categories_keyboards[key] = reply_markup
+        return reply_markup
+
+    @staticmethod
+    def build_categories_keyboard(categories):
+        """
+        Build a new keyboard with categories, bypassing the cache
+
         Args:
             categories (list): List of (id, name) tuples
 
@@ -35,6 +71,7 @@ class Keyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def confirmation_keyboard(with_description=False):
         """
         Create a keyboard for transaction confirmation
@@ -60,18 +97,22 @@ class Keyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def report_options_keyboard():
         """Create the report options keyboard"""
         keyboard = [
+            [InlineKeyboardButton("Огляд: день, тиждень, місяць", callback_data="report_dashboard")],
             [InlineKeyboardButton("Сьогодні", callback_data="report_today")],
             [InlineKeyboardButton("Цей тиждень", callback_data="report_week")],
             [InlineKeyboardButton("Цей місяць", callback_data="report_month")],
             [InlineKeyboardButton("Свій період", callback_data="report_custom")],
+            [InlineKeyboardButton("Тренди за 12 місяців", callback_data="report_trends")],
             [InlineKeyboardButton("Назад", callback_data="back_to_main")]
         ]
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def report_navigation_keyboard():
         """Create the keyboard for report navigation"""
         keyboard = [
@@ -81,6 +122,7 @@ class Keyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def date_cancel_keyboard():
         """Create a keyboard with just a cancel button"""
         keyboard = [
@@ -0,0 +1,168 @@
+"""
+Conversation state that survives restarts.
+
+SQLitePersistence keeps the ConversationHandler states and context.user_data
+in the bot's SQLite database. Values are stored as JSON, one row per user
+and per conversation, so a flush only writes what changed instead of
+pickling the whole state.
+
+python-telegram-bot collects the users and conversations touched by updates
+and hands them to the persistence every update_interval seconds. Each call
+only encodes the value and stages it if it differs from what is stored, and
+all staged rows of a run go to the database in one transaction on the DB
+executor. A value staged twice before its commit is written once.
+"""
+import asyncio
+import json
+from datetime import date, datetime
+from telegram.ext import BasePersistence, PersistenceInput
+from config import logger, PERSISTENCE_FLUSH_INTERVAL_MS
+from db import AsyncDBHandler
+
+
+def _encode_value(value):
+    """json.dumps hook for the non-JSON values handlers keep in user_data"""
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} values can not be persisted")
+
+
+def _decode_object(obj):
+    """json.loads hook reversing _encode_value"""
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def dump_json(value):
+    """Encode a value the same way every time, so unchanged values compare equal"""
+    return json.dumps(value, default=_encode_value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def load_json(text):
+    """Decode a value written by dump_json"""
+    return json.loads(text, object_hook=_decode_object)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence for conversation states and user_data in the SQLite database.
+
+    Chat data, bot data and callback data are not used by the bot and are
+    not stored.
+    """
+
+    def __init__(self, flush_interval_ms=PERSISTENCE_FLUSH_INTERVAL_MS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval_ms / 1000
+        )
+        # Last value written or staged per row, to skip writing unchanged values
+        self._stored_user_data = {}
+        self._stored_states = {}
+
+        # Rows waiting for the next commit, None deletes the row
+        self._pending_user_data = {}
+        self._pending_states = {}
+        self._commit_task = None
+
+    async def get_user_data(self):
+        """Load the user_data of every user"""
+        rows = await AsyncDBHandler.get_all_user_data()
+        self._stored_user_data.update(rows)
+        return {user_id: load_json(data) for user_id, data in rows.items()}
+
+    async def get_conversations(self, name):
+        """Load the states of a conversation handler"""
+        rows = await AsyncDBHandler.get_conversation_states(name)
+        self._stored_states.update(((name, key), state) for key, state in rows.items())
+        return {tuple(json.loads(key)): load_json(state) for key, state in rows.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        """Stage a changed conversation state, None ends the conversation"""
+        row = (name, json.dumps(key))
+        state = None if new_state is None else dump_json(new_state)
+        if self._stored_states.get(row) != state:
+            self._stored_states[row] = state
+            self._pending_states[row] = state
+            self._schedule_commit()
+
+    async def update_user_data(self, user_id, data):
+        """Stage changed user_data, an empty dict deletes the user's row"""
+        try:
+            encoded = dump_json(data) if data else None
+        except TypeError as err:
+            logger.error(f"Not persisting user_data of user {user_id}: {err}")
+            return
+        if self._stored_user_data.get(user_id) != encoded:
+            self._stored_user_data[user_id] = encoded
+            self._pending_user_data[user_id] = encoded
+            self._schedule_commit()
+
+    async def drop_user_data(self, user_id):
+        """Stage the removal of a user's data"""
+        await self.update_user_data(user_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        """Nothing to refresh, the bot's in-memory user_data is authoritative"""
+
+    async def flush(self):
+        """Wait for the running commit and write anything still staged"""
+        if self._commit_task is not None:
+            await self._commit_task
+        await self._commit()
+
+    def _schedule_commit(self):
+        # update_persistence() stages all rows of a run before this task gets
+        # to run, so the whole run goes out in one transaction
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.create_task(self._commit())
+
+    async def _commit(self):
+        while self._pending_user_data or self._pending_states:
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            states, self._pending_states = self._pending_states, {}
+            try:
+                await AsyncDBHandler.save_conversation_data(
+                    list(user_data.items()),
+                    [(name, key, state) for (name, key), state in states.items()]
+                )
+            except Exception as err:
+                logger.error(f"Error saving conversation state, will retry with the next flush: {err}")
+                # Rows staged meanwhile are newer and win
+                self._pending_user_data = {**user_data, **self._pending_user_data}
+                self._pending_states = {**states, **self._pending_states}
+                return
+
+    # Chat data, bot data and callback data are not persisted
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
@@ -0,0 +1,271 @@
+"""
+Pacing of outgoing Bot API requests below Telegram's flood limits.
+
+Telegram allows a bot about 30 messages per second overall, about one
+per second in a private chat and 20 per minute in a group, and answers
+anything faster with a flood control error (HTTP 429) that says how long
+to wait. SendScheduler is installed as the bot's rate limiter, so every
+request made through the bot passes through it:
+
+- Requests to a chat go out in the order they were made, each taking a
+  token from the chat's bucket and then from the global bucket, waiting
+  for a token when a bucket is empty. Requests that do not address a
+  chat, such as answerCallbackQuery or getMe, are not paced.
+- A message edit still waiting for its turn is dropped when a newer edit
+  of the same message is queued. Only the newest text is sent and the
+  dropped call returns the same result, so a burst of progress updates
+  costs one request instead of many.
+- A flood control error pauses the chat it was returned for and the
+  request is retried after the requested time, up to SEND_MAX_RETRIES
+  times. Other chats keep sending meanwhile.
+"""
+import asyncio
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import (
+    logger,
+    SEND_GLOBAL_RATE,
+    SEND_CHAT_RATE,
+    SEND_CHAT_BURST,
+    SEND_GROUP_RATE_PER_MINUTE,
+    SEND_MAX_RETRIES,
+    SEND_MAX_RETRY_AFTER
+)
+from metrics import registry
+
+SEND_WAIT_SECONDS = registry.histogram(
+    'family_budget_send_wait_seconds', 'Time Bot API requests to a chat waited for their turn', ('method',))
+SEND_COALESCED = registry.counter(
+    'family_budget_send_coalesced_total', 'Message edits dropped in favour of a newer edit', ('method',))
+SEND_RETRY_AFTER = registry.counter(
+    'family_budget_send_retry_after_total', 'Flood control errors returned by the Bot API', ('scope',))
+
+# Methods whose queued calls for one message are replaced by the newest call
+COALESCED_METHODS = frozenset({'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'})
+
+# Idle chats are forgotten every this many requests
+PRUNE_EVERY = 1000
+
+
+class TokenBucket:
+    """
+    Token bucket handing out send slots in the order they are asked for.
+
+    Tokens may go negative: every reservation is granted at once together
+    with the time the caller has to wait before using it.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Take a token.
+
+        Returns:
+            float: Seconds to wait before the token may be used, 0 if it is available now
+        """
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class PendingRequest:
+    """A queued request, and where its caller finds the result if a newer edit replaces it"""
+
+    __slots__ = ('superseded_by', 'future')
+
+    def __init__(self):
+        self.superseded_by = None
+        self.future = None  # created when the request replaces an older one that waits for it
+
+
+class ChatQueue:
+    """Send order, pacing and flood control state of one chat"""
+
+    __slots__ = ('lock', 'bucket', 'paused_until', 'pending', 'waiting')
+
+    def __init__(self, bucket):
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.paused_until = 0.0
+        self.pending = {}  # PendingRequest of a coalesced method by (method, message_id)
+        self.waiting = 0
+
+    def is_idle(self, now):
+        return not self.waiting and self.paused_until <= now and self.bucket.is_full()
+
+
+def retry_delay(err):
+    """Return the seconds a RetryAfter error asks to wait"""
+    if isinstance(err.retry_after, timedelta):
+        return err.retry_after.total_seconds()
+    return float(err.retry_after)
+
+
+def is_group(chat_id):
+    # Groups and channels have negative ids, channels may also be addressed as @username
+    if isinstance(chat_id, str) and chat_id.startswith('@'):
+        return True
+    return int(chat_id) < 0
+
+
+def settle(future, result=None, error=None):
+    """Pass the outcome of a request on to the replaced edit waiting for it, if there is one"""
+    if future is None or future.done():
+        return
+    if isinstance(error, asyncio.CancelledError):
+        future.cancel()
+    elif error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Rate limiter pacing Bot API requests per chat and overall, see the module docstring.
+
+    Args:
+        global_rate (float): Requests to chats per second over all chats
+        chat_rate (float): Requests per second to one private chat
+        chat_burst (int): Requests a private chat or group may get at once after a pause
+        group_rate_per_minute (float): Requests per minute to one group
+        max_retries (int): Retries of a request after flood control errors
+        max_retry_after (int): Longest flood wait in seconds that is waited out rather than raised
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 group_rate_per_minute=SEND_GROUP_RATE_PER_MINUTE, max_retries=SEND_MAX_RETRIES,
+                 max_retry_after=SEND_MAX_RETRY_AFTER):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._global_paused_until = 0.0
+        self._chats = {}
+        self._requests = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_queue(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = self.group_rate if is_group(chat_id) else self.chat_rate
+            chat = self._chats[chat_id] = ChatQueue(TokenBucket(rate, self.chat_burst))
+        return chat
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, chat in self._chats.items() if chat.is_idle(now)]:
+            del self._chats[chat_id]
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await self._send(None, endpoint, callback, args, kwargs)
+
+        self._requests += 1
+        if self._requests % PRUNE_EVERY == 0:
+            self._prune()
+
+        chat = self._chat_queue(chat_id)
+        entry = PendingRequest()
+        key = None
+        if endpoint in COALESCED_METHODS and data.get('message_id') is not None:
+            key = (endpoint, data['message_id'])
+            previous = chat.pending.get(key)
+            if previous is not None:
+                previous.superseded_by = entry
+                entry.future = asyncio.get_running_loop().create_future()
+            chat.pending[key] = entry
+
+        queued = time.perf_counter()
+        chat.waiting += 1
+        try:
+            async with chat.lock:
+                if key is not None and chat.pending.get(key) is entry:
+                    del chat.pending[key]
+                superseded_by = entry.superseded_by
+                if superseded_by is None:
+                    result = await self._send(chat, endpoint, callback, args, kwargs, queued)
+            if superseded_by is not None:
+                # A newer edit of the same message was queued meanwhile and carries the latest text
+                SEND_COALESCED.labels(endpoint).inc()
+                result = await superseded_by.future
+        except BaseException as err:
+            settle(entry.future, error=err)
+            raise
+        finally:
+            chat.waiting -= 1
+        settle(entry.future, result)
+        return result
+
+    async def _send(self, chat, endpoint, callback, args, kwargs, queued=None):
+        """
+        Wait for the chat's and the global turn, then make the request, retrying after flood control errors.
+
+        Args:
+            chat (ChatQueue): Queue of the addressed chat, None for requests not addressing a chat
+            endpoint (str): Bot API method
+            callback: Coroutine function making the request
+            args: Positional arguments of callback
+            kwargs (dict): Keyword arguments of callback
+            queued (float): perf_counter() value when the request was queued, for the wait metric
+
+        Returns:
+            The Bot API response
+        """
+        for attempt in range(self.max_retries + 1):
+            if chat is not None:
+                await self._wait_until(chat.paused_until)
+                await asyncio.sleep(chat.bucket.reserve())
+                await self._wait_until(self._global_paused_until)
+                await asyncio.sleep(self._global.reserve())
+            else:
+                await self._wait_until(self._global_paused_until)
+
+            try:
+                if chat is not None and attempt == 0:
+                    # Includes the wait for the chat's earlier requests
+                    SEND_WAIT_SECONDS.labels(endpoint).observe(time.perf_counter() - queued)
+                return await callback(*args, **kwargs)
+            except RetryAfter as err:
+                delay = retry_delay(err)
+                scope = 'chat' if chat is not None else 'global'
+                SEND_RETRY_AFTER.labels(scope).inc()
+                if attempt == self.max_retries or delay > self.max_retry_after:
+                    raise
+                logger.warning(f"Flood control on {endpoint}, retrying in {delay:g} s")
+                paused_until = time.monotonic() + delay
+                if chat is not None:
+                    chat.paused_until = max(chat.paused_until, paused_until)
+                else:
+                    self._global_paused_until = max(self._global_paused_until, paused_until)
+
+    @staticmethod
+    async def _wait_until(deadline):
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,81 @@
+"""
+Concurrent update processing that keeps each chat's updates in order.
+
+ConversationHandler relies on the updates of one conversation being
+handled one after another. PerChatUpdateProcessor lets updates from
+different chats run concurrently while updates from the same chat wait
+for each other in arrival order, so conversation states never race.
+"""
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def ordering_key(update):
+    """
+    Return the key whose updates must be processed in order.
+
+    Args:
+        update: The incoming update
+
+    Returns:
+        tuple: ('chat', id) or ('user', id), None for updates with neither
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return 'chat', update.effective_chat.id
+    if update.effective_user is not None:
+        return 'user', update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process up to max_concurrent_updates updates at once, one at a time per chat.
+
+    Every chat with updates in flight has an asyncio.Lock. asyncio locks are
+    fair, so updates of a chat run in the order the application received
+    them. An update takes one of the max_concurrent_updates slots only once
+    it holds its chat's lock, so a burst from one chat waits without keeping
+    other chats out. A lock is dropped as soon as its chat has nothing left
+    in flight.
+    """
+
+    __slots__ = ('_locks', '_waiting')
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self._waiting = {}
+
+    async def process_update(self, update, coroutine):
+        """Wait for earlier updates from the same chat, then for a free slot, then process the update"""
+        key = ordering_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                # The base class takes the concurrency slot, after the chat's turn has come
+                await super().process_update(update, coroutine)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        """Await the update's coroutine, ordering and the slot are taken care of by process_update"""
+        await coroutine
+
+    async def initialize(self):
+        """Nothing to set up, locks are created per chat on demand"""
+
+    async def shutdown(self):
+        """Nothing to release, locks go away with their last update"""
@@ -28,10 +28,110 @@ MYSQL_CONFIG = {
 }
 
 # SQLite configuration
-SQLITE_DB_FILE = 'family_budget.db'
+SQLITE_DB_FILE = os.getenv('SQLITE_DB_FILE', 'family_budget.db')
+
+# Transactions are spread over this many SQLite files by user. Shard 0 is
+# SQLITE_DB_FILE, which also keeps the tables shared by all users; shard N
+# lives next to it as family_budget.shardN.db. See db/shards.py.
+SQLITE_SHARD_COUNT = int(os.getenv('SQLITE_SHARD_COUNT', 1))
+
+# SQLite connection pool: one writer plus up to this many reader connections
+SQLITE_READER_CONNECTIONS = int(os.getenv('SQLITE_READER_CONNECTIONS', 4))
+
+# SQLite pragmas applied to every pooled connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384)),  # negative value is KiB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+# Read-only analytics copies of every shard, refreshed in the background with the
+# SQLite backup API. Reads that accept stale data use a copy no older than the bound.
+ANALYTICS_REPLICA_ENABLED = os.getenv('ANALYTICS_REPLICA_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+ANALYTICS_REPLICA_REFRESH_S = int(os.getenv('ANALYTICS_REPLICA_REFRESH_S', 30))
+ANALYTICS_REPLICA_MAX_STALENESS_S = int(os.getenv('ANALYTICS_REPLICA_MAX_STALENESS_S', 120))
+# Pages copied per backup step and the pause between steps, so a refresh never holds
+# a read lock on the shard for long; a copy restarted by writes more often than
+# ANALYTICS_REPLICA_MAX_PASSES times is given up until the next refresh
+ANALYTICS_REPLICA_BACKUP_PAGES = int(os.getenv('ANALYTICS_REPLICA_BACKUP_PAGES', 1024))
+ANALYTICS_REPLICA_BACKUP_SLEEP_MS = int(os.getenv('ANALYTICS_REPLICA_BACKUP_SLEEP_MS', 5))
+ANALYTICS_REPLICA_MAX_PASSES = int(os.getenv('ANALYTICS_REPLICA_MAX_PASSES', 3))
+
+# Maximum rows changed per transaction when migrations backfill large tables
+MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', 5000))
+
+# Report summary cache limits
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 1024))
+REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+REPORT_CACHE_TTL = int(os.getenv('REPORT_CACHE_TTL', 600))  # seconds
+
+# Write-behind mode: confirmed transactions are journaled and committed in groups
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+WRITE_BEHIND_FLUSH_MS = int(os.getenv('WRITE_BEHIND_FLUSH_MS', 200))
+WRITE_BEHIND_MAX_ROWS = int(os.getenv('WRITE_BEHIND_MAX_ROWS', 500))
+WRITE_BEHIND_JOURNAL = os.getenv('WRITE_BEHIND_JOURNAL', f'{SQLITE_DB_FILE}.journal')
+
+# Transactions inserted per write transaction when importing statements
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 20000))
+
+# Rows fetched per round trip when streaming exports
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+# Threads writing exports, apart from the DB executor so a long export never holds up queries
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+
+# Number of worker threads that run blocking SQLite calls for the async handlers
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 4))
+
+# Chart images: worker processes rendering them and cached images or Telegram file ids
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', 2))
+CHART_CACHE_MAX_ENTRIES = int(os.getenv('CHART_CACHE_MAX_ENTRIES', 256))
 
 # Telegram Bot Token
 TELEGRAM_TOKEN = os.getenv('BOT_TOKEN')
 
+# Bot API endpoint, override to use a local Bot API server
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
+
+# How updates arrive: 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Webhook server, usually behind a reverse proxy that terminates TLS
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_URL_PATH = os.getenv('WEBHOOK_URL_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public URL Telegram posts to, e.g. https://example.com/telegram
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+
+# Updates handled at the same time; updates from one chat are still handled in order
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 64))
+
+# Outgoing Bot API requests are paced below Telegram's flood limits: messages per
+# second over all chats, per private chat (with a short burst) and per minute per group.
+# A flood control error pauses only the chat it was returned for and the request is retried.
+SEND_SCHEDULER_ENABLED = os.getenv('SEND_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 4))
+SEND_GROUP_RATE_PER_MINUTE = float(os.getenv('SEND_GROUP_RATE_PER_MINUTE', 20))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 3))
+SEND_MAX_RETRY_AFTER = int(os.getenv('SEND_MAX_RETRY_AFTER', 60))  # seconds, longer flood waits fail at once
+
+# Prometheus endpoint with latency histograms and error counts of DB calls,
+# update handlers and Bot API requests, served on http://METRICS_LISTEN:METRICS_PORT/metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9464))
+
+# DBHandler calls taking longer are logged as slow queries, 0 turns the log off
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 250))
+
+# Conversation states and user_data are written to SQLite in one batch this often
+PERSISTENCE_FLUSH_INTERVAL_MS = int(os.getenv('PERSISTENCE_FLUSH_INTERVAL_MS', 1000))
+
 # Conversation states
-MAIN_MENU, ADD_RECORD, SELECT_CATEGORY, ENTER_AMOUNT, CONFIRM_RECORD, GENERATE_REPORT, CUSTOM_DATE_START, CUSTOM_DATE_END = range(8)
\ No newline at end of file
+MAIN_MENU, ADD_RECORD, SELECT_CATEGORY, ENTER_AMOUNT, CONFIRM_RECORD, GENERATE_REPORT, CUSTOM_DATE_START, CUSTOM_DATE_END, IMPORT_STATEMENT = range(9)
\ No newline at end of file
@@ -1,4 +1,18 @@
 # SQLite implementation is now the default
 from .sqlite_handler import DBHandler, setup_database
+from .connection_pool import ConnectionPool, get_pool, get_shard_pool, configure_pool, close_pool
+from .shards import ShardDirectory, shard_directory, shutdown_shard_executor
+from .category_registry import CategoryRegistry, category_registry
+from .report_cache import ReportCache, report_cache
+from .replica import start_replicas, stop_replicas
+from .write_behind import WriteBehindQueue, start_write_behind, stop_write_behind
+from .instrumentation import instrument_db_handler
+from .async_handler import AsyncDBHandler, run_in_db_executor, shutdown_db_executor
+from .exporter import shutdown_export_executor
 
-__all__ = ['DBHandler', 'setup_database']
+__all__ = ['DBHandler', 'setup_database', 'AsyncDBHandler', 'run_in_db_executor', 'shutdown_db_executor',
+           'ConnectionPool', 'get_pool', 'get_shard_pool', 'configure_pool', 'close_pool',
+           'ShardDirectory', 'shard_directory', 'shutdown_shard_executor',
+           'CategoryRegistry', 'category_registry', 'ReportCache', 'report_cache',
+           'start_replicas', 'stop_replicas', 'instrument_db_handler',
+           'WriteBehindQueue', 'start_write_behind', 'stop_write_behind', 'shutdown_export_executor']
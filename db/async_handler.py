@@ -0,0 +1,154 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import logger, DB_EXECUTOR_WORKERS
+from .sqlite_handler import DBHandler
+from . import write_behind
+
+# Shared executor for all blocking SQLite work, created on first use
+_executor = None
+
+
+def get_db_executor():
+    """Return the bounded thread pool used for database calls"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_EXECUTOR_WORKERS,
+            thread_name_prefix="db-worker"
+        )
+    return _executor
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """
+    Run a blocking database function in the DB executor and await its result.
+
+    Args:
+        func: The blocking function to call
+        *args: Positional arguments for the function
+        **kwargs: Keyword arguments for the function
+
+    Returns:
+        The value returned by the function
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(func, *args, **kwargs))
+
+
+def read_own_writes(user_ids, func, *args, **kwargs):
+    """Commit the users' queued write-behind transactions, then call a blocking read"""
+    write_behind.flush_pending(user_ids)
+    return func(*args, **kwargs)
+
+
+def shutdown_db_executor():
+    """Wait for pending database calls and stop the DB executor"""
+    global _executor
+    if _executor is not None:
+        logger.info("Shutting down database executor...")
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+class AsyncDBHandler:
+    """
+    Awaitable counterpart of DBHandler for use inside the bot handlers.
+    Every call runs in the DB executor so SQLite never blocks the event loop.
+    """
+
+    @staticmethod
+    async def add_transaction(user_id, category_id, amount, description=None):
+        """
+        Add a new transaction to the database.
+        In write-behind mode the transaction is journaled and committed with the next group.
+        """
+        if write_behind.write_behind_queue is not None:
+            # The journal write waits for the disk, keep it off the event loop
+            return await run_in_db_executor(write_behind.write_behind_queue.submit,
+                                            user_id, category_id, amount, description)
+        return await run_in_db_executor(DBHandler.add_transaction, user_id, category_id, amount, description)
+
+    @staticmethod
+    async def get_category_info(category_id):
+        """Get category information by ID"""
+        return await run_in_db_executor(DBHandler.get_category_info, category_id)
+
+    @staticmethod
+    async def get_categories(transaction_type):
+        """Get all categories of a specific type"""
+        return await run_in_db_executor(DBHandler.get_categories, transaction_type)
+
+    @staticmethod
+    async def add_category(name, transaction_type):
+        """Add a new category and refresh the category registry"""
+        return await run_in_db_executor(DBHandler.add_category, name, transaction_type)
+
+    @staticmethod
+    async def rename_category(category_id, name):
+        """Rename a category, refresh the category registry and drop cached summaries"""
+        return await run_in_db_executor(DBHandler.rename_category, category_id, name)
+
+    @staticmethod
+    async def get_transactions(user_id, start_date, end_date, max_staleness=None):
+        """Get all transactions in a date range for a user, including ones still in the write-behind queue"""
+        return await run_in_db_executor(read_own_writes, (user_id,), DBHandler.get_transactions,
+                                        user_id, start_date, end_date, max_staleness=max_staleness)
+
+    @staticmethod
+    async def get_category_summary(user_ids, start_date, end_date, max_staleness=None):
+        """Get a summary of the given users' transactions by category in a date range"""
+        return await run_in_db_executor(read_own_writes, user_ids, DBHandler.get_category_summary,
+                                        user_ids, start_date, end_date, max_staleness=max_staleness)
+
+    @staticmethod
+    async def get_dashboard_summary(user_ids, periods):
+        """Get category totals for several whole-day periods in a single query"""
+        return await run_in_db_executor(read_own_writes, user_ids, DBHandler.get_dashboard_summary,
+                                        user_ids, periods)
+
+    @staticmethod
+    async def get_monthly_totals(user_ids, first_month, last_month, max_staleness=None):
+        """Get per-category totals for every month in a range"""
+        return await run_in_db_executor(read_own_writes, user_ids, DBHandler.get_monthly_totals,
+                                        user_ids, first_month, last_month, max_staleness=max_staleness)
+
+    @staticmethod
+    async def get_report_scope(user_id):
+        """Get the users whose transactions a user's reports cover"""
+        return await run_in_db_executor(DBHandler.get_report_scope, user_id)
+
+    @staticmethod
+    async def get_family(user_id):
+        """Get the family a user belongs to, or None"""
+        return await run_in_db_executor(DBHandler.get_family, user_id)
+
+    @staticmethod
+    async def create_family(owner_id, name):
+        """Create a family with the owner as its first member"""
+        return await run_in_db_executor(DBHandler.create_family, owner_id, name)
+
+    @staticmethod
+    async def join_family(user_id, invite_code):
+        """Add a user to the family with the given invite code"""
+        return await run_in_db_executor(DBHandler.join_family, user_id, invite_code)
+
+    @staticmethod
+    async def leave_family(user_id):
+        """Remove a user from their family"""
+        return await run_in_db_executor(DBHandler.leave_family, user_id)
+
+    @staticmethod
+    async def get_conversation_states(name):
+        """Get the stored states of a persistent conversation handler"""
+        return await run_in_db_executor(DBHandler.get_conversation_states, name)
+
+    @staticmethod
+    async def get_all_user_data():
+        """Get the stored user_data of every user"""
+        return await run_in_db_executor(DBHandler.get_all_user_data)
+
+    @staticmethod
+    async def save_conversation_data(user_data, conversation_states):
+        """Write changed user_data and conversation states in one transaction"""
+        return await run_in_db_executor(DBHandler.save_conversation_data, user_data, conversation_states)
@@ -0,0 +1,102 @@
+import threading
+from config import logger
+from .connection_pool import get_pool
+
+GET_ALL_CATEGORIES_QUERY = '''
+SELECT id, name, type FROM categories ORDER BY type, name
+'''
+
+
+class CategoryRegistry:
+    """
+    Process-wide in-memory copy of the categories table.
+
+    Categories are populated from db/models.py by the first migration and
+    almost never change, so they are loaded once and served from memory
+    with O(1) lookups by id and by type. Code that edits categories must
+    call load() afterwards, from the thread that made the edit, so lookups
+    in the bot's event loop never have to query the database; invalidate()
+    defers the reload to the next lookup instead. Listeners registered
+    with add_listener() are told whenever the category set changes.
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_type = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.version = 0
+
+    def load(self):
+        """Load all categories from the database, replacing the cached copy"""
+        with get_pool().reader() as conn:
+            rows = conn.execute(GET_ALL_CATEGORIES_QUERY).fetchall()
+
+        by_id = {}
+        by_type = {}
+        for row in rows:
+            by_id[row['id']] = row
+            by_type.setdefault(row['type'], []).append((row['id'], row['name']))
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_type = {key: tuple(value) for key, value in by_type.items()}
+            self._loaded = True
+            self.version += 1
+
+        logger.info(f"Loaded {len(by_id)} categories into the registry")
+        self._notify()
+
+    def invalidate(self):
+        """Drop the cached categories, the next lookup reloads them"""
+        with self._lock:
+            self._loaded = False
+            self.version += 1
+        self._notify()
+
+    def add_listener(self, callback):
+        """
+        Register a callback invoked with the registry after every change.
+
+        Args:
+            callback: Callable taking the registry as its only argument
+        """
+        self._listeners.append(callback)
+
+    def get(self, category_id):
+        """
+        Get a category by ID.
+
+        Args:
+            category_id (int): The category ID
+
+        Returns:
+            dict: The category with id, name and type keys, or None if unknown
+        """
+        self._ensure_loaded()
+        return self._by_id.get(category_id)
+
+    def by_type(self, transaction_type):
+        """
+        Get all categories of a specific type ordered by name.
+
+        Args:
+            transaction_type (str): 'income' or 'expense'
+
+        Returns:
+            tuple: (id, name) tuples
+        """
+        self._ensure_loaded()
+        return self._by_type.get(transaction_type, ())
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback(self)
+
+
+category_registry = CategoryRegistry()
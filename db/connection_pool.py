@@ -0,0 +1,183 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+from config import logger, SQLITE_DB_FILE, SQLITE_READER_CONNECTIONS, SQLITE_PRAGMAS
+
+
+def dict_factory(cursor, row):
+    """Convert SQLite row to dictionary"""
+    d = {}
+    for idx, col in enumerate(cursor.description):
+        d[col[0]] = row[idx]
+    return d
+
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections shared by all database calls.
+
+    SQLite allows a single writer at a time, so writes are serialized on one
+    connection while reads are spread over a small set of reader connections.
+    With WAL enabled readers keep working while a write is in progress.
+
+    An immutable pool opens a file nothing writes to while the pool exists,
+    such as an analytics replica; SQLite then skips all locking.
+    """
+
+    def __init__(self, db_file, max_readers=SQLITE_READER_CONNECTIONS, pragmas=None, immutable=False):
+        self.db_file = db_file
+        self.max_readers = max(1, max_readers)
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        self.immutable = immutable
+
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_count_lock = threading.Lock()
+        self._all_connections = []
+
+    def _connect(self):
+        """Open a new connection and apply the configured pragmas"""
+        if self.immutable:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_file))}?immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.row_factory = dict_factory
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        self._all_connections.append(conn)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Borrow the writer connection.
+
+        The caller is responsible for committing. Any transaction still open
+        when the block raises is rolled back before the connection is released.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection, opening a new one if the pool is not full yet"""
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_count_lock:
+                if self._reader_count < self.max_readers:
+                    self._reader_count += 1
+                    conn = self._connect()
+            if conn is None:
+                conn = self._readers.get()
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self):
+        """Close every connection owned by the pool"""
+        with self._writer_lock:
+            for conn in self._all_connections:
+                conn.close()
+            self._all_connections = []
+            self._writer = None
+            self._readers = queue.LifoQueue()
+            self._reader_count = 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Pools of shards 1 and up by index, shard 0 is the process-wide pool
+_shard_pools = {}
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(SQLITE_DB_FILE)
+    return _pool
+
+
+def shard_file(db_file, index):
+    """
+    Return the path of a shard's database file.
+
+    Args:
+        db_file (str): Path of the main database, which is shard 0
+        index (int): Shard index
+
+    Returns:
+        str: db_file itself for shard 0, e.g. family_budget.shard2.db for shard 2
+    """
+    if index == 0:
+        return db_file
+    root, ext = os.path.splitext(db_file)
+    return f"{root}.shard{index}{ext}"
+
+
+def get_shard_pool(index):
+    """Return the connection pool of a shard, creating it on first use"""
+    if index == 0:
+        return get_pool()
+    pool = _shard_pools.get(index)
+    if pool is None:
+        db_file = shard_file(get_pool().db_file, index)
+        with _pool_lock:
+            pool = _shard_pools.get(index)
+            if pool is None:
+                pool = _shard_pools[index] = ConnectionPool(db_file)
+    return pool
+
+
+def configure_pool(db_file, **kwargs):
+    """
+    Replace the process-wide pool with one for a different database file.
+    Used by command line tools and benchmarks that work on their own files.
+
+    Args:
+        db_file (str): Path of the SQLite database
+        **kwargs: Extra ConnectionPool arguments
+
+    Returns:
+        ConnectionPool: The new pool
+    """
+    global _pool
+    close_pool()
+    with _pool_lock:
+        _pool = ConnectionPool(db_file, **kwargs)
+    return _pool
+
+
+def close_pool():
+    """Close the process-wide connection pool and the pools of the other shards"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            logger.info("Closing SQLite connection pool...")
+            _pool.close()
+            _pool = None
+        for pool in _shard_pools.values():
+            pool.close()
+        _shard_pools.clear()
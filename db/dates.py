@@ -0,0 +1,65 @@
+"""
+Date helpers. Transaction dates are stored as integer seconds since
+1970-01-01 00:00 of the bot's local wall-clock time, daily rollups as
+integer day numbers counted from the same moment, and monthly rollups as
+year * 12 + month - 1, so range predicates are plain integer comparisons.
+DBHandler converts to and from datetime at the edges; handlers never see
+the integers.
+"""
+from datetime import datetime, timedelta
+
+SECONDS_PER_DAY = 86400
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_local(moment):
+    """Return a naive local datetime, converting aware ones to local time"""
+    if moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def to_epoch(moment):
+    """
+    Convert a datetime to integer epoch seconds, dropping microseconds.
+
+    Args:
+        moment (datetime): A naive local datetime; aware ones are converted
+            to local time first
+
+    Returns:
+        int: Seconds since EPOCH
+    """
+    delta = to_local(moment) - EPOCH
+    return delta.days * SECONDS_PER_DAY + delta.seconds
+
+
+def from_epoch(seconds):
+    """Convert integer epoch seconds back to a naive local datetime"""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def to_day(moment):
+    """Return the day number of a datetime or date, counted from EPOCH"""
+    return moment.toordinal() - EPOCH.toordinal()
+
+
+def from_day(day):
+    """Convert a day number back to a naive datetime at midnight"""
+    return EPOCH + timedelta(days=day)
+
+
+def iso_to_epoch(text):
+    """Convert a stored ISO 8601 date string to epoch seconds, used by migrations"""
+    return to_epoch(datetime.fromisoformat(text))
+
+
+def to_month(moment):
+    """Return the month number of a datetime or date, year * 12 + month - 1"""
+    return moment.year * 12 + moment.month - 1
+
+
+def from_month(month):
+    """Convert a month number back to a naive datetime at midnight of its first day"""
+    return datetime(month // 12, month % 12 + 1, 1)
@@ -0,0 +1,188 @@
+"""
+Streaming export of transactions to gzip-compressed CSV or JSON Lines.
+
+Rows flow from DBHandler.iter_transactions straight into the compressed
+file, so memory use stays flat regardless of how many transactions a user
+has. When analytics replicas are running export_transactions() reads a
+replica, see db/replica.py. The bot's /export goes through
+export_own_transactions_async() instead: it commits the user's queued
+write-behind rows and reads the shard, so a transaction added a moment ago
+is in the file. Exports run in their own thread pool, so an export of a
+long history does not keep a DB executor worker busy.
+
+Usage:
+    python -m db.exporter --user 123456 --format csv --output export.csv.gz
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import logger, ANALYTICS_REPLICA_MAX_STALENESS_S, EXPORT_WORKERS
+from .money import format_minor
+from .sqlite_handler import DBHandler
+from .write_behind import flush_pending
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Bounds used when no date range is given
+EXPORT_MIN_DATE = datetime(1970, 1, 2)
+EXPORT_MAX_DATE = datetime(9999, 12, 31)
+
+
+def write_csv(rows, file):
+    """
+    Write a header tuple followed by data tuples as CSV.
+
+    Returns:
+        int: Number of data rows written
+    """
+    writer = csv.writer(file)
+    count = -1
+    for count, row in enumerate(rows):
+        writer.writerow(row)
+    return max(count, 0)
+
+
+def write_jsonl(rows, file):
+    """
+    Write data tuples as one JSON object per line, keyed by the header tuple.
+
+    Returns:
+        int: Number of data rows written
+    """
+    columns = next(rows, None)
+    count = 0
+    for row in rows:
+        file.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def format_values(rows):
+    """Pass rows through, turning dates into ISO 8601 and minor-unit amounts into decimal strings"""
+    columns = next(rows, None)
+    if columns is None:
+        return
+    yield columns
+
+    date_index = columns.index('date')
+    amount_index = columns.index('amount')
+    for row in rows:
+        row = list(row)
+        row[date_index] = row[date_index].isoformat()
+        row[amount_index] = format_minor(row[amount_index])
+        yield row
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+}
+
+
+def export_transactions(user_id, path, export_format='csv', start_date=None, end_date=None,
+                        max_staleness=ANALYTICS_REPLICA_MAX_STALENESS_S):
+    """
+    Export a user's transactions to a gzip-compressed file.
+
+    Args:
+        user_id (int): Owner of the transactions
+        path (str): Output file path
+        export_format (str): 'csv' or 'jsonl'
+        start_date (datetime): Start of the range, all history if None
+        end_date (datetime): End of the range, everything up to now if None
+        max_staleness (float): Seconds of lag accepted when an analytics replica is running,
+            None reads the shard itself
+
+    Returns:
+        int: Number of exported transactions
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    rows = DBHandler.iter_transactions(user_id, start_date or EXPORT_MIN_DATE, end_date or EXPORT_MAX_DATE,
+                                       max_staleness=max_staleness)
+    try:
+        with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6) as file:
+            count = WRITERS[export_format](format_values(rows), file)
+    finally:
+        rows.close()
+
+    logger.info(f"Exported {count} transactions for user {user_id} to {path}")
+    return count
+
+
+# Export thread pool, created on first use
+_executor = None
+
+
+def get_export_executor():
+    """Return the thread pool that writes exports"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export-worker")
+    return _executor
+
+
+async def export_own_transactions_async(user_id, path, export_format='csv'):
+    """
+    Export a user's transactions for the user themselves, in the export thread pool.
+
+    Their queued write-behind transactions are committed first and the rows
+    are read from the shard rather than a replica, so nothing they have just
+    added is missing.
+
+    Args:
+        user_id (int): Owner of the transactions
+        path (str): Output file path
+        export_format (str): 'csv' or 'jsonl'
+
+    Returns:
+        int: Number of exported transactions
+    """
+    def export():
+        flush_pending((user_id,))
+        return export_transactions(user_id, path, export_format, max_staleness=None)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_export_executor(), export)
+
+
+def shutdown_export_executor():
+    """Wait for running exports and stop the export thread pool"""
+    global _executor
+    if _executor is not None:
+        logger.info("Shutting down export executor...")
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def main(argv=None):
+    """Export transactions from the command line"""
+    from .connection_pool import configure_pool, close_pool
+
+    parser = argparse.ArgumentParser(description="Export transactions to compressed CSV or JSON Lines")
+    parser.add_argument("--user", type=int, required=True, help="Telegram user id")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default='csv', help="Output format")
+    parser.add_argument("--output", required=True, help="Output file, gzip-compressed")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, help="Start date (ISO 8601)")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, help="End date (ISO 8601)")
+    parser.add_argument("--db", help="Database file, defaults to SQLITE_DB_FILE")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        configure_pool(args.db)
+    count = export_transactions(args.user, args.output, args.format, args.start, args.end)
+    close_pool()
+
+    print(f"Exported {count} transactions to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
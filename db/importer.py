@@ -0,0 +1,126 @@
+"""
+Streaming import of bank statements in CSV format.
+
+The statement is read row by row and inserted in chunks of IMPORT_CHUNK_SIZE
+transactions, each chunk in a single write transaction through
+DBHandler.add_transactions, so memory use does not depend on file size.
+
+Expected columns (header names are case-insensitive, ';' or ',' separated):
+    date         2024-03-01, 2024-03-01 14:30[:00] or 01.03.2024; dates with a UTC
+                 offset are converted to local time
+    amount       negative for expenses, decimal comma allowed
+    category     optional, matched against category names
+    description  optional
+"""
+import csv
+from datetime import datetime
+from config import logger, IMPORT_CHUNK_SIZE
+from .dates import to_local
+from .category_registry import category_registry
+from .models import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from .money import parse_money, to_minor
+from .sqlite_handler import DBHandler
+
+# Categories used when a row has no category or an unknown one
+DEFAULT_INCOME_CATEGORY = INCOME_CATEGORIES[-1]
+DEFAULT_EXPENSE_CATEGORY = EXPENSE_CATEGORIES[-1]
+
+
+def parse_date(value):
+    """Parse a statement date in ISO 8601 or DD.MM.YYYY[ HH:MM[:SS]] format into naive local time"""
+    value = value.strip()
+    if len(value) >= 10 and value[2] == '.' and value[5] == '.':
+        # Rearranged into ISO 8601, fromisoformat is far faster than strptime
+        value = f"{value[6:10]}-{value[3:5]}-{value[0:2]}{value[10:]}"
+    # Dates are compared and bucketed as naive local time everywhere else
+    return to_local(datetime.fromisoformat(value))
+
+
+class StatementImport:
+    """
+    Import of one statement file for one user, advanced chunk by chunk.
+
+    Call import_chunk() until it returns 0. Rows that cannot be parsed are
+    skipped and counted in self.skipped.
+    """
+
+    def __init__(self, user_id, file, chunk_size=IMPORT_CHUNK_SIZE):
+        """
+        Args:
+            user_id (int): Owner of the imported transactions
+            file: Text file object positioned at the start of the CSV
+            chunk_size (int): Transactions per write transaction
+        """
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.imported = 0
+        self.skipped = 0
+
+        sample = file.read(4096)
+        file.seek(0)
+        delimiter = ';' if sample.count(';') > sample.count(',') else ','
+        self._reader = csv.DictReader(file, delimiter=delimiter)
+        self._reader.fieldnames = [name.strip().lower() for name in self._reader.fieldnames or []]
+        if 'date' not in self._reader.fieldnames or 'amount' not in self._reader.fieldnames:
+            raise ValueError("Statement must have 'date' and 'amount' columns")
+
+        self._categories = self._category_lookup()
+
+    @staticmethod
+    def _category_lookup():
+        """Map lowercase category names to (id, type)"""
+        lookup = {}
+        for transaction_type in ('income', 'expense'):
+            for category_id, name in category_registry.by_type(transaction_type):
+                lookup[name.lower()] = (category_id, transaction_type)
+        return lookup
+
+    def _resolve_category(self, name, amount):
+        """Pick the category id and the positive amount in minor units for a statement row"""
+        category = self._categories.get((name or '').strip().lower())
+        if category is None:
+            default = DEFAULT_EXPENSE_CATEGORY if amount < 0 else DEFAULT_INCOME_CATEGORY
+            category = self._categories[default.lower()]
+        return category[0], abs(amount)
+
+    def _parse_rows(self):
+        """Yield (user_id, category_id, amount, description, date) for up to chunk_size rows"""
+        parsed = 0
+        for row in self._reader:
+            try:
+                amount = to_minor(parse_money(row['amount']))
+                date = parse_date(row['date'])
+            except (ValueError, AttributeError):
+                self.skipped += 1
+                continue
+            if amount == 0:
+                self.skipped += 1
+                continue
+
+            category_id, amount = self._resolve_category(row.get('category'), amount)
+            description = (row.get('description') or '').strip() or None
+            yield (self.user_id, category_id, amount, description, date)
+
+            parsed += 1
+            if parsed >= self.chunk_size:
+                return
+
+    def import_chunk(self):
+        """
+        Parse and insert the next chunk of the statement.
+
+        Returns:
+            int: Number of transactions inserted, 0 once the file is exhausted
+        """
+        chunk = list(self._parse_rows())
+        if chunk:
+            DBHandler.add_transactions(chunk)
+            self.imported += len(chunk)
+        return len(chunk)
+
+    def run(self):
+        """Import the whole statement, returning the number of imported transactions"""
+        while self.import_chunk():
+            pass
+        logger.info(f"Imported {self.imported} transactions for user {self.user_id}, skipped {self.skipped}")
+        return self.imported
@@ -0,0 +1,127 @@
+"""
+Timing of every DBHandler method and the slow-query log.
+
+instrument_db_handler() replaces each DBHandler static method by a wrapper
+that records the call's duration and any exception in the metrics
+registry. Calls at or above SLOW_QUERY_MS are also logged with their
+arguments and counted. Generator methods such as iter_transactions are
+timed over the whole iteration, counting only the time spent producing
+rows and not the time the caller spends on them between rows.
+
+The report cache front ends in UNTIMED_METHODS are left unwrapped: a cache
+hit costs a few microseconds, about as much as the timing itself. Their
+misses go through the query_* methods, which are timed like the rest.
+"""
+import inspect
+import time
+from functools import wraps
+from config import logger, SLOW_QUERY_MS
+from metrics import registry
+from .sqlite_handler import DBHandler
+
+DB_CALL_SECONDS = registry.histogram(
+    'family_budget_db_call_seconds', 'Duration of DBHandler calls', ('method',))
+DB_CALL_ERRORS = registry.counter(
+    'family_budget_db_call_errors_total', 'DBHandler calls that raised', ('method', 'error'))
+DB_SLOW_CALLS = registry.counter(
+    'family_budget_db_slow_calls_total', 'DBHandler calls at or above the slow-query threshold', ('method',))
+
+# Methods that serve the report cache and call a timed query_* method on a miss
+UNTIMED_METHODS = frozenset({'get_category_summary', 'get_dashboard_summary', 'get_monthly_totals'})
+
+# Longest argument description written to the slow-query log
+SLOW_QUERY_ARGS_CHARS = 200
+
+
+def describe_args(args, kwargs):
+    """Return a short description of a call's arguments for the slow-query log"""
+    parts = [repr(arg) for arg in args] + [f"{name}={value!r}" for name, value in kwargs.items()]
+    text = ', '.join(parts)
+    if len(text) > SLOW_QUERY_ARGS_CHARS:
+        text = text[:SLOW_QUERY_ARGS_CHARS] + '...'
+    return text
+
+
+def timed_call(name, func, slow_threshold):
+    """
+    Wrap a DBHandler function so its calls are timed.
+
+    Args:
+        name (str): Method name used as the metric label
+        func: The function to wrap
+        slow_threshold (float): Seconds from which a call is logged as slow, 0 never
+
+    Returns:
+        The wrapping function
+    """
+    seconds = DB_CALL_SECONDS.labels(name)
+    slow_threshold = slow_threshold or float('inf')
+
+    def log_slow(elapsed, args, kwargs):
+        DB_SLOW_CALLS.labels(name).inc()
+        logger.warning(f"Slow query: DBHandler.{name}({describe_args(args, kwargs)}) took {elapsed * 1000:.1f} ms")
+
+    def record(elapsed, error, args, kwargs):
+        seconds.observe(elapsed)
+        if error is not None:
+            DB_CALL_ERRORS.labels(name, type(error).__name__).inc()
+        if elapsed >= slow_threshold:
+            log_slow(elapsed, args, kwargs)
+
+    if inspect.isgeneratorfunction(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            rows = func(*args, **kwargs)
+            elapsed = 0.0
+            error = None
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield row
+            except Exception as err:
+                error = err
+                raise
+            finally:
+                # Also releases the connection when the caller stops early
+                rows.close()
+                record(elapsed, error, args, kwargs)
+        return wrapper
+
+    perf_counter = time.perf_counter
+
+    # The common path of a call that neither fails nor is slow is kept inline
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as err:
+            DB_CALL_ERRORS.labels(name, type(err).__name__).inc()
+            raise
+        finally:
+            elapsed = perf_counter() - started
+            seconds.observe(elapsed)
+            if elapsed >= slow_threshold:
+                log_slow(elapsed, args, kwargs)
+    return wrapper
+
+
+def instrument_db_handler(handler_class=DBHandler, slow_query_ms=SLOW_QUERY_MS):
+    """
+    Time every static method of a DBHandler class but UNTIMED_METHODS. Calling it again does nothing.
+
+    Args:
+        handler_class: The class whose methods are wrapped in place
+        slow_query_ms (int): Threshold of the slow-query log in milliseconds, 0 turns it off
+    """
+    for name, member in list(vars(handler_class).items()):
+        if name in UNTIMED_METHODS:
+            continue
+        if isinstance(member, staticmethod) and not hasattr(member.__func__, '__wrapped__'):
+            setattr(handler_class, name, staticmethod(timed_call(name, member.__func__, slow_query_ms / 1000)))
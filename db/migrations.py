@@ -0,0 +1,495 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+Each migration is a function registered with the @migration decorator under
+a unique, increasing version number. apply_migrations() runs every migration
+newer than the version recorded in the schema_version table, in order, and
+records each one once it finishes.
+
+Every shard file gets the migrations of the tables it holds: transactions,
+categories and the rollups. Migrations registered with main_only=True create
+tables only the main database holds, such as the shard directory, families
+and conversation state, and are skipped on the other shards.
+
+Migrations must be safe to re-run after an interruption: use IF NOT EXISTS
+for DDL and backfill_in_batches() for data changes on large tables, which
+commits after every batch and resumes from the last finished batch.
+
+Usage:
+    python -m db.migrations [path/to/database.db]
+"""
+import sys
+from datetime import datetime
+from config import logger, MIGRATION_BATCH_SIZE
+from .models import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+
+# SQL statements optimized for SQLite
+CREATE_CATEGORIES_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense'))
+)
+'''
+
+CREATE_TRANSACTIONS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT,
+    date TEXT NOT NULL,
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+)
+'''
+
+# Secondary indexes. The transaction indexes cover every column the report
+# queries read, so range lookups never touch the table rows themselves.
+CREATE_INDEXES_SQLITE = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+    ON transactions (user_id, date, category_id, amount)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transactions_date
+    ON transactions (date, category_id, amount)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_categories_type
+    ON categories (type, name)
+    ''',
+]
+
+# Amounts as integer minor units (kopecks), see db/money.py
+CREATE_TRANSACTIONS_MINOR_UNITS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    description TEXT,
+    date TEXT NOT NULL,
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+)
+'''
+
+# Dates as integer epoch seconds, see db/dates.py
+CREATE_TRANSACTIONS_EPOCH_DATES_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    description TEXT,
+    date INTEGER NOT NULL,
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+)
+'''
+
+# Per-user daily totals by category, maintained alongside transactions so
+# reports sum a few rows per day instead of every raw transaction
+CREATE_DAILY_TOTALS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day, category_id)
+) WITHOUT ROWID
+'''
+
+CREATE_DAILY_TOTALS_INDEX_SQLITE = '''
+CREATE INDEX IF NOT EXISTS idx_daily_totals_day
+ON daily_totals (day, category_id, total, count)
+'''
+
+# Per-user monthly totals by category for trend reports, month numbers as in db/dates.py
+CREATE_MONTHLY_TOTALS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    user_id INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, month, category_id)
+) WITHOUT ROWID
+'''
+
+# Conversation state kept across restarts by bot/persistence.py, values are JSON
+CREATE_CONVERSATION_STATES_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS conversation_states (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID
+'''
+
+CREATE_USER_DATA_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+)
+'''
+
+# Shard holding each user's transactions, kept in the main database, see db/shards.py
+CREATE_USER_SHARDS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS user_shards (
+    user_id INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL
+)
+'''
+
+# Families share reports; a user belongs to at most one family
+CREATE_FAMILIES_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS families (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    owner_id INTEGER NOT NULL,
+    invite_code TEXT NOT NULL UNIQUE
+)
+'''
+
+CREATE_FAMILY_MEMBERS_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS family_members (
+    user_id INTEGER PRIMARY KEY,
+    family_id INTEGER NOT NULL,
+    FOREIGN KEY (family_id) REFERENCES families(id)
+)
+'''
+
+CREATE_FAMILY_MEMBERS_INDEX_SQLITE = '''
+CREATE INDEX IF NOT EXISTS idx_family_members_family
+ON family_members (family_id, user_id)
+'''
+
+# Sequence number of the last write-behind journal entry committed to transactions
+CREATE_WRITE_BEHIND_STATE_TABLE_SQLITE = '''
+CREATE TABLE IF NOT EXISTS write_behind_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_seq INTEGER NOT NULL
+)
+'''
+
+CREATE_SCHEMA_VERSION_TABLE = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+)
+'''
+
+CREATE_BACKFILL_PROGRESS_TABLE = '''
+CREATE TABLE IF NOT EXISTS backfill_progress (
+    task TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+)
+'''
+
+# Registered migrations as (version, name, function, main_only), sorted by version
+MIGRATIONS = []
+
+
+def migration(version, name, main_only=False):
+    """
+    Register a migration function.
+
+    Args:
+        version (int): Unique schema version the migration brings the database to
+        name (str): Short description stored in schema_version
+        main_only (bool): Only run on the main database, for tables the other
+            shards do not hold
+    """
+    def register(func):
+        if any(entry[0] == version for entry in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append((version, name, func, main_only))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def get_schema_version(conn):
+    """Return the newest applied migration version, 0 for a fresh database"""
+    conn.execute(CREATE_SCHEMA_VERSION_TABLE)
+    return _first_value(conn.execute("SELECT MAX(version) FROM schema_version").fetchone()) or 0
+
+
+def backfill_in_batches(conn, task, table, apply_batch, batch_size=MIGRATION_BATCH_SIZE, clear_progress=True):
+    """
+    Apply a data change to a table in rowid ranges of bounded size.
+
+    Each batch runs in its own transaction, so the write lock is only held
+    for one batch at a time. Progress is stored in backfill_progress, and an
+    interrupted backfill continues after the last committed batch.
+
+    Args:
+        conn: The writer connection
+        task (str): Unique name of the backfill, used to store progress
+        table (str): Table to walk by rowid
+        apply_batch: Callable (conn, after_id, up_to_id) changing rows with
+            after_id < rowid <= up_to_id
+        batch_size (int): Maximum number of rows per batch
+        clear_progress (bool): Delete the progress row once done; pass False
+            to delete it yourself in the transaction that completes the change
+    """
+    conn.execute(CREATE_BACKFILL_PROGRESS_TABLE)
+    row = conn.execute("SELECT last_id FROM backfill_progress WHERE task = ?", (task,)).fetchone()
+    last_id = _first_value(row) or 0
+    max_id = _first_value(conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()) or 0
+
+    batches = 0
+    while last_id < max_id:
+        row = conn.execute(
+            f"SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?",
+            (last_id, batch_size - 1)
+        ).fetchone()
+        up_to_id = min(_first_value(row) or max_id, max_id)
+
+        apply_batch(conn, last_id, up_to_id)
+        conn.execute(
+            "INSERT INTO backfill_progress (task, last_id) VALUES (?, ?) "
+            "ON CONFLICT(task) DO UPDATE SET last_id = excluded.last_id",
+            (task, up_to_id)
+        )
+        conn.commit()
+
+        last_id = up_to_id
+        batches += 1
+        if batches % 100 == 0:
+            logger.info(f"Backfill {task}: processed rows up to id {last_id} of {max_id}")
+
+    if clear_progress:
+        conn.execute("DELETE FROM backfill_progress WHERE task = ?", (task,))
+        conn.commit()
+
+
+def rebuild_table(conn, table, create_new_table, columns, select_expressions, create_indexes=()):
+    """
+    Rebuild a table with a new definition, copying rows in resumable batches.
+
+    Rows are copied into {table}_new with backfill_in_batches(), then the old
+    table is dropped and the new one takes its name in a single transaction.
+    The copy's progress row is deleted in that same transaction, so a rerun
+    after an interruption either resumes the copy or finds it complete; a
+    {table}_new left without a progress row is stale and is copied anew.
+
+    Args:
+        conn: The writer connection
+        table (str): The table to rebuild
+        create_new_table (str): CREATE TABLE IF NOT EXISTS statement for {table}_new
+        columns (str): Comma separated target columns
+        select_expressions (str): Comma separated expressions over the old table
+        create_indexes (list): CREATE INDEX statements to run after the swap
+    """
+    new_table = f"{table}_new"
+    task = f"rebuild_{table}"
+    conn.execute(CREATE_BACKFILL_PROGRESS_TABLE)
+    if conn.execute("SELECT 1 FROM backfill_progress WHERE task = ?", (task,)).fetchone() is None:
+        conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+    conn.execute(create_new_table)
+    conn.commit()
+
+    def copy_batch(conn, after_id, up_to_id):
+        conn.execute(
+            f"INSERT INTO {new_table} ({columns}) SELECT {select_expressions} "
+            f"FROM {table} WHERE rowid > ? AND rowid <= ?",
+            (after_id, up_to_id)
+        )
+
+    backfill_in_batches(conn, task, table, copy_batch, clear_progress=False)
+
+    conn.execute("BEGIN")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for create_index in create_indexes:
+        conn.execute(create_index)
+    conn.execute("DELETE FROM backfill_progress WHERE task = ?", (task,))
+    conn.commit()
+
+
+def column_type(conn, table, column):
+    """Return the declared type of a column, or None if it does not exist"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    for row in cursor.execute(f"PRAGMA table_info({table})"):
+        if row[1] == column:
+            return row[2].upper()
+    return None
+
+
+def _first_value(row):
+    """Return the first column of a row fetched with or without the dict factory"""
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+
+def apply_migrations(conn, main=True):
+    """
+    Apply every pending migration in version order.
+
+    Args:
+        conn: The writer connection
+        main (bool): False for the shard files besides the main database, which
+            skip main_only migrations; those are still recorded as applied
+
+    Returns:
+        int: The schema version after applying migrations
+    """
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, name, func, main_only in MIGRATIONS:
+        if version <= current:
+            continue
+
+        if main or not main_only:
+            logger.info(f"Applying migration {version}: {name}...")
+            func(conn)
+        conn.execute(
+            "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, datetime.now().isoformat())
+        )
+        conn.commit()
+        current = version
+
+    return current
+
+
+@migration(1, "initial schema")
+def create_initial_schema(conn):
+    """Create categories and transactions tables and populate default categories"""
+    conn.execute(CREATE_CATEGORIES_TABLE_SQLITE)
+    conn.execute(CREATE_TRANSACTIONS_TABLE_SQLITE)
+
+    count = _first_value(conn.execute("SELECT COUNT(*) FROM categories").fetchone())
+    if count == 0:
+        logger.info("Populating default categories in SQLite...")
+        conn.executemany("INSERT INTO categories (name, type) VALUES (?, ?)",
+                         [(category, 'income') for category in INCOME_CATEGORIES])
+        conn.executemany("INSERT INTO categories (name, type) VALUES (?, ?)",
+                         [(category, 'expense') for category in EXPENSE_CATEGORIES])
+
+
+@migration(2, "covering indexes for reports")
+def create_report_indexes(conn):
+    """Create the secondary indexes used by the report queries"""
+    for create_index in CREATE_INDEXES_SQLITE:
+        conn.execute(create_index)
+
+
+@migration(3, "daily totals rollup")
+def create_daily_totals(conn):
+    """Create the daily_totals rollup, migration 6 fills it from existing transactions"""
+    conn.execute(CREATE_DAILY_TOTALS_TABLE_SQLITE)
+    conn.execute(CREATE_DAILY_TOTALS_INDEX_SQLITE)
+
+
+@migration(4, "write-behind state")
+def create_write_behind_state(conn):
+    """Create the table tracking committed write-behind journal entries"""
+    conn.execute(CREATE_WRITE_BEHIND_STATE_TABLE_SQLITE)
+
+
+@migration(5, "amounts as integer minor units")
+def convert_amounts_to_minor_units(conn):
+    """Store transaction amounts as integer kopecks"""
+    from .money import to_minor
+
+    # Skip the copy if an interrupted run already swapped the tables
+    if column_type(conn, 'transactions', 'amount') != 'INTEGER':
+        conn.create_function('to_minor', 1, to_minor, deterministic=True)
+        rebuild_table(
+            conn, 'transactions', CREATE_TRANSACTIONS_MINOR_UNITS_TABLE_SQLITE,
+            'id, user_id, category_id, amount, description, date',
+            'id, user_id, category_id, to_minor(amount), description, date',
+            CREATE_INDEXES_SQLITE[:2]
+        )
+    # daily_totals is regenerated by migration 6 once dates are integers
+
+
+@migration(6, "dates as integer epoch seconds")
+def convert_dates_to_epoch(conn):
+    """Store transaction dates as epoch seconds and rollup days as day numbers"""
+    from .dates import iso_to_epoch
+    from .rollups import rebuild_daily_totals
+
+    if column_type(conn, 'transactions', 'date') != 'INTEGER':
+        conn.create_function('iso_to_epoch', 1, iso_to_epoch, deterministic=True)
+        rebuild_table(
+            conn, 'transactions', CREATE_TRANSACTIONS_EPOCH_DATES_TABLE_SQLITE,
+            'id, user_id, category_id, amount, description, date',
+            'id, user_id, category_id, amount, description, iso_to_epoch(date)',
+            CREATE_INDEXES_SQLITE[:2]
+        )
+
+    # The rollup is derived data, regenerate it keyed by day number
+    conn.execute("DROP TABLE IF EXISTS daily_totals")
+    conn.execute(CREATE_DAILY_TOTALS_TABLE_SQLITE)
+    conn.execute(CREATE_DAILY_TOTALS_INDEX_SQLITE)
+    conn.commit()
+    rebuild_daily_totals(conn)
+
+
+@migration(7, "family groups", main_only=True)
+def create_family_groups(conn):
+    """Create the family tables"""
+    conn.execute(CREATE_FAMILIES_TABLE_SQLITE)
+    conn.execute(CREATE_FAMILY_MEMBERS_TABLE_SQLITE)
+    conn.execute(CREATE_FAMILY_MEMBERS_INDEX_SQLITE)
+
+
+@migration(8, "monthly totals rollup")
+def create_monthly_totals(conn):
+    """Create the monthly_totals rollup and fill it from existing transactions"""
+    from .rollups import rebuild_monthly_totals
+
+    conn.execute(CREATE_MONTHLY_TOTALS_TABLE_SQLITE)
+    conn.commit()
+    rebuild_monthly_totals(conn)
+
+
+@migration(9, "persistent conversation state", main_only=True)
+def create_conversation_state(conn):
+    """Create the tables that keep conversation states and user_data across restarts"""
+    conn.execute(CREATE_CONVERSATION_STATES_TABLE_SQLITE)
+    conn.execute(CREATE_USER_DATA_TABLE_SQLITE)
+
+
+@migration(10, "user shard directory", main_only=True)
+def create_user_shards(conn):
+    """Create the shard directory, every existing user stays in the main database"""
+    conn.execute(CREATE_USER_SHARDS_TABLE_SQLITE)
+    conn.execute("INSERT OR IGNORE INTO user_shards (user_id, shard) SELECT DISTINCT user_id, 0 FROM transactions")
+
+
+@migration(11, "drop all-user report indexes")
+def drop_all_user_report_indexes(conn):
+    """Drop the indexes only all-user summaries used"""
+    # Summaries are scoped by user id and read (user_id, ...) prefixes
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_date")
+    conn.execute("DROP INDEX IF EXISTS idx_daily_totals_day")
+
+
+def main(argv=None):
+    """Apply pending migrations to the configured or given database"""
+    from .connection_pool import get_pool, configure_pool, close_pool
+
+    argv = sys.argv[1:] if argv is None else argv
+    pool = configure_pool(argv[0]) if argv else get_pool()
+    with pool.writer() as conn:
+        before = get_schema_version(conn)
+        after = apply_migrations(conn)
+    close_pool()
+
+    print(f"Schema version: {before} -> {after}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
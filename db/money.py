@@ -0,0 +1,73 @@
+"""
+Money helpers. Amounts are stored and summed as integer minor units
+(kopecks); Decimal is only used at the edges, to parse user input exactly
+and to format totals for display.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+MINOR_UNITS = 100
+
+# Larger amounts are rejected, keeps sums far away from SQLite's 64-bit limit
+MAX_AMOUNT_MINOR = 10 ** 15
+
+_CENT = Decimal('0.01')
+
+
+def parse_money(text):
+    """
+    Parse an amount typed by a user or read from a statement.
+
+    Spaces (including non-breaking ones) are ignored and a decimal comma is
+    accepted, so '1 234,50' and '1234.5' are both understood.
+
+    Args:
+        text (str): The amount text
+
+    Returns:
+        Decimal: The parsed amount
+
+    Raises:
+        ValueError: If the text is not a finite number
+    """
+    cleaned = text.strip().replace('\xa0', '').replace(' ', '').replace(',', '.')
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {text}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {text}")
+    return amount
+
+
+def to_minor(amount):
+    """
+    Convert an amount to integer minor units, rounding half up to the kopeck.
+
+    Args:
+        amount (Decimal | int | str | float): The amount; floats are converted
+            through their shortest repr, so 0.1 becomes exactly 10 kopecks
+
+    Returns:
+        int: The amount in minor units
+
+    Raises:
+        ValueError: If the amount is out of range
+    """
+    if isinstance(amount, float):
+        amount = repr(amount)
+    value = Decimal(amount)
+    if not value.is_finite() or abs(value) * MINOR_UNITS >= MAX_AMOUNT_MINOR:
+        raise ValueError(f"Amount out of range: {amount}")
+    return int(value.quantize(_CENT, rounding=ROUND_HALF_UP) * MINOR_UNITS)
+
+
+def from_minor(minor):
+    """Convert integer minor units to an exact Decimal amount"""
+    return Decimal(minor) / MINOR_UNITS
+
+
+def format_minor(minor):
+    """Format integer minor units with two decimals, e.g. 12345 -> '123.45'"""
+    sign = '-' if minor < 0 else ''
+    whole, fraction = divmod(abs(minor), MINOR_UNITS)
+    return f"{sign}{whole}.{fraction:02d}"
@@ -0,0 +1,111 @@
+"""
+Query plan regression check for DBHandler.
+
+Runs EXPLAIN QUERY PLAN for every read query in READ_QUERIES and reports
+the ones that fall back to a full table or index scan. tests/test_query_plan.py
+runs the same check with pytest; this command line wrapper exits with status 1
+if any query scans.
+
+Usage:
+    python -m db.query_plan [path/to/database.db]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from .migrations import apply_migrations
+from .sqlite_handler import READ_QUERIES
+
+
+def explain(conn, query):
+    """
+    Return the EXPLAIN QUERY PLAN details for a query.
+
+    Args:
+        conn: An open SQLite connection
+        query (str): The query to explain; placeholders are bound to NULL
+
+    Returns:
+        list: The detail column of every plan row
+    """
+    params = (None,) * query.count('?')
+    cursor = conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def find_full_scans(conn, queries=None):
+    """
+    Find the queries whose plans contain a SCAN step.
+
+    Args:
+        conn: An open SQLite connection
+        queries (dict): Mapping of query name to SQL, READ_QUERIES by default
+
+    Returns:
+        dict: Query name to the offending plan details, empty if all queries use indexes
+    """
+    offenders = {}
+    for name, query in (queries or READ_QUERIES).items():
+        scans = [detail for detail in explain(conn, query) if detail.startswith('SCAN ')]
+        if scans:
+            offenders[name] = scans
+    return offenders
+
+
+def create_schema(db_file):
+    """
+    Create a database with the current schema for checking query plans.
+
+    Only the migrations run: unlike setup_database() this touches neither
+    the connection pool nor the write-behind journal of the bot's database.
+
+    Args:
+        db_file (str): Path of the database file to create
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+
+
+def check_query_plans(db_file):
+    """
+    Find the read queries whose plans scan in the given database.
+
+    Args:
+        db_file (str): Path of the database file
+
+    Returns:
+        dict: Query name to the offending plan details, see find_full_scans()
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        return find_full_scans(conn)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    """Check query plans against the given database or a freshly created one"""
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv:
+        db_file = argv[0]
+    else:
+        db_file = os.path.join(tempfile.mkdtemp(prefix='query_plan_'), 'check.db')
+        create_schema(db_file)
+
+    offenders = check_query_plans(db_file)
+
+    for name, scans in offenders.items():
+        print(f"FAIL {name}: {'; '.join(scans)}")
+    if offenders:
+        return 1
+
+    print(f"OK: {len(READ_QUERIES)} queries use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
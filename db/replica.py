@@ -0,0 +1,303 @@
+"""
+Read-only analytics replicas of the shards.
+
+Exports and all-user aggregates scan far more rows than the bot's
+interactive queries. Pointed at a replica they read a separate file, so
+they neither compete with add_transaction for the shard's pages and locks
+nor keep a long read transaction open that stops WAL checkpoints.
+
+A background thread looks at every shard every ANALYTICS_REPLICA_REFRESH_S
+seconds and copies the ones that changed since their last copy, as told by
+PRAGMA data_version, with the SQLite online backup API. An unchanged shard
+is not read at all. The copy runs in steps of ANALYTICS_REPLICA_BACKUP_PAGES
+pages with a short pause in between; the shard is only read-locked for the
+duration of a step, so writers and WAL checkpoints carry on between steps.
+A write committed to the shard during the copy makes SQLite start it over,
+so every refresh reads the whole file at least once and a busy shard may
+take several passes. A copy started over more than ANALYTICS_REPLICA_MAX_PASSES
+times is given up until the next refresh. Replicas take long scans off the
+shard, but refreshing them costs a full read of every shard that changed.
+
+Each shard has two replica files used in turn: readers use the newest copy
+while the next one is written to the other file, and that file is only
+overwritten once its last reader is done. Nothing writes to the file readers
+use, so they open it immutable and take no locks at all.
+
+Reads opt in by passing a staleness bound. A replica older than the bound,
+for instance because refreshes fail or fall behind, is not used and the
+read goes to the shard itself.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    logger,
+    SQLITE_PRAGMAS,
+    ANALYTICS_REPLICA_REFRESH_S,
+    ANALYTICS_REPLICA_BACKUP_PAGES,
+    ANALYTICS_REPLICA_BACKUP_SLEEP_MS,
+    ANALYTICS_REPLICA_MAX_PASSES
+)
+from .connection_pool import ConnectionPool, get_shard_pool
+from .shards import shard_directory
+
+# Read-side pragmas, replicas are never written through a pool
+REPLICA_PRAGMAS = {name: SQLITE_PRAGMAS[name] for name in ('cache_size', 'mmap_size', 'temp_store')}
+
+
+def replica_file(db_file, slot):
+    """Return the path of one of the two replica files of a shard, e.g. family_budget.replica1.db"""
+    root, ext = os.path.splitext(db_file)
+    return f"{root}.replica{slot}{ext}"
+
+
+class Replica:
+    """
+    Double-buffered read-only copy of one shard.
+    """
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.refreshed_at = None  # time.monotonic() when the current copy was last known to match the shard
+        self.refreshes = 0
+
+        self._pools = [None, None]
+        self._readers = [0, 0]
+        self._current = None
+        self._condition = threading.Condition()
+        # Connection to the shard used only for PRAGMA data_version, whose value
+        # changes when another connection commits to the file
+        self._watch = None
+        self._copied_version = None
+
+    def age(self):
+        """Seconds since the current copy was last known to match the shard, None before the first refresh"""
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    def is_fresh(self, max_staleness):
+        """Check whether the current copy is at most max_staleness seconds old"""
+        age = self.age()
+        return age is not None and age <= max_staleness
+
+    @contextmanager
+    def reader(self, max_staleness):
+        """
+        Borrow a connection to the current copy.
+
+        Args:
+            max_staleness (float): Seconds of lag the caller accepts
+
+        Yields:
+            sqlite3.Connection: A connection to the copy, or None if there is
+                no copy at most max_staleness seconds old, e.g. after close()
+        """
+        with self._condition:
+            slot = self._current
+            if slot is None or not self.is_fresh(max_staleness):
+                slot = None
+            else:
+                self._readers[slot] += 1
+        if slot is None:
+            yield None
+            return
+        try:
+            with self._pools[slot].reader() as conn:
+                yield conn
+        finally:
+            with self._condition:
+                self._readers[slot] -= 1
+                self._condition.notify_all()
+
+    def _data_version(self, db_file):
+        if self._watch is None or self._watch[0] != db_file:
+            if self._watch is not None:
+                self._watch[1].close()
+            self._watch = (db_file, sqlite3.connect(db_file, check_same_thread=False))
+            self._copied_version = None
+        return self._watch[1].execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """
+        Copy the shard into the idle file and make it the current copy, unless
+        the shard has not changed since the current copy was taken.
+
+        Returns:
+            float: Seconds the refresh took
+        """
+        started = time.monotonic()
+        primary = get_shard_pool(self.shard)
+        # Read before the copy starts, so a commit during the copy shows up next time
+        version = self._data_version(primary.db_file)
+        if self._current is not None and version == self._copied_version:
+            with self._condition:
+                self.refreshed_at = started
+            return time.monotonic() - started
+
+        slot = 1 if self._current == 0 else 0
+        path = replica_file(primary.db_file, slot)
+
+        # New readers only go to the current copy, wait for the idle one to drain
+        with self._condition:
+            self._condition.wait_for(lambda: self._readers[slot] == 0)
+            old_pool, self._pools[slot] = self._pools[slot], None
+        if old_pool is not None:
+            old_pool.close()
+
+        target = sqlite3.connect(path)
+        try:
+            with primary.reader() as source:
+                copy_in_steps(source, target)
+            # Readers open the copy immutable, it needs no WAL
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+
+        pool = ConnectionPool(path, pragmas=REPLICA_PRAGMAS, immutable=True)
+        with self._condition:
+            self._pools[slot] = pool
+            self._current = slot
+            self.refreshed_at = started
+            self.refreshes += 1
+        self._copied_version = version
+        return time.monotonic() - started
+
+    def close(self):
+        """Close the connections to both copies, waiting for running reads"""
+        with self._condition:
+            self._condition.wait_for(lambda: not any(self._readers))
+            pools, self._pools = self._pools, [None, None]
+            self._current = None
+            self.refreshed_at = None
+        for pool in pools:
+            if pool is not None:
+                pool.close()
+        if self._watch is not None:
+            self._watch[1].close()
+            self._watch = None
+            self._copied_version = None
+
+
+def copy_in_steps(source, target, pages=ANALYTICS_REPLICA_BACKUP_PAGES,
+                  sleep_ms=ANALYTICS_REPLICA_BACKUP_SLEEP_MS, max_passes=ANALYTICS_REPLICA_MAX_PASSES):
+    """
+    Copy a database with the backup API a few pages at a time.
+
+    Args:
+        source: Connection to the database to copy
+        target: Connection to the database to overwrite, not in a transaction
+        pages (int): Pages copied per step
+        sleep_ms (int): Pause between steps in milliseconds
+        max_passes (int): Times the copy may start over after the source changed
+
+    Raises:
+        sqlite3.OperationalError: If the copy started over more than max_passes times
+    """
+    passes = 1
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal passes, last_remaining
+        # SQLite starts over from the first page after a commit to the source
+        if last_remaining is not None and remaining > last_remaining:
+            passes += 1
+            if passes > max_passes:
+                raise sqlite3.OperationalError(f"the source changed during {max_passes} copies in a row")
+        last_remaining = remaining
+        # backup() itself only sleeps when the source is locked, pause here
+        # so writers get the shard between steps
+        if remaining:
+            time.sleep(sleep_ms / 1000)
+
+    source.backup(target, pages=pages, progress=progress)
+
+
+class ReplicaRefresher:
+    """
+    Background thread keeping a Replica of every shard up to date.
+    """
+
+    def __init__(self, interval_s=ANALYTICS_REPLICA_REFRESH_S):
+        self.interval = interval_s
+        self.replicas = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Take the first copies, then refresh them in the background"""
+        self.refresh_all()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-refresh", daemon=True)
+        self._thread.start()
+        logger.info(f"Analytics replicas of {len(self.replicas)} shards refreshed every {self.interval} s")
+
+    def refresh_all(self):
+        """Refresh the replica of every shard, creating replicas of new shards"""
+        for shard in shard_directory.shards():
+            replica = self.replicas.get(shard)
+            if replica is None:
+                replica = self.replicas[shard] = Replica(shard)
+            try:
+                elapsed = replica.refresh()
+                logger.debug(f"Refreshed the analytics replica of shard {shard} in {elapsed:.2f} s")
+            except sqlite3.Error as err:
+                logger.error(f"Refreshing the analytics replica of shard {shard} failed: {err}")
+
+    def stop(self):
+        """Stop refreshing and close every replica"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for replica in self.replicas.values():
+            replica.close()
+        self.replicas = {}
+        logger.info("Analytics replicas stopped")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh_all()
+
+
+# Active refresher when replicas are enabled, see start_replicas()
+replica_refresher = None
+
+
+def start_replicas():
+    """Create and start the process-wide replica refresher"""
+    global replica_refresher
+    replica_refresher = ReplicaRefresher()
+    replica_refresher.start()
+    return replica_refresher
+
+
+def stop_replicas():
+    """Stop the process-wide replica refresher if it is running"""
+    global replica_refresher
+    if replica_refresher is not None:
+        replica_refresher.stop()
+        replica_refresher = None
+
+
+@contextmanager
+def shard_reader(shard, max_staleness=None):
+    """
+    Borrow a reader connection for a shard, from its replica when allowed.
+
+    Args:
+        shard (int): Shard index
+        max_staleness (float): Seconds of lag the caller accepts; None always reads the shard
+    """
+    replica = None
+    if max_staleness is not None and replica_refresher is not None:
+        replica = replica_refresher.replicas.get(shard)
+    if replica is not None:
+        with replica.reader(max_staleness) as conn:
+            if conn is not None:
+                yield conn
+                return
+    with get_shard_pool(shard).reader() as conn:
+        yield conn
@@ -0,0 +1,156 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from config import REPORT_CACHE_MAX_ENTRIES, REPORT_CACHE_MAX_BYTES, REPORT_CACHE_TTL
+
+
+def estimate_size(value):
+    """Roughly estimate the memory used by a summary (list of dicts)"""
+    size = sys.getsizeof(value)
+    for row in value:
+        size += sys.getsizeof(row)
+        for key, item in row.items():
+            size += sys.getsizeof(key) + sys.getsizeof(item)
+    return size
+
+
+class ReportCache:
+    """
+    LRU cache of category summaries keyed by (scope, start, end), optionally
+    followed by the kind of report when it is not a plain summary.
+
+    The scope is the set of user ids a summary covers, or None for a summary
+    over every user. Entries expire after a TTL and are evicted in LRU order
+    once the entry count or the estimated memory use exceeds its cap. Writes
+    call invalidate() to drop exactly the entries whose scope includes the
+    user and whose range includes the new transaction's date.
+    """
+
+    def __init__(self, max_entries=REPORT_CACHE_MAX_ENTRIES, max_bytes=REPORT_CACHE_MAX_BYTES,
+                 ttl=REPORT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        # Bumped on every invalidation so a summary read before a concurrent
+        # write is not stored after that write already invalidated the range
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Look up a cached summary.
+
+        Args:
+            key (tuple): (scope, start_date, end_date)
+
+        Returns:
+            The cached summary, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """
+        Store a summary.
+
+        Args:
+            key (tuple): (scope, start_date, end_date)
+            value: The summary to cache
+            generation (int): Value of self.generation read before the summary
+                was queried; the entry is dropped if an invalidation happened since
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id, moment):
+        """
+        Drop cached summaries affected by a transaction.
+
+        Args:
+            user_id (int): The user who added the transaction
+            moment (datetime): The transaction date
+        """
+        self.invalidate_range(user_id, moment, moment)
+
+    def invalidate_range(self, user_id, first, last):
+        """
+        Drop cached summaries affected by a group of transactions.
+
+        Args:
+            user_id (int): The user who added the transactions
+            first (datetime): The earliest transaction date
+            last (datetime): The latest transaction date
+        """
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key in self._entries
+                if (key[0] is None or user_id in key[0]) and key[1] <= last and first <= key[2]
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every cached summary"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the cache counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+report_cache = ReportCache()
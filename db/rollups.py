@@ -0,0 +1,185 @@
+"""
+Maintenance of the daily_totals and monthly_totals rollup tables.
+
+daily_totals holds one row per user, day number (see db/dates.py) and
+category with the sum and count of that day's transactions; monthly_totals
+holds the same per month number. DBHandler.add_transaction updates both in
+the same write transaction as the insert; this module rebuilds them from
+the raw rows and checks the two for differences.
+
+Usage:
+    python -m db.rollups [--rebuild] [path/to/database.db]
+"""
+import argparse
+import sys
+
+# SQL expressions bucketing an epoch-seconds date, matching db/dates.py
+DAY_EXPRESSION = "date / 86400"
+MONTH_EXPRESSION = ("CAST(strftime('%Y', date, 'unixepoch') AS INTEGER) * 12 "
+                    "+ CAST(strftime('%m', date, 'unixepoch') AS INTEGER) - 1")
+
+UPSERT_TOTAL_QUERY = '''
+INSERT INTO {table} (user_id, {bucket}, category_id, total, count)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id, {bucket}, category_id)
+DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+'''
+
+ROLLUP_TRANSACTIONS_RANGE_QUERY = '''
+INSERT INTO {table} (user_id, {bucket}, category_id, total, count)
+SELECT user_id, {expression}, category_id, SUM(amount), COUNT(*)
+FROM transactions
+WHERE id > ? AND id <= ?
+GROUP BY user_id, {expression}, category_id
+ON CONFLICT (user_id, {bucket}, category_id)
+DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+'''
+
+EXPECTED_TOTALS_QUERY = '''
+CREATE TEMP TABLE expected_totals AS
+SELECT user_id, {expression} AS bucket, category_id, SUM(amount) AS total, COUNT(*) AS count
+FROM transactions
+GROUP BY user_id, {expression}, category_id
+'''
+
+TOTALS_DIFF_QUERY = '''
+SELECT e.user_id, e.bucket, e.category_id,
+       e.total AS expected_total, d.total AS actual_total,
+       e.count AS expected_count, d.count AS actual_count
+FROM expected_totals e
+LEFT JOIN {table} d
+  ON d.user_id = e.user_id AND d.{bucket} = e.bucket AND d.category_id = e.category_id
+WHERE d.user_id IS NULL OR d.count != e.count OR d.total != e.total
+UNION ALL
+SELECT d.user_id, d.{bucket}, d.category_id,
+       NULL, d.total,
+       NULL, d.count
+FROM {table} d
+LEFT JOIN expected_totals e
+  ON d.user_id = e.user_id AND d.{bucket} = e.bucket AND d.category_id = e.category_id
+WHERE e.user_id IS NULL
+ORDER BY 1, 2, 3
+'''
+
+# Rollup table name to (bucket column, SQL expression computing it)
+ROLLUPS = {
+    'daily_totals': ('day', DAY_EXPRESSION),
+    'monthly_totals': ('month', MONTH_EXPRESSION),
+}
+
+
+def rollup_query(query, table):
+    """Fill a rollup query template for the given rollup table"""
+    bucket, expression = ROLLUPS[table]
+    return query.format(table=table, bucket=bucket, expression=expression)
+
+
+UPSERT_DAILY_TOTAL_QUERY = rollup_query(UPSERT_TOTAL_QUERY, 'daily_totals')
+UPSERT_MONTHLY_TOTAL_QUERY = rollup_query(UPSERT_TOTAL_QUERY, 'monthly_totals')
+
+
+def add_transactions_to_rollup(conn, table, after_id, up_to_id):
+    """
+    Add the transactions with after_id < id <= up_to_id to a rollup table.
+
+    Args:
+        conn: The writer connection
+        table (str): 'daily_totals' or 'monthly_totals'
+        after_id (int): Exclusive lower bound of transaction ids
+        up_to_id (int): Inclusive upper bound of transaction ids
+    """
+    conn.execute(rollup_query(ROLLUP_TRANSACTIONS_RANGE_QUERY, table), (after_id, up_to_id))
+
+
+def rebuild_rollup(conn, table):
+    """
+    Recompute a rollup table from the transactions table in bounded batches.
+    The rollup is cleared first, so reports read partial totals until the
+    rebuild finishes; run it while the bot is stopped.
+
+    Args:
+        conn: The writer connection
+        table (str): 'daily_totals' or 'monthly_totals'
+    """
+    from .migrations import backfill_in_batches, CREATE_BACKFILL_PROGRESS_TABLE
+
+    task = f"{table}_rebuild"
+    conn.execute(CREATE_BACKFILL_PROGRESS_TABLE)
+    conn.execute(f"DELETE FROM {table}")
+    conn.execute("DELETE FROM backfill_progress WHERE task = ?", (task,))
+    conn.commit()
+    backfill_in_batches(conn, task, "transactions",
+                        lambda conn, after_id, up_to_id: add_transactions_to_rollup(conn, table, after_id, up_to_id))
+
+
+def rebuild_daily_totals(conn):
+    """Recompute daily_totals from the transactions table, see rebuild_rollup()"""
+    rebuild_rollup(conn, 'daily_totals')
+
+
+def rebuild_monthly_totals(conn):
+    """Recompute monthly_totals from the transactions table, see rebuild_rollup()"""
+    rebuild_rollup(conn, 'monthly_totals')
+
+
+def check_rollup(conn, table):
+    """
+    Compare a rollup table with totals aggregated from the raw transactions.
+
+    Args:
+        conn: Any connection to the database
+        table (str): 'daily_totals' or 'monthly_totals'
+
+    Returns:
+        list: Mismatching rows as (user_id, bucket, category_id, expected_total,
+            actual_total, expected_count, actual_count); missing values are None
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.expected_totals")
+    conn.execute(rollup_query(EXPECTED_TOTALS_QUERY, table))
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(rollup_query(TOTALS_DIFF_QUERY, table)).fetchall()
+    finally:
+        conn.execute("DROP TABLE temp.expected_totals")
+
+
+def check_daily_totals(conn):
+    """Compare daily_totals with the raw transactions, see check_rollup()"""
+    return check_rollup(conn, 'daily_totals')
+
+
+def main(argv=None):
+    """Check the rollups against transactions and optionally rebuild them"""
+    from .connection_pool import get_pool, configure_pool, close_pool
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the daily and monthly rollups")
+    parser.add_argument("db_file", nargs="?", help="Database file, defaults to SQLITE_DB_FILE")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the rollups from transactions first")
+    args = parser.parse_args(argv)
+
+    pool = configure_pool(args.db_file) if args.db_file else get_pool()
+    mismatches = {}
+    with pool.writer() as conn:
+        for table in ROLLUPS:
+            if args.rebuild:
+                rebuild_rollup(conn, table)
+            mismatches[table] = check_rollup(conn, table)
+    close_pool()
+
+    status = 0
+    for table, rows in mismatches.items():
+        bucket = ROLLUPS[table][0]
+        for row in rows[:50]:
+            print("MISMATCH {} user={} {}={} category={} expected={}/{} actual={}/{}".format(
+                table, row[0], bucket, row[1], row[2], row[3], row[5], row[4], row[6]))
+        if rows:
+            print(f"{len(rows)} {table} rows differ from transactions")
+            status = 1
+        else:
+            print(f"{table} matches transactions")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+"""
+Horizontal sharding of per-user data over several SQLite files.
+
+Each user's transactions and rollup rows live in exactly one shard file,
+so writes of users on different shards never wait for the same write lock
+and no single file holds everything. Shard 0 is the main database, which
+also keeps the tables shared by all users (categories, families, the shard
+directory, conversation state). Categories are copied to every shard so the
+summary queries can join them locally.
+
+The user_shards table in the main database records where each user lives.
+New users are placed by a stable hash of their id over SQLITE_SHARD_COUNT
+shards; a user stays where they are until moved, so changing the shard
+count only affects new users until the rebalance tool moves the rest.
+
+Moving users must happen while the bot is stopped, the running bot does
+not notice directory changes made by another process.
+
+Usage:
+    python -m db.shards stats
+    python -m db.shards move USER_ID SHARD
+    python -m db.shards rebalance [--dry-run]
+    python -m db.shards summary [--days 30]
+"""
+import argparse
+import os
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from config import logger, SQLITE_SHARD_COUNT
+from .connection_pool import get_pool, get_shard_pool
+from .migrations import apply_migrations
+
+GET_USER_SHARDS_QUERY = '''
+SELECT user_id, shard FROM user_shards
+'''
+
+ASSIGN_USER_SHARD_QUERY = '''
+INSERT INTO user_shards (user_id, shard) VALUES (?, ?)
+ON CONFLICT (user_id) DO NOTHING
+'''
+
+SET_USER_SHARD_QUERY = '''
+INSERT INTO user_shards (user_id, shard) VALUES (?, ?)
+ON CONFLICT (user_id) DO UPDATE SET shard = excluded.shard
+'''
+
+GET_ALL_CATEGORIES_QUERY = '''
+SELECT id, name, type FROM categories
+'''
+
+REPLICATE_CATEGORY_QUERY = '''
+INSERT INTO categories (id, name, type) VALUES (?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET name = excluded.name, type = excluded.type
+'''
+
+GET_SHARD_USERS_QUERY = '''
+SELECT DISTINCT user_id FROM transactions
+'''
+
+# Tables holding per-user rows, moved together with the user
+USER_TABLES = {
+    'transactions': 'user_id, category_id, amount, description, date',
+    'daily_totals': 'user_id, day, category_id, total, count',
+    'monthly_totals': 'user_id, month, category_id, total, count',
+}
+
+
+def default_shard(user_id, shard_count):
+    """
+    Return the shard a new user is placed on.
+
+    crc32 of the id spreads sequential ids evenly and, unlike hash(),
+    gives the same answer in every process.
+    """
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(user_id.to_bytes(8, 'little', signed=True)) % shard_count
+
+
+class ShardDirectory:
+    """
+    Process-wide in-memory copy of the user_shards table.
+
+    Lookups for reads never touch the database. The first write of a user
+    that is not in the directory yet places them with default_shard() and
+    records the placement.
+    """
+
+    def __init__(self, shard_count=SQLITE_SHARD_COUNT):
+        self.shard_count = max(1, shard_count)
+        self._shards = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the directory from the main database, replacing the cached copy"""
+        with get_pool().reader() as conn:
+            rows = conn.execute(GET_USER_SHARDS_QUERY).fetchall()
+
+        with self._lock:
+            self._shards = {row['user_id']: row['shard'] for row in rows}
+            self._loaded = True
+        logger.info(f"Loaded the shard directory: {len(rows)} users on {len(self.shards())} shards")
+
+    def shard_for(self, user_id):
+        """Return the shard holding a user's data; users without data map to their default shard"""
+        self._ensure_loaded()
+        shard = self._shards.get(user_id)
+        return default_shard(user_id, self.shard_count) if shard is None else shard
+
+    def place(self, user_id):
+        """
+        Return the shard a user's new rows go to, recording the placement of new users.
+        Must not be called while holding the main database's writer connection.
+        """
+        self._ensure_loaded()
+        shard = self._shards.get(user_id)
+        if shard is not None:
+            return shard
+
+        shard = default_shard(user_id, self.shard_count)
+        with get_pool().writer() as conn:
+            conn.execute(ASSIGN_USER_SHARD_QUERY, (user_id, shard))
+            conn.commit()
+        with self._lock:
+            shard = self._shards.setdefault(user_id, shard)
+        return shard
+
+    def assign(self, user_id, shard):
+        """Record that a user's data now lives on another shard"""
+        with get_pool().writer() as conn:
+            conn.execute(SET_USER_SHARD_QUERY, (user_id, shard))
+            conn.commit()
+        with self._lock:
+            self._shards[user_id] = shard
+
+    def group(self, user_ids):
+        """
+        Split users by the shard holding their data.
+
+        Returns:
+            dict: shard -> tuple of user ids, in the order given
+        """
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(self.shard_for(user_id), []).append(user_id)
+        return {shard: tuple(ids) for shard, ids in groups.items()}
+
+    def shards(self):
+        """Return every shard index in use or configured, ascending"""
+        self._ensure_loaded()
+        return sorted(set(range(self.shard_count)) | set(self._shards.values()))
+
+    def users(self):
+        """Return a copy of the directory as user_id -> shard"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._shards)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+
+shard_directory = ShardDirectory()
+
+# Threads that query several shards at once, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def run_on_shards(func, shards):
+    """
+    Call func(shard) for every shard, in parallel when there is more than one.
+
+    SQLite releases the GIL while it executes a statement, so the shards
+    are read at the same time.
+
+    Returns:
+        list: The results in the order of shards
+    """
+    global _executor
+    shards = list(shards)
+    if len(shards) == 1:
+        return [func(shards[0])]
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(2, SQLITE_SHARD_COUNT),
+                                               thread_name_prefix="shard-fanout")
+    return list(_executor.map(func, shards))
+
+
+def shutdown_shard_executor():
+    """Stop the fan-out threads"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def replicate_categories(shards):
+    """Copy the categories of the main database to other shards, keeping their ids"""
+    with get_pool().reader() as conn:
+        categories = [(row['id'], row['name'], row['type']) for row in conn.execute(GET_ALL_CATEGORIES_QUERY)]
+    for shard in shards:
+        if shard == 0:
+            continue
+        with get_shard_pool(shard).writer() as conn:
+            conn.executemany(REPLICATE_CATEGORY_QUERY, categories)
+            conn.commit()
+
+
+def prepare_shard(shard):
+    """Bring a shard's schema up to date and give it the current categories"""
+    if shard == 0:
+        return
+    with get_shard_pool(shard).writer() as conn:
+        # Shared tables such as the shard directory only live in the main database
+        apply_migrations(conn, main=False)
+    replicate_categories([shard])
+
+
+def purge_user(shard, user_id):
+    """Delete a user's rows from a shard"""
+    with get_shard_pool(shard).writer() as conn:
+        for table in USER_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        conn.commit()
+
+
+def move_user(user_id, target):
+    """
+    Move a user's transactions and rollup rows to another shard.
+
+    The rows are copied to the target in one transaction, then the
+    directory is switched, then the source rows are deleted. Re-running an
+    interrupted move clears the partial copy first; rows left behind on the
+    source after the switch are removed by purge_orphans().
+
+    Args:
+        user_id (int): The user to move
+        target (int): Index of the destination shard
+
+    Returns:
+        int: Number of transactions moved
+    """
+    source = shard_directory.shard_for(user_id)
+    if source == target:
+        return 0
+
+    prepare_shard(target)
+    source_file = os.path.abspath(get_shard_pool(source).db_file)
+    with get_shard_pool(target).writer() as conn:
+        # ATTACH is not allowed inside a transaction
+        conn.execute("ATTACH DATABASE ? AS source", (source_file,))
+        try:
+            moved = 0
+            for table, columns in USER_TABLES.items():
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+                cursor = conn.execute(
+                    f"INSERT INTO main.{table} ({columns}) "
+                    f"SELECT {columns} FROM source.{table} WHERE user_id = ?",
+                    (user_id,)
+                )
+                if table == 'transactions':
+                    moved = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE source")
+
+    shard_directory.assign(user_id, target)
+    purge_user(source, user_id)
+    logger.info(f"Moved user {user_id} with {moved} transactions from shard {source} to shard {target}")
+    return moved
+
+
+def purge_orphans():
+    """
+    Delete rows of users the directory places on another shard and record
+    users found on a shard that are missing from the directory.
+
+    Returns:
+        int: Number of users whose leftover rows were deleted
+    """
+    purged = 0
+    directory = shard_directory.users()
+    for shard in shard_directory.shards():
+        with get_shard_pool(shard).reader() as conn:
+            user_ids = [row['user_id'] for row in conn.execute(GET_SHARD_USERS_QUERY)]
+        for user_id in user_ids:
+            home = directory.get(user_id)
+            if home is None:
+                shard_directory.assign(user_id, shard)
+            elif home != shard:
+                purge_user(shard, user_id)
+                purged += 1
+    return purged
+
+
+def rebalance(dry_run=False):
+    """
+    Move every user to the shard default_shard() picks for the configured shard count.
+
+    Args:
+        dry_run (bool): Only report the moves
+
+    Returns:
+        list: (user_id, source, target) of every move
+    """
+    moves = [(user_id, shard, default_shard(user_id, shard_directory.shard_count))
+             for user_id, shard in sorted(shard_directory.users().items())]
+    moves = [move for move in moves if move[1] != move[2]]
+    if dry_run:
+        return moves
+
+    for user_id, _, target in moves:
+        move_user(user_id, target)
+    purge_orphans()
+    return moves
+
+
+def shard_stats():
+    """
+    Describe every shard.
+
+    Returns:
+        list: Dicts with the shard index, file, size in bytes, users and transactions
+    """
+    users_per_shard = {}
+    for shard in shard_directory.users().values():
+        users_per_shard[shard] = users_per_shard.get(shard, 0) + 1
+
+    def describe(shard):
+        pool = get_shard_pool(shard)
+        with pool.reader() as conn:
+            transactions = conn.execute("SELECT COUNT(*) AS count FROM transactions").fetchone()['count']
+        size = sum(os.path.getsize(pool.db_file + suffix) for suffix in ('', '-wal')
+                   if os.path.exists(pool.db_file + suffix))
+        return {'shard': shard, 'file': pool.db_file, 'size': size,
+                'users': users_per_shard.get(shard, 0), 'transactions': transactions}
+
+    return run_on_shards(describe, shard_directory.shards())
+
+
+def main(argv=None):
+    """Inspect the shards, move users between them or print an all-user summary"""
+    from datetime import datetime, timedelta
+    from .connection_pool import close_pool
+    from .money import format_minor
+    from .sqlite_handler import DBHandler, setup_database
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help="Users, transactions and file size per shard")
+    move_parser = commands.add_parser('move', help="Move one user to a shard")
+    move_parser.add_argument('user_id', type=int)
+    move_parser.add_argument('shard', type=int)
+    rebalance_parser = commands.add_parser('rebalance', help="Move users to their hash shard")
+    rebalance_parser.add_argument('--dry-run', action='store_true', help="Only list the moves")
+    summary_parser = commands.add_parser('summary', help="Category totals over every user")
+    summary_parser.add_argument('--days', type=int, default=30, help="Days back from today")
+    args = parser.parse_args(argv)
+
+    setup_database()
+    if args.command == 'stats':
+        for stats in shard_stats():
+            print(f"shard {stats['shard']}: {stats['users']} users, {stats['transactions']} transactions, "
+                  f"{stats['size'] / 1024 / 1024:.1f} MB ({stats['file']})")
+    elif args.command == 'move':
+        moved = move_user(args.user_id, args.shard)
+        print(f"Moved {moved} transactions")
+    elif args.command == 'rebalance':
+        moves = rebalance(args.dry_run)
+        for user_id, source, target in moves:
+            print(f"user {user_id}: shard {source} -> {target}")
+        print(f"{len(moves)} users {'to move' if args.dry_run else 'moved'}")
+    else:
+        end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+        start = (end - timedelta(days=args.days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        for row in DBHandler.get_admin_summary(start, end):
+            print(f"{row['type']:<8} {row['category']:<20} {format_minor(row['total']):>14} "
+                  f"{row['count']:>8} transactions, {row['users']} users")
+
+    shutdown_shard_executor()
+    close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
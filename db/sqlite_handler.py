@@ -1,144 +1,430 @@
 import sqlite3
 import os
-from datetime import datetime
-from config import logger, SQLITE_DB_FILE
-from .models import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+import secrets
+from datetime import datetime, time, timedelta
+from config import logger, EXPORT_BATCH_SIZE
+from .connection_pool import get_pool, get_shard_pool
+from .migrations import apply_migrations
+from .category_registry import category_registry
+from .dates import SECONDS_PER_DAY, to_epoch, from_epoch, to_day, to_month, from_month
+from .rollups import UPSERT_DAILY_TOTAL_QUERY, UPSERT_MONTHLY_TOTAL_QUERY
+from .report_cache import report_cache
+from .shards import shard_directory, run_on_shards, prepare_shard, replicate_categories
+from .replica import shard_reader
+
+# Queries used by DBHandler, kept at module level so their plans can be checked
+ADD_TRANSACTION_QUERY = '''
+INSERT INTO transactions (user_id, category_id, amount, description, date)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+SET_WRITE_BEHIND_SEQ_QUERY = '''
+INSERT INTO write_behind_state (id, last_seq) VALUES (1, ?)
+ON CONFLICT (id) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq)
+'''
+
+GET_WRITE_BEHIND_SEQ_QUERY = '''
+SELECT last_seq FROM write_behind_state WHERE id = 1
+'''
+
+GET_CATEGORY_INFO_QUERY = '''
+SELECT id, name, type FROM categories WHERE id = ?
+'''
+
+GET_CATEGORIES_QUERY = '''
+SELECT id, name FROM categories WHERE type = ? ORDER BY name
+'''
+
+ADD_CATEGORY_QUERY = '''
+INSERT INTO categories (name, type) VALUES (?, ?)
+'''
+
+RENAME_CATEGORY_QUERY = '''
+UPDATE categories SET name = ? WHERE id = ?
+'''
+
+GET_TRANSACTIONS_QUERY = '''
+SELECT t.id, t.amount, t.description, t.date, c.name as category, c.type
+FROM transactions t
+JOIN categories c ON t.category_id = c.id
+WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
+ORDER BY t.date DESC
+'''
+
+EXPORT_TRANSACTIONS_QUERY = '''
+SELECT t.id, t.date, c.type, c.name as category, t.amount, t.description
+FROM transactions t
+JOIN categories c ON t.category_id = c.id
+WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
+ORDER BY t.date
+'''
+
+# Summaries are scoped to a group of users, {user_ids} is filled by scoped()
+GET_CATEGORY_SUMMARY_QUERY = '''
+SELECT c.name as category, c.type, SUM(t.amount) as total
+FROM transactions t
+JOIN categories c ON t.category_id = c.id
+WHERE t.user_id IN ({user_ids}) AND t.date BETWEEN ? AND ?
+GROUP BY c.id
+ORDER BY c.type, total DESC
+'''
+
+GET_DAILY_SUMMARY_QUERY = '''
+SELECT c.name as category, c.type, SUM(d.total) as total
+FROM daily_totals d
+JOIN categories c ON d.category_id = c.id
+WHERE d.user_id IN ({user_ids}) AND d.day BETWEEN ? AND ?
+GROUP BY c.id
+ORDER BY c.type, total DESC
+'''
+
+# Several whole-day periods summed in one pass over daily_totals, the
+# outer range spans them all and each column keeps only its own days
+DASHBOARD_PERIODS = ('today', 'week', 'month', 'previous_month')
+
+GET_DASHBOARD_SUMMARY_QUERY = '''
+SELECT c.name as category, c.type,
+       SUM(CASE WHEN d.day BETWEEN ? AND ? THEN d.total ELSE 0 END) as today,
+       SUM(CASE WHEN d.day BETWEEN ? AND ? THEN d.total ELSE 0 END) as week,
+       SUM(CASE WHEN d.day BETWEEN ? AND ? THEN d.total ELSE 0 END) as month,
+       SUM(CASE WHEN d.day BETWEEN ? AND ? THEN d.total ELSE 0 END) as previous_month
+FROM daily_totals d
+JOIN categories c ON d.category_id = c.id
+WHERE d.user_id IN ({user_ids}) AND d.day BETWEEN ? AND ?
+GROUP BY c.id
+ORDER BY c.type, month DESC, previous_month DESC
+'''
+
+GET_MONTHLY_TOTALS_QUERY = '''
+SELECT c.name as category, c.type, m.month, SUM(m.total) as total
+FROM monthly_totals m
+JOIN categories c ON m.category_id = c.id
+WHERE m.user_id IN ({user_ids}) AND m.month BETWEEN ? AND ?
+GROUP BY c.id, m.month
+ORDER BY c.type, c.name, m.month
+'''
+
+CREATE_FAMILY_QUERY = '''
+INSERT INTO families (name, owner_id, invite_code) VALUES (?, ?, ?)
+'''
+
+SET_FAMILY_MEMBER_QUERY = '''
+INSERT INTO family_members (user_id, family_id) VALUES (?, ?)
+ON CONFLICT (user_id) DO UPDATE SET family_id = excluded.family_id
+'''
+
+DELETE_FAMILY_MEMBER_QUERY = '''
+DELETE FROM family_members WHERE user_id = ?
+'''
+
+GET_FAMILY_BY_INVITE_CODE_QUERY = '''
+SELECT id, name, owner_id, invite_code FROM families WHERE invite_code = ?
+'''
+
+GET_USER_FAMILY_QUERY = '''
+SELECT f.id, f.name, f.owner_id, f.invite_code
+FROM family_members m
+JOIN families f ON f.id = m.family_id
+WHERE m.user_id = ?
+'''
+
+GET_FAMILY_MEMBERS_QUERY = '''
+SELECT other.user_id
+FROM family_members m
+JOIN family_members other ON other.family_id = m.family_id
+WHERE m.user_id = ?
+ORDER BY other.user_id
+'''
+
+GET_CONVERSATION_STATES_QUERY = '''
+SELECT key, state FROM conversation_states WHERE name = ?
+'''
+
+SET_CONVERSATION_STATE_QUERY = '''
+INSERT INTO conversation_states (name, key, state) VALUES (?, ?, ?)
+ON CONFLICT (name, key) DO UPDATE SET state = excluded.state
+'''
+
+DELETE_CONVERSATION_STATE_QUERY = '''
+DELETE FROM conversation_states WHERE name = ? AND key = ?
+'''
+
+GET_ALL_USER_DATA_QUERY = '''
+SELECT user_id, data FROM user_data
+'''
+
+SET_USER_DATA_QUERY = '''
+INSERT INTO user_data (user_id, data) VALUES (?, ?)
+ON CONFLICT (user_id) DO UPDATE SET data = excluded.data
+'''
 
-# SQL statements optimized for SQLite
-CREATE_CATEGORIES_TABLE_SQLITE = '''
-CREATE TABLE IF NOT EXISTS categories (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    type TEXT NOT NULL CHECK (type IN ('income', 'expense'))
-)
+DELETE_USER_DATA_QUERY = '''
+DELETE FROM user_data WHERE user_id = ?
 '''
 
-CREATE_TRANSACTIONS_TABLE_SQLITE = '''
-CREATE TABLE IF NOT EXISTS transactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    category_id INTEGER NOT NULL,
-    amount REAL NOT NULL,
-    description TEXT,
-    date TEXT NOT NULL,
-    FOREIGN KEY (category_id) REFERENCES categories(id)
-)
+# Totals over every user, run on each shard and added up; users live on one shard each
+GET_ADMIN_SUMMARY_QUERY = '''
+SELECT c.name as category, c.type, SUM(d.total) as total, SUM(d.count) as count,
+       COUNT(DISTINCT d.user_id) as users
+FROM daily_totals d
+JOIN categories c ON d.category_id = c.id
+WHERE d.day BETWEEN ? AND ?
+GROUP BY c.id
+ORDER BY c.type, total DESC
 '''
 
+# Length in bytes of the random part of family invite codes
+FAMILY_INVITE_CODE_BYTES = 6
 
-def dict_factory(cursor, row):
-    """Convert SQLite row to dictionary"""
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
 
+def scoped(query, user_ids):
+    """Fill the {user_ids} slot of a scoped query with one placeholder per user"""
+    return query.format(user_ids=', '.join('?' * len(user_ids)))
 
-def get_db_connection():
-    """Create and return a connection to the SQLite database"""
-    conn = sqlite3.connect(SQLITE_DB_FILE)
-    conn.row_factory = dict_factory
-    return conn
+
+# Read queries whose plans must stay index-driven, see db/query_plan.py
+READ_QUERIES = {
+    'get_category_info': GET_CATEGORY_INFO_QUERY,
+    'get_categories': GET_CATEGORIES_QUERY,
+    'get_transactions': GET_TRANSACTIONS_QUERY,
+    'iter_transactions': EXPORT_TRANSACTIONS_QUERY,
+    'get_category_summary': scoped(GET_CATEGORY_SUMMARY_QUERY, (0, 0)),
+    'get_daily_summary': scoped(GET_DAILY_SUMMARY_QUERY, (0, 0)),
+    'get_dashboard_summary': scoped(GET_DASHBOARD_SUMMARY_QUERY, (0, 0)),
+    'get_monthly_totals': scoped(GET_MONTHLY_TOTALS_QUERY, (0, 0)),
+    'get_family_by_invite_code': GET_FAMILY_BY_INVITE_CODE_QUERY,
+    'get_user_family': GET_USER_FAMILY_QUERY,
+    'get_family_members': GET_FAMILY_MEMBERS_QUERY,
+    'get_conversation_states': GET_CONVERSATION_STATES_QUERY,
+}
+
+
+def query_user_shards(query, user_ids, params, max_staleness=None):
+    """
+    Run a scoped query on every shard holding some of the users, in parallel.
+
+    Args:
+        query (str): Query with a {user_ids} slot
+        user_ids (tuple): The users
+        params: Callable building the query parameters from the user ids of one shard
+        max_staleness (float): Seconds of lag accepted from analytics replicas, None reads the shards
+
+    Returns:
+        list: The rows of each shard, one list per shard
+    """
+    groups = shard_directory.group(user_ids)
+
+    def run(shard):
+        ids = groups[shard]
+        with shard_reader(shard, max_staleness) as conn:
+            return conn.execute(scoped(query, ids), params(ids)).fetchall()
+
+    return run_on_shards(run, groups)
+
+
+def merge_shard_rows(results, key_columns, sum_columns, sort_key):
+    """
+    Add up the rows of the same group returned by several shards.
+
+    Args:
+        results (list): One list of row dicts per shard
+        key_columns (tuple): Columns identifying a group
+        sum_columns (tuple): Columns to add up
+        sort_key: Sort key reproducing the query's ORDER BY
+
+    Returns:
+        list: The merged rows
+    """
+    if len(results) == 1:
+        return results[0]
+
+    merged = {}
+    for rows in results:
+        for row in rows:
+            key = tuple(row[column] for column in key_columns)
+            current = merged.get(key)
+            if current is None:
+                merged[key] = row
+            else:
+                for column in sum_columns:
+                    current[column] += row[column]
+    return sorted(merged.values(), key=sort_key)
+
+
+def write_transactions(conn, transactions):
+    """
+    Insert transactions and update their daily and monthly totals on an open connection.
+    The caller owns the transaction and commits it.
+
+    Args:
+        conn: The writer connection
+        transactions (list): (user_id, category_id, amount, description, date) tuples
+    """
+    rows = []
+    daily = {}
+    monthly = {}
+    for user_id, category_id, amount, description, date in transactions:
+        # Dates are stored as integer epoch seconds
+        seconds = to_epoch(date)
+        rows.append((user_id, category_id, amount, description, seconds))
+
+        # Pre-aggregate so every rollup row is upserted once per call
+        for totals, key in ((daily, (user_id, seconds // SECONDS_PER_DAY, category_id)),
+                            (monthly, (user_id, to_month(date), category_id))):
+            total, count = totals.get(key, (0, 0))
+            totals[key] = (total + amount, count + 1)
+
+    conn.executemany(ADD_TRANSACTION_QUERY, rows)
+    conn.executemany(UPSERT_DAILY_TOTAL_QUERY,
+                     [key + value for key, value in daily.items()])
+    conn.executemany(UPSERT_MONTHLY_TOTAL_QUERY,
+                     [key + value for key, value in monthly.items()])
+
+
+def invalidate_cached_reports(transactions):
+    """Drop cached summaries overlapping the dates of newly added transactions"""
+    ranges = {}
+    for user_id, _, _, _, date in transactions:
+        first, last = ranges.get(user_id, (date, date))
+        ranges[user_id] = (min(first, date), max(last, date))
+    for user_id, (first, last) in ranges.items():
+        report_cache.invalidate_range(user_id, first, last)
+
+
+def covers_whole_days(start_date, end_date):
+    """Check whether a range starts at midnight and ends on the last instant of a day"""
+    return (start_date.time() == time.min
+            and (end_date.time() == time.max or end_date.time() == time(23, 59, 59)))
 
 
 def setup_database():
     """
-    Initialize the SQLite database and create required tables if they don't exist.
-    Also populates default categories.
+    Initialize the SQLite database and bring its schema up to date.
+    Pending migrations are applied in order, the first one creates the
+    tables and populates default categories.
     """
     try:
-        logger.info(f"Setting up SQLite database at {SQLITE_DB_FILE}...")
+        pool = get_pool()
+        logger.info(f"Setting up SQLite database at {pool.db_file}...")
 
         # Create directory for database if it doesn't exist
-        db_dir = os.path.dirname(SQLITE_DB_FILE)
+        db_dir = os.path.dirname(pool.db_file)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
 
-        conn = sqlite3.connect(SQLITE_DB_FILE)
-        cursor = conn.cursor()
+        with pool.writer() as conn:
+            version = apply_migrations(conn)
 
-        # Create tables
-        cursor.execute(CREATE_CATEGORIES_TABLE_SQLITE)
-        cursor.execute(CREATE_TRANSACTIONS_TABLE_SQLITE)
+        # The other shards get the same schema and the main database's categories
+        shard_directory.load()
+        for shard in shard_directory.shards():
+            prepare_shard(shard)
 
-        # Check if categories table is empty
-        cursor.execute("SELECT COUNT(*) FROM categories")
-        count = cursor.fetchone()[0]
+        # Commit transactions left in the write-behind journal by a crash
+        from .write_behind import replay_journal
+        replay_journal()
 
-        if count == 0:
-            logger.info("Populating default categories in SQLite...")
-            for category in INCOME_CATEGORIES:
-                cursor.execute("INSERT INTO categories (name, type) VALUES (?, ?)",
-                               (category, 'income'))
+        # Categories may have changed, serve them fresh from the registry
+        category_registry.load()
 
-            for category in EXPENSE_CATEGORIES:
-                cursor.execute("INSERT INTO categories (name, type) VALUES (?, ?)",
-                               (category, 'expense'))
-
-        conn.commit()
-        logger.info("SQLite database setup completed successfully")
+        logger.info(f"SQLite database setup completed successfully (schema version {version})")
 
     except sqlite3.Error as err:
         logger.error(f"SQLite database setup failed: {err}")
         raise
 
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
-
 
 class DBHandler:
     """
     Handler for all database operations using SQLite.
+    Connections are borrowed from the shared pools: writes go through the
+    single writer connection, reads through the reader connections.
+    Transactions are read from and written to the shard of their user,
+    see db/shards.py; everything else lives in the main database.
     """
 
     @staticmethod
     def add_transaction(user_id, category_id, amount, description=None):
-        """Add a new transaction to the database"""
-        conn = None
-        cursor = None
+        """Add a new transaction to the database, amount is in integer minor units"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            shard = shard_directory.place(user_id)
+            with get_shard_pool(shard).writer() as conn:
+                now = datetime.now()
+                write_transactions(conn, [(user_id, category_id, amount, description, now)])
+                conn.commit()
+            report_cache.invalidate(user_id, now)
+            logger.info(f"Transaction added for user {user_id}, category {category_id}")
 
-            # Format datetime as ISO string for SQLite
-            date_str = datetime.now().isoformat()
+        except sqlite3.Error as err:
+            logger.error(f"Error adding transaction: {err}")
+            raise
 
-            query = """
-            INSERT INTO transactions (user_id, category_id, amount, description, date)
-            VALUES (?, ?, ?, ?, ?)
-            """
+    @staticmethod
+    def add_transactions(transactions, write_behind_seqs=None):
+        """
+        Add several transactions, in a single write transaction per shard.
+
+        Args:
+            transactions (list): (user_id, category_id, amount, description, date) tuples
+            write_behind_seqs (list): Journal sequence number of every transaction. Each
+                shard stores the last number it committed in the same transaction as the
+                rows and skips rows at or below it, so retries and replays after a failure
+                on another shard never insert a row twice
+
+        Returns:
+            int: Number of transactions inserted
+        """
+        if write_behind_seqs is None:
+            write_behind_seqs = [None] * len(transactions)
+
+        by_shard = {}
+        for transaction, seq in zip(transactions, write_behind_seqs):
+            by_shard.setdefault(shard_directory.place(transaction[0]), []).append((seq, transaction))
 
-            cursor.execute(query, (user_id, category_id, amount, description, date_str))
-            conn.commit()
-            logger.info(f"Transaction added for user {user_id}, category {category_id}")
+        try:
+            added = []
+            for shard, rows in sorted(by_shard.items()):
+                with get_shard_pool(shard).writer() as conn:
+                    if rows[-1][0] is not None:
+                        committed = conn.execute(GET_WRITE_BEHIND_SEQ_QUERY).fetchone()
+                        committed = committed['last_seq'] if committed else 0
+                        rows = [(seq, transaction) for seq, transaction in rows if seq > committed]
+                        if not rows:
+                            continue
+                        conn.execute(SET_WRITE_BEHIND_SEQ_QUERY, (rows[-1][0],))
+                    write_transactions(conn, [transaction for _, transaction in rows])
+                    conn.commit()
+                added.extend(transaction for _, transaction in rows)
+
+            invalidate_cached_reports(added)
+            logger.info(f"{len(added)} transactions added")
+            return len(added)
 
         except sqlite3.Error as err:
-            logger.error(f"Error adding transaction: {err}")
-            if conn:
-                conn.rollback()
+            logger.error(f"Error adding transactions: {err}")
             raise
 
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+    @staticmethod
+    def get_write_behind_seq():
+        """Get the journal sequence number of the last committed write-behind row on any shard"""
+        def last_seq(shard):
+            with get_shard_pool(shard).reader() as conn:
+                row = conn.execute(GET_WRITE_BEHIND_SEQ_QUERY).fetchone()
+            return row['last_seq'] if row else 0
+
+        try:
+            return max(run_on_shards(last_seq, shard_directory.shards()))
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting write-behind sequence: {err}")
+            raise
 
     @staticmethod
     def get_category_info(category_id):
         """Get category information by ID"""
-        conn = None
-        cursor = None
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            query = "SELECT id, name, type FROM categories WHERE id = ?"
-            cursor.execute(query, (category_id,))
-            category = cursor.fetchone()
+            with get_pool().reader() as conn:
+                category = conn.execute(GET_CATEGORY_INFO_QUERY, (category_id,)).fetchone()
 
             return category
 
@@ -146,24 +432,16 @@ class DBHandler:
             logger.error(f"Error getting category info: {err}")
             raise
 
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-
     @staticmethod
     def get_categories(transaction_type):
         """Get all categories of a specific type"""
-        conn = None
-        cursor = None
         try:
-            conn = sqlite3.connect(SQLITE_DB_FILE)  # Don't use dict factory here
-            cursor = conn.cursor()
-
-            query = "SELECT id, name FROM categories WHERE type = ? ORDER BY name"
-            cursor.execute(query, (transaction_type,))
-            categories = cursor.fetchall()
+            with get_pool().reader() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # Don't use dict factory here
+                cursor.execute(GET_CATEGORIES_QUERY, (transaction_type,))
+                categories = cursor.fetchall()
+                cursor.close()
 
             return categories
 
@@ -171,81 +449,439 @@ class DBHandler:
             logger.error(f"Error getting categories: {err}")
             raise
 
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
-
     @staticmethod
-    def get_transactions(user_id, start_date, end_date):
-        """Get all transactions in a date range for a user"""
-        conn = None
-        cursor = None
+    def add_category(name, transaction_type):
+        """Add a new category and refresh the category registry"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            with get_pool().writer() as conn:
+                cursor = conn.execute(ADD_CATEGORY_QUERY, (name, transaction_type))
+                conn.commit()
+            replicate_categories(shard_directory.shards())
+            # Reloaded here, in the caller's DB executor thread, rather than on the next lookup
+            category_registry.load()
+            logger.info(f"Category '{name}' added as {transaction_type}")
+            return cursor.lastrowid
 
-            # Format dates for SQLite
-            start_str = start_date.isoformat()
-            end_str = end_date.isoformat()
+        except sqlite3.Error as err:
+            logger.error(f"Error adding category: {err}")
+            raise
 
-            query = """
-            SELECT t.id, t.amount, t.description, t.date, c.name as category, c.type
-            FROM transactions t
-            JOIN categories c ON t.category_id = c.id
-            WHERE t.user_id = ? AND t.date BETWEEN ? AND ?
-            ORDER BY t.date DESC
-            """
+    @staticmethod
+    def rename_category(category_id, name):
+        """Rename a category, refresh the category registry and drop cached summaries"""
+        try:
+            with get_pool().writer() as conn:
+                conn.execute(RENAME_CATEGORY_QUERY, (name, category_id))
+                conn.commit()
+            replicate_categories(shard_directory.shards())
+            category_registry.load()
+            # Cached summaries carry category names
+            report_cache.clear()
+            logger.info(f"Category {category_id} renamed to '{name}'")
 
-            cursor.execute(query, (user_id, start_str, end_str))
-            transactions = cursor.fetchall()
+        except sqlite3.Error as err:
+            logger.error(f"Error renaming category: {err}")
+            raise
+
+    @staticmethod
+    def get_transactions(user_id, start_date, end_date, max_staleness=None):
+        """
+        Get all transactions in a date range for a user.
+        With max_staleness (seconds) the rows may come from an analytics replica that old.
+        """
+        try:
+            with shard_reader(shard_directory.shard_for(user_id), max_staleness) as conn:
+                params = (user_id, to_epoch(start_date), to_epoch(end_date))
+                transactions = conn.execute(GET_TRANSACTIONS_QUERY, params).fetchall()
 
+            for transaction in transactions:
+                transaction['date'] = from_epoch(transaction['date'])
             return transactions
 
         except sqlite3.Error as err:
             logger.error(f"Error getting transactions: {err}")
             raise
 
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+    @staticmethod
+    def iter_transactions(user_id, start_date, end_date, batch_size=EXPORT_BATCH_SIZE, max_staleness=None):
+        """
+        Stream a user's transactions in a date range, oldest first.
+
+        Rows are fetched batch_size at a time, so memory use does not depend
+        on the number of transactions. A reader connection is held until the
+        generator is exhausted or closed; with max_staleness (seconds) it may
+        be a connection to an analytics replica that old.
+
+        Yields:
+            tuple: The column names first, then one tuple per transaction
+                with the date as a datetime
+        """
+        try:
+            with shard_reader(shard_directory.shard_for(user_id), max_staleness) as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # Tuples are cheaper than dicts here
+                try:
+                    cursor.execute(EXPORT_TRANSACTIONS_QUERY,
+                                   (user_id, to_epoch(start_date), to_epoch(end_date)))
+                    columns = tuple(column[0] for column in cursor.description)
+                    yield columns
+
+                    date_index = columns.index('date')
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            row = list(row)
+                            row[date_index] = from_epoch(row[date_index])
+                            yield tuple(row)
+                finally:
+                    cursor.close()
+
+        except sqlite3.Error as err:
+            logger.error(f"Error streaming transactions: {err}")
+            raise
+
+    @staticmethod
+    def get_category_summary(user_ids, start_date, end_date, max_staleness=None):
+        """
+        Get a summary of transactions by category in a date range.
+        Only the given users' rows are read, one index range per user; users on
+        different shards are summed on each shard in parallel and merged.
+        Ranges made of whole days are summed from the daily_totals rollup,
+        anything else falls back to aggregating raw transactions.
+        Results are served from the report cache until a write invalidates them.
+
+        Args:
+            user_ids (iterable): Users whose transactions are summed, see get_report_scope()
+            start_date (datetime): Start of the range
+            end_date (datetime): End of the range, inclusive
+            max_staleness (float): Seconds of lag accepted from analytics replicas; such
+                reads may predate the last invalidation and are not cached
+        """
+        user_ids = tuple(sorted(set(user_ids)))
+        cache_key = (frozenset(user_ids), start_date, end_date)
+        summary = report_cache.get(cache_key)
+        if summary is None:
+            generation = report_cache.generation
+            summary = DBHandler.query_category_summary(user_ids, start_date, end_date, max_staleness)
+            if max_staleness is None:
+                report_cache.put(cache_key, summary, generation)
+        return summary
 
     @staticmethod
-    def get_category_summary(start_date, end_date):
-        """Get a summary of transactions by category in a date range"""
-        conn = None
-        cursor = None
+    def query_category_summary(user_ids, start_date, end_date, max_staleness=None):
+        """
+        Read a category summary from the database, bypassing the report cache.
+        Arguments as for get_category_summary(), user_ids a sorted tuple.
+        """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            if covers_whole_days(start_date, end_date):
+                query, bounds = GET_DAILY_SUMMARY_QUERY, (to_day(start_date), to_day(end_date))
+            else:
+                query, bounds = GET_CATEGORY_SUMMARY_QUERY, (to_epoch(start_date), to_epoch(end_date))
+            results = query_user_shards(query, user_ids, lambda ids: ids + bounds, max_staleness)
+            return merge_shard_rows(results, ('category', 'type'), ('total',),
+                                    lambda row: (row['type'], -row['total']))
 
-            # Format dates for SQLite
-            start_str = start_date.isoformat()
-            end_str = end_date.isoformat()
+        except sqlite3.Error as err:
+            logger.error(f"Error getting category summary: {err}")
+            raise
 
-            query = """
-            SELECT c.name as category, c.type, SUM(t.amount) as total
-            FROM transactions t
-            JOIN categories c ON t.category_id = c.id
-            WHERE t.date BETWEEN ? AND ?
-            GROUP BY c.id
-            ORDER BY c.type, total DESC
-            """
+    @staticmethod
+    def get_dashboard_summary(user_ids, periods):
+        """
+        Get category totals for several whole-day periods in a single query.
+
+        Args:
+            user_ids (iterable): Users whose transactions are summed
+            periods (dict): (start_date, end_date) for every name in DASHBOARD_PERIODS;
+                each range must cover whole days
+
+        Returns:
+            list: One dict per category with its name, type and a total per period
+        """
+        user_ids = tuple(sorted(set(user_ids)))
+        ranges = [periods[name] for name in DASHBOARD_PERIODS]
+        first = min(start for start, _ in ranges)
+        last = max(end for _, end in ranges)
+
+        # Invalidated like a summary of the whole outer range; every period's range is part of
+        # the key too, so a new day with the same outer range is not served yesterday's totals
+        cache_key = (frozenset(user_ids), first, last, 'dashboard',
+                     tuple((name, start, end) for name, (start, end) in zip(DASHBOARD_PERIODS, ranges)))
+        summary = report_cache.get(cache_key)
+        if summary is None:
+            generation = report_cache.generation
+            summary = DBHandler.query_dashboard_summary(user_ids, ranges)
+            report_cache.put(cache_key, summary, generation)
+        return summary
+
+    @staticmethod
+    def query_dashboard_summary(user_ids, ranges):
+        """
+        Read the dashboard totals from the database, bypassing the report cache.
+
+        Args:
+            user_ids (tuple): Sorted ids of the users whose transactions are summed
+            ranges (list): (start_date, end_date) of every period, in DASHBOARD_PERIODS order
+
+        Returns:
+            list: As for get_dashboard_summary()
+        """
+        first = min(start for start, _ in ranges)
+        last = max(end for _, end in ranges)
+        try:
+            period_days = tuple(to_day(date) for day_range in ranges for date in day_range)
+            bounds = (to_day(first), to_day(last))
+            results = query_user_shards(GET_DASHBOARD_SUMMARY_QUERY, user_ids,
+                                        lambda ids: period_days + ids + bounds)
+            return merge_shard_rows(results, ('category', 'type'), DASHBOARD_PERIODS,
+                                    lambda row: (row['type'], -row['month'], -row['previous_month']))
 
-            cursor.execute(query, (start_str, end_str))
-            summary = cursor.fetchall()
+        except sqlite3.Error as err:
+            logger.error(f"Error getting dashboard summary: {err}")
+            raise
 
-            return summary
+    @staticmethod
+    def get_monthly_totals(user_ids, first_month, last_month, max_staleness=None):
+        """
+        Get per-category totals for every month in a range from the monthly_totals rollup.
+
+        Args:
+            user_ids (iterable): Users whose transactions are summed
+            first_month (datetime): Any moment in the first month of the range
+            last_month (datetime): Any moment in the last month of the range
+            max_staleness (float): Seconds of lag accepted from analytics replicas,
+                such reads are not cached
+
+        Returns:
+            list: Dicts with category, type, month (datetime of its first day) and total,
+                only for months that have transactions
+        """
+        user_ids = tuple(sorted(set(user_ids)))
+        first, last = to_month(first_month), to_month(last_month)
+        cache_key = (frozenset(user_ids), from_month(first), from_month(last + 1) - timedelta(microseconds=1),
+                     'trends')
+        totals = report_cache.get(cache_key)
+        if totals is None:
+            generation = report_cache.generation
+            totals = DBHandler.query_monthly_totals(user_ids, first, last, max_staleness)
+            if max_staleness is None:
+                report_cache.put(cache_key, totals, generation)
+        return totals
+
+    @staticmethod
+    def query_monthly_totals(user_ids, first, last, max_staleness=None):
+        """
+        Read monthly totals from the database, bypassing the report cache.
+
+        Args:
+            user_ids (tuple): Sorted ids of the users whose transactions are summed
+            first (int): Month number of the first month, see db/dates.py
+            last (int): Month number of the last month
+            max_staleness (float): Seconds of lag accepted from analytics replicas
+
+        Returns:
+            list: As for get_monthly_totals()
+        """
+        try:
+            results = query_user_shards(GET_MONTHLY_TOTALS_QUERY, user_ids, lambda ids: ids + (first, last),
+                                        max_staleness)
+            totals = merge_shard_rows(results, ('category', 'type', 'month'), ('total',),
+                                      lambda row: (row['type'], row['category'], row['month']))
+
+            for row in totals:
+                row['month'] = from_month(row['month'])
+            return totals
 
         except sqlite3.Error as err:
-            logger.error(f"Error getting category summary: {err}")
+            logger.error(f"Error getting monthly totals: {err}")
             raise
 
-        finally:
-            if cursor:
+    @staticmethod
+    def get_admin_summary(start_date, end_date, max_staleness=None):
+        """
+        Get category totals over every user, summed on all shards in parallel.
+        Not cached and not index-bound: meant for operators, not for the bot's users.
+
+        Args:
+            start_date (datetime): First day of the range
+            end_date (datetime): Last day of the range, inclusive
+            max_staleness (float): Seconds of lag accepted from analytics replicas
+
+        Returns:
+            list: Dicts with category, type, total, count and the number of users
+        """
+        params = (to_day(start_date), to_day(end_date))
+
+        def summarize(shard):
+            with shard_reader(shard, max_staleness) as conn:
+                return conn.execute(GET_ADMIN_SUMMARY_QUERY, params).fetchall()
+
+        try:
+            results = run_on_shards(summarize, shard_directory.shards())
+            return merge_shard_rows(results, ('category', 'type'), ('total', 'count', 'users'),
+                                    lambda row: (row['type'], -row['total']))
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting admin summary: {err}")
+            raise
+
+    @staticmethod
+    def get_report_scope(user_id):
+        """
+        Get the users whose transactions a user's reports cover.
+
+        Returns:
+            tuple: Ids of every member of the user's family, or just the user
+        """
+        try:
+            with get_pool().reader() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                members = cursor.execute(GET_FAMILY_MEMBERS_QUERY, (user_id,)).fetchall()
                 cursor.close()
-            if conn:
-                conn.close()
+
+            return tuple(member[0] for member in members) or (user_id,)
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting report scope: {err}")
+            raise
+
+    @staticmethod
+    def get_family(user_id):
+        """Get the family a user belongs to, or None"""
+        try:
+            with get_pool().reader() as conn:
+                return conn.execute(GET_USER_FAMILY_QUERY, (user_id,)).fetchone()
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting family: {err}")
+            raise
+
+    @staticmethod
+    def create_family(owner_id, name):
+        """
+        Create a family with the owner as its first member.
+        The owner leaves any family they belonged to before.
+
+        Returns:
+            dict: The new family with its id, name, owner_id and invite_code
+        """
+        invite_code = secrets.token_urlsafe(FAMILY_INVITE_CODE_BYTES)
+        try:
+            with get_pool().writer() as conn:
+                cursor = conn.execute(CREATE_FAMILY_QUERY, (name, owner_id, invite_code))
+                conn.execute(SET_FAMILY_MEMBER_QUERY, (owner_id, cursor.lastrowid))
+                conn.commit()
+            logger.info(f"Family {cursor.lastrowid} created by user {owner_id}")
+            return {'id': cursor.lastrowid, 'name': name, 'owner_id': owner_id, 'invite_code': invite_code}
+
+        except sqlite3.Error as err:
+            logger.error(f"Error creating family: {err}")
+            raise
+
+    @staticmethod
+    def join_family(user_id, invite_code):
+        """
+        Add a user to the family with the given invite code.
+
+        Returns:
+            dict: The joined family, or None if the code is unknown
+        """
+        try:
+            with get_pool().writer() as conn:
+                family = conn.execute(GET_FAMILY_BY_INVITE_CODE_QUERY, (invite_code,)).fetchone()
+                if family is None:
+                    return None
+                conn.execute(SET_FAMILY_MEMBER_QUERY, (user_id, family['id']))
+                conn.commit()
+            logger.info(f"User {user_id} joined family {family['id']}")
+            return family
+
+        except sqlite3.Error as err:
+            logger.error(f"Error joining family: {err}")
+            raise
+
+    @staticmethod
+    def leave_family(user_id):
+        """
+        Remove a user from their family.
+
+        Returns:
+            bool: True if the user was in a family
+        """
+        try:
+            with get_pool().writer() as conn:
+                cursor = conn.execute(DELETE_FAMILY_MEMBER_QUERY, (user_id,))
+                conn.commit()
+            return cursor.rowcount > 0
+
+        except sqlite3.Error as err:
+            logger.error(f"Error leaving family: {err}")
+            raise
+
+    @staticmethod
+    def get_conversation_states(name):
+        """
+        Get the stored states of a persistent conversation handler.
+
+        Args:
+            name (str): Name of the conversation handler
+
+        Returns:
+            dict: JSON encoded conversation key -> JSON encoded state
+        """
+        try:
+            with get_pool().reader() as conn:
+                rows = conn.execute(GET_CONVERSATION_STATES_QUERY, (name,)).fetchall()
+
+            return {row['key']: row['state'] for row in rows}
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting conversation states: {err}")
+            raise
+
+    @staticmethod
+    def get_all_user_data():
+        """
+        Get the stored user_data of every user.
+
+        Returns:
+            dict: user_id -> JSON encoded user_data
+        """
+        try:
+            with get_pool().reader() as conn:
+                rows = conn.execute(GET_ALL_USER_DATA_QUERY).fetchall()
+
+            return {row['user_id']: row['data'] for row in rows}
+
+        except sqlite3.Error as err:
+            logger.error(f"Error getting user data: {err}")
+            raise
+
+    @staticmethod
+    def save_conversation_data(user_data, conversation_states):
+        """
+        Write changed user_data and conversation states in one transaction.
+
+        Args:
+            user_data (list): (user_id, JSON data) tuples, data None deletes the row
+            conversation_states (list): (name, JSON key, JSON state) tuples, state None deletes the row
+        """
+        try:
+            with get_pool().writer() as conn:
+                conn.executemany(SET_USER_DATA_QUERY,
+                                 [(user_id, data) for user_id, data in user_data if data is not None])
+                conn.executemany(DELETE_USER_DATA_QUERY,
+                                 [(user_id,) for user_id, data in user_data if data is None])
+                conn.executemany(SET_CONVERSATION_STATE_QUERY,
+                                 [row for row in conversation_states if row[2] is not None])
+                conn.executemany(DELETE_CONVERSATION_STATE_QUERY,
+                                 [(name, key) for name, key, state in conversation_states if state is None])
+                conn.commit()
+
+        except sqlite3.Error as err:
+            logger.error(f"Error saving conversation data: {err}")
+            raise
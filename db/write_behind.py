@@ -0,0 +1,241 @@
+"""
+Write-behind queue for transaction inserts.
+
+Confirmed transactions are appended to a journal file and queued in memory.
+A background thread commits them in groups every WRITE_BEHIND_FLUSH_MS or as
+soon as WRITE_BEHIND_MAX_ROWS are pending, so a burst of confirmations costs
+one commit instead of one per row.
+
+Every journal entry carries an increasing sequence number. Each shard stores
+the number of the last entry it committed in write_behind_state in the same
+transaction as the rows, so replaying the journal after a crash, or retrying
+a group that failed on one shard only, inserts exactly the entries that
+never reached the database.
+
+The journal is flushed to the operating system but not fsynced, which
+matches the database's synchronous=NORMAL: an acknowledged transaction
+survives a crash of the bot process, not a power loss. Queued rows are not
+visible to queries until they are committed; readers call flush_pending()
+first so users always see their own transactions.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from config import (
+    logger,
+    WRITE_BEHIND_FLUSH_MS,
+    WRITE_BEHIND_MAX_ROWS,
+    WRITE_BEHIND_JOURNAL
+)
+from .money import to_minor
+from .sqlite_handler import DBHandler
+
+
+def read_journal(journal_file):
+    """
+    Read every complete entry from a journal file.
+
+    Args:
+        journal_file (str): Path of the journal
+
+    Returns:
+        list: (seq, transaction) tuples in journal order
+    """
+    entries = []
+    if not os.path.exists(journal_file):
+        return entries
+
+    with open(journal_file, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write was never acknowledged
+                logger.warning(f"Skipping incomplete write-behind journal entry in {journal_file}")
+                continue
+            amount = entry['amount']
+            if isinstance(amount, float):
+                # Written before amounts became integer minor units
+                amount = to_minor(amount)
+            transaction = (entry['user_id'], entry['category_id'], amount,
+                           entry['description'], datetime.fromisoformat(entry['date']))
+            entries.append((entry['seq'], transaction))
+    return entries
+
+
+def replay_journal(journal_file=WRITE_BEHIND_JOURNAL):
+    """
+    Insert journal entries that were not committed before the last shutdown
+    and empty the journal.
+
+    Args:
+        journal_file (str): Path of the journal
+
+    Returns:
+        int: Number of replayed transactions
+    """
+    entries = read_journal(journal_file)
+    if not entries:
+        return 0
+
+    # Every shard skips the entries it already committed
+    replayed = 0
+    for start in range(0, len(entries), WRITE_BEHIND_MAX_ROWS):
+        batch = entries[start:start + WRITE_BEHIND_MAX_ROWS]
+        replayed += DBHandler.add_transactions([transaction for _, transaction in batch],
+                                               [seq for seq, _ in batch])
+
+    open(journal_file, 'w').close()
+    logger.info(f"Replayed {replayed} write-behind transactions from {journal_file}")
+    return replayed
+
+
+class WriteBehindQueue:
+    """
+    In-process queue that journals transactions and commits them in groups.
+    """
+
+    def __init__(self, journal_file=WRITE_BEHIND_JOURNAL, flush_interval_ms=WRITE_BEHIND_FLUSH_MS,
+                 max_rows=WRITE_BEHIND_MAX_ROWS):
+        self.journal_file = journal_file
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._thread = None
+        self._stopping = False
+        self._seq = 0
+
+    def start(self):
+        """Replay leftovers from a previous run and start the flush thread"""
+        replay_journal(self.journal_file)
+        self._seq = DBHandler.get_write_behind_seq()
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        logger.info(f"Write-behind queue started (flush every {self.flush_interval * 1000:.0f} ms "
+                    f"or {self.max_rows} rows)")
+
+    def submit(self, user_id, category_id, amount, description=None):
+        """
+        Journal a transaction and queue it for the next group commit.
+
+        The entry is written to the journal before this returns, so it
+        survives a crash of the bot process. Blocks on file I/O, so async
+        code runs it in the DB executor.
+        """
+        date = datetime.now()
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("Write-behind queue is stopped")
+
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'user_id': user_id,
+                'category_id': category_id,
+                'amount': amount,
+                'description': description,
+                'date': date.isoformat(),
+            }
+            self._journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._journal.flush()
+
+            self._pending.append((self._seq, (user_id, category_id, amount, description, date)))
+            if len(self._pending) >= self.max_rows:
+                self._condition.notify()
+
+    def has_pending(self, user_ids):
+        """Check whether any of the users has transactions waiting for the next group commit"""
+        with self._condition:
+            return any(transaction[0] in user_ids for _, transaction in self._pending)
+
+    def flush(self):
+        """Commit every pending transaction, returning how many were written"""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            try:
+                DBHandler.add_transactions([transaction for _, transaction in batch], [seq for seq, _ in batch])
+            except Exception:
+                # Put the rows back in front so they go out with the next flush
+                with self._condition:
+                    self._pending = batch + self._pending
+                raise
+
+            with self._condition:
+                if not self._pending:
+                    # Everything journaled is committed, start a fresh journal
+                    self._journal.seek(0)
+                    self._journal.truncate()
+            return len(batch)
+
+    def stop(self):
+        """Stop the flush thread and commit everything still queued"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        logger.info("Write-behind queue stopped")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._pending) < self.max_rows:
+                    self._condition.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as err:
+                logger.error(f"Write-behind flush failed, will retry: {err}")
+
+
+# Active queue when write-behind mode is enabled, see start_write_behind()
+write_behind_queue = None
+
+
+def start_write_behind():
+    """Create and start the process-wide write-behind queue"""
+    global write_behind_queue
+    write_behind_queue = WriteBehindQueue()
+    write_behind_queue.start()
+    return write_behind_queue
+
+
+def flush_pending(user_ids):
+    """
+    Commit queued write-behind transactions if any belongs to the users, so
+    a read that follows sees them. Blocking, like the reads it precedes.
+
+    Args:
+        user_ids (iterable): Users whose transactions are about to be read
+    """
+    queue = write_behind_queue
+    if queue is not None:
+        user_ids = set(user_ids)
+        if queue.has_pending(user_ids):
+            queue.flush()
+
+
+def stop_write_behind():
+    """Flush and stop the process-wide write-behind queue if it is running"""
+    global write_behind_queue
+    if write_behind_queue is not None:
+        write_behind_queue.stop()
+        write_behind_queue = None
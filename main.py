@@ -1,8 +1,66 @@
 from telegram.ext import Application, CommandHandler
-from config import TELEGRAM_TOKEN, logger
-from db import setup_database
-from bot import setup_conversation_handler
+from config import (
+    logger,
+    TELEGRAM_TOKEN,
+    TELEGRAM_BASE_URL,
+    WRITE_BEHIND_ENABLED,
+    ANALYTICS_REPLICA_ENABLED,
+    BOT_MODE,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_URL_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    CONCURRENT_UPDATES,
+    SEND_SCHEDULER_ENABLED,
+    METRICS_ENABLED
+)
+from db import (
+    setup_database,
+    shutdown_db_executor,
+    shutdown_export_executor,
+    shutdown_shard_executor,
+    close_pool,
+    start_write_behind,
+    stop_write_behind,
+    start_replicas,
+    stop_replicas,
+    instrument_db_handler
+)
+from bot import (
+    setup_conversation_handler,
+    STATE_NAMES,
+    SQLitePersistence,
+    InstrumentedRequest,
+    SendScheduler,
+    instrument_handlers
+)
 from bot.handlers.start_handler import help_command
+from bot.handlers.export_handler import export_command
+from bot.handlers.family_handler import family_command
+from bot.handlers.report_handler import trends_command
+from bot.handlers.chart_handler import chart_command
+from bot.charts import shutdown_chart_executor
+from bot.update_processor import PerChatUpdateProcessor
+from metrics import start_metrics_server, stop_metrics_server
+
+# Connections to the Bot API, python-telegram-bot's default for the bot's own requests
+BOT_API_CONNECTIONS = 256
+
+
+async def on_shutdown(application):
+    """
+    Release resources once the bot has stopped processing updates
+    """
+    stop_write_behind()
+    shutdown_chart_executor()
+    shutdown_export_executor()
+    shutdown_db_executor()
+    stop_replicas()
+    shutdown_shard_executor()
+    close_pool()
+    stop_metrics_server()
 
 
 def main():
@@ -12,10 +70,29 @@ def main():
     # Set up database
     logger.info("Setting up SQLite database...")
     setup_database()
+    instrument_db_handler()
+
+    if WRITE_BEHIND_ENABLED:
+        start_write_behind()
+
+    if ANALYTICS_REPLICA_ENABLED:
+        start_replicas()
 
     # Initialize the bot
     logger.info("Starting the bot...")
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .request(InstrumentedRequest(connection_pool_size=BOT_API_CONNECTIONS))
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES))
+        .persistence(SQLitePersistence())
+        .post_shutdown(on_shutdown)
+    )
+    if SEND_SCHEDULER_ENABLED:
+        # Pace outgoing messages below Telegram's flood limits
+        builder.rate_limiter(SendScheduler())
+    application = builder.build()
 
     # Add conversation handler
     conversation_handler = setup_conversation_handler()
@@ -23,10 +100,30 @@ def main():
 
     # Add standalone command handlers
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("family", family_command))
+    application.add_handler(CommandHandler("trends", trends_command))
+    application.add_handler(CommandHandler("chart", chart_command))
+
+    # Time every handler and count conversation transitions
+    instrument_handlers(application, STATE_NAMES)
+    if METRICS_ENABLED:
+        start_metrics_server()
 
     # Start the Bot
-    logger.info("Bot is running!")
-    application.run_polling()
+    if BOT_MODE == 'webhook':
+        logger.info(f"Bot is running! Serving webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_URL_PATH}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_URL_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        logger.info("Bot is running!")
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+"""
+In-process metrics and the Prometheus endpoint.
+
+Counters and latency histograms live in a process-wide registry. Database
+calls, update handlers and Bot API requests record into it (see
+db/instrumentation.py and bot/instrumentation.py), and start_metrics_server()
+serves everything in the Prometheus text format on /metrics.
+
+Recording is meant to be cheap enough to stay on all the time: callers
+look up their labelled child once and an observation is a bisect over the
+bucket bounds plus two additions to the calling thread's own cell, without
+a lock. Counters are incremented under a lock, they count rarer events.
+"""
+import threading
+from bisect import bisect_left
+from threading import get_ident
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import logger, METRICS_LISTEN, METRICS_PORT
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(names, values, extra=''):
+    """Render a label set such as {method="add_transaction",le="0.01"}"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape_label(value):
+    """Escape a label value as the text format requires"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    """Render a sample value, integers without a fraction"""
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class CounterChild:
+    """
+    One labelled time series of a Counter.
+    """
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add amount to the counter"""
+        with self._lock:
+            self.value += amount
+
+
+class HistogramChild:
+    """
+    One labelled time series of a Histogram.
+
+    Every thread records into a cell of its own, bucket counts followed by
+    the sum, so observe() needs no lock; readers add the cells up.
+    """
+
+    __slots__ = ('bounds', '_cells', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self._cells = {}  # cell by thread id
+        self._lock = threading.Lock()  # guards adding cells, not the counts in them
+
+    def observe(self, value):
+        """Record one value, usually a duration in seconds"""
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._new_cell()
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def _new_cell(self):
+        # The last bucket counts values above every bound, the sum follows it
+        cell = [0] * (len(self.bounds) + 1) + [0.0]
+        with self._lock:
+            self._cells[get_ident()] = cell
+        return cell
+
+    def snapshot(self):
+        """
+        Add up the cells of every thread.
+
+        Returns:
+            tuple: Count per bucket, the last one for values above every bound, and the sum
+        """
+        with self._lock:
+            cells = list(self._cells.values())
+        buckets = [sum(cell[index] for cell in cells) for index in range(len(self.bounds) + 1)]
+        return buckets, sum(cell[-1] for cell in cells)
+
+    @property
+    def buckets(self):
+        return self.snapshot()[0]
+
+    @property
+    def sum(self):
+        return self.snapshot()[1]
+
+
+class Metric:
+    """
+    Base of labelled metrics: keeps one child per combination of label values.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Return the child for a combination of label values, creating it on first use.
+
+        Args:
+            *values: One value per label name, in order
+
+        Returns:
+            The child to record into
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def children(self):
+        """Return (label values, child) pairs of every series, sorted by label values"""
+        with self._lock:
+            return sorted(self._children.items())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        """Return the metric in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children():
+            lines.extend(self._render_child(values, child))
+        return '\n'.join(lines)
+
+    def _render_child(self, values, child):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count, e.g. errors.
+    """
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return CounterChild()
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{format_labels(self.labelnames, values)} {format_value(child.value)}"
+
+
+class Histogram(Metric):
+    """
+    Distribution of values over fixed buckets, e.g. call latencies.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(buckets)
+
+    def _new_child(self):
+        return HistogramChild(self.bounds)
+
+    def _render_child(self, values, child):
+        buckets, total = child.snapshot()
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), buckets):
+            cumulative += count
+            le = bound if bound == '+Inf' else format_value(float(bound))
+            labels = format_labels(self.labelnames, values, f'le="{le}"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {format_value(total)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    Every metric of the process, rendered together on /metrics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        """Return the counter called name, registering it on first use"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=()):
+        """Return the histogram called name, registering it on first use"""
+        return self._register(Histogram, name, documentation, labelnames)
+
+    def _register(self, metric_class, name, documentation, labelnames):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, labelnames)
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a different metric")
+            return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return ''.join(metric.render() + '\n' for metric in metrics)
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve the registry on GET /metrics.
+    """
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown the bot's own log
+        pass
+
+
+# Running endpoint, see start_metrics_server()
+metrics_server = None
+
+
+def start_metrics_server(listen=METRICS_LISTEN, port=METRICS_PORT):
+    """
+    Serve /metrics from a background thread.
+
+    Args:
+        listen (str): Address to bind
+        port (int): Port to bind, 0 picks a free one
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    global metrics_server
+    metrics_server = ThreadingHTTPServer((listen, port), MetricsRequestHandler)
+    metrics_server.daemon_threads = True
+    thread = threading.Thread(target=metrics_server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{listen}:{metrics_server.server_port}/metrics")
+    return metrics_server
+
+
+def stop_metrics_server():
+    """Stop the metrics endpoint if it is running"""
+    global metrics_server
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+        metrics_server = None
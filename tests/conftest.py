@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Point config at a throwaway database before anything imports it, so tests
+# never open the bot's own database or write-behind journal
+_db_dir = tempfile.mkdtemp(prefix="family_budget_test_")
+os.environ["SQLITE_DB_FILE"] = os.path.join(_db_dir, "test.db")
+os.environ["WRITE_BEHIND_JOURNAL"] = os.path.join(_db_dir, "test.db.journal")
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from db import migrations
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Applies the pending migrations and exits the process as soon as a table
+# rebuild has copied every row, before the copy replaces the old table
+DIE_BEFORE_SWAP = textwrap.dedent('''
+    import os
+    import sqlite3
+    import sys
+    from db import migrations
+
+    copy_rows = migrations.backfill_in_batches
+
+    def backfill_then_die(conn, task, *args, **kwargs):
+        copy_rows(conn, task, *args, **kwargs)
+        if task == sys.argv[2]:
+            os._exit(3)
+
+    migrations.backfill_in_batches = backfill_then_die
+    migrations.apply_migrations(sqlite3.connect(sys.argv[1]))
+''')
+
+
+def create_database(db_file, version, rows):
+    """Create a database at the given schema version holding rows transactions"""
+    conn = sqlite3.connect(db_file)
+    all_migrations = migrations.MIGRATIONS[:]
+    try:
+        migrations.MIGRATIONS[:] = [entry for entry in all_migrations if entry[0] <= version]
+        migrations.apply_migrations(conn)
+    finally:
+        migrations.MIGRATIONS[:] = all_migrations
+    conn.executemany(
+        "INSERT INTO transactions (user_id, category_id, amount, description, date) VALUES (?, ?, ?, ?, ?)",
+        [(i % 3 + 1, 1, 10.25 + i, None, f"2024-03-{i % 28 + 1:02d} 12:00:00") for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def kill_before_swap(db_file, task):
+    env = dict(os.environ, MIGRATION_BATCH_SIZE="7")
+    result = subprocess.run([sys.executable, "-c", DIE_BEFORE_SWAP, db_file, task], cwd=REPO_ROOT, env=env)
+    assert result.returncode == 3
+
+
+def test_rebuild_resumes_after_dying_before_the_swap(tmp_path):
+    db_file = str(tmp_path / "budget.db")
+    create_database(db_file, version=4, rows=50)
+
+    kill_before_swap(db_file, "rebuild_transactions")
+
+    conn = sqlite3.connect(db_file)
+    assert migrations.column_type(conn, "transactions", "amount") == "REAL"
+    assert conn.execute("SELECT COUNT(*) FROM transactions_new").fetchone()[0] == 50
+
+    assert migrations.apply_migrations(conn) == migrations.MIGRATIONS[-1][0]
+    assert conn.execute("SELECT COUNT(*), SUM(amount) FROM transactions").fetchone() == (50, 50 * 1025 + 1225 * 100)
+    assert conn.execute("SELECT COUNT(*) FROM backfill_progress").fetchone()[0] == 0
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'transactions_new'").fetchone() is None
+    conn.close()
+
+
+def test_rebuild_copies_again_when_progress_is_lost(tmp_path):
+    db_file = str(tmp_path / "budget.db")
+    create_database(db_file, version=4, rows=50)
+
+    kill_before_swap(db_file, "rebuild_transactions")
+    conn = sqlite3.connect(db_file)
+    conn.execute("DELETE FROM backfill_progress")
+    conn.commit()
+
+    migrations.apply_migrations(conn)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 50
+    conn.close()
+
+
+def test_shards_get_only_their_own_tables(tmp_path):
+    tables = "SELECT name FROM sqlite_master WHERE type = 'table'"
+    main = sqlite3.connect(tmp_path / "budget.db")
+    shard = sqlite3.connect(tmp_path / "budget.shard1.db")
+    assert migrations.apply_migrations(main) == migrations.apply_migrations(shard, main=False)
+
+    main_tables = {row[0] for row in main.execute(tables)}
+    shard_tables = {row[0] for row in shard.execute(tables)}
+    assert {'transactions', 'categories', 'daily_totals', 'monthly_totals', 'write_behind_state'} <= shard_tables
+    assert main_tables - shard_tables >= {'user_shards', 'families', 'family_members',
+                                          'conversation_states', 'user_data'}
+    main.close()
+    shard.close()
@@ -0,0 +1,16 @@
+import pytest
+
+from db.query_plan import create_schema, check_query_plans
+from db.sqlite_handler import READ_QUERIES
+
+
+@pytest.fixture(scope="module")
+def offenders(tmp_path_factory):
+    db_file = str(tmp_path_factory.mktemp("query_plan") / "check.db")
+    create_schema(db_file)
+    return check_query_plans(db_file)
+
+
+@pytest.mark.parametrize("name", sorted(READ_QUERIES))
+def test_read_query_uses_index(offenders, name):
+    assert name not in offenders, f"{name} scans: {'; '.join(offenders[name])}"
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db.connection_pool import configure_pool, close_pool, get_pool
+from db.migrations import apply_migrations
+from db.replica import Replica, copy_in_steps
+
+
+@pytest.fixture
+def shard(tmp_path):
+    pool = configure_pool(str(tmp_path / "budget.db"))
+    with pool.writer() as conn:
+        apply_migrations(conn)
+        conn.commit()
+    yield 0
+    close_pool()
+
+
+def add_transaction(amount):
+    with get_pool().writer() as conn:
+        conn.execute(
+            "INSERT INTO transactions (user_id, category_id, amount, description, date) VALUES (1, 1, ?, NULL, 0)",
+            (amount,)
+        )
+        conn.commit()
+
+
+def copied_total(replica):
+    with replica.reader(max_staleness=60) as conn:
+        return conn.execute("SELECT COALESCE(SUM(amount), 0) AS total FROM transactions").fetchone()['total']
+
+
+def test_refresh_copies_only_when_the_shard_changed(shard):
+    replica = Replica(shard)
+    replica.refresh()
+    replica.refresh()
+    assert replica.refreshes == 1
+    assert replica.is_fresh(60)
+
+    add_transaction(1500)
+    replica.refresh()
+    assert replica.refreshes == 2
+    assert copied_total(replica) == 1500
+    replica.close()
+
+
+def test_reader_after_close_yields_no_connection(shard):
+    replica = Replica(shard)
+    replica.refresh()
+    replica.close()
+    with replica.reader(max_staleness=60) as conn:
+        assert conn is None
+
+
+def test_copy_gives_up_when_the_source_keeps_changing(shard, tmp_path):
+    for amount in range(2000):
+        add_transaction(amount)
+    target = sqlite3.connect(tmp_path / "copy.db")
+    copying = threading.Event()
+
+    def keep_writing():
+        while copying.is_set():
+            add_transaction(1)
+
+    copying.set()
+    writer = threading.Thread(target=keep_writing)
+    writer.start()
+    try:
+        with get_pool().reader() as source:
+            with pytest.raises(sqlite3.OperationalError):
+                copy_in_steps(source, target, pages=1, sleep_ms=1, max_passes=2)
+    finally:
+        copying.clear()
+        writer.join()
+        target.close()